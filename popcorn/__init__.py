@@ -25,11 +25,16 @@
 from flask import Flask, url_for, request
 from textile import textile
 
+from popcorn.configs import MAX_SUBMISSION_SIZE
 from popcorn.database import db_session
 
 app = Flask(__name__)
+# compressed uploads are a lot smaller than the submissions inside them
+app.config['MAX_CONTENT_LENGTH'] = MAX_SUBMISSION_SIZE
 # Flask docs say we need this in order to use decorators
 import popcorn.views
+# changes how submission_packages gets created, wherever it's created from
+import popcorn.partitions
 
 
 @app.teardown_request
@@ -44,5 +49,11 @@ def url_for_other_page(page=None):
         args['page'] = page
     return url_for(request.endpoint, **args)
 
+
+def url_for_cursor(**args):
+    """Return the url of the current page with other query arguments"""
+    return url_for(request.endpoint, **dict(request.view_args, **args))
+
 app.jinja_env.globals['url_for_other_page'] = url_for_other_page
+app.jinja_env.globals['url_for_cursor'] = url_for_cursor
 app.jinja_env.filters['textile'] = lambda value: textile(value.unescape())
@@ -22,49 +22,388 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 
+
 """Archive packages from SubmissionPackages model to PackageArchive
 model
+
+The archive is kept up to date incrementally: every run counts only the
+submissions which arrived since the previous one and adds them to the
+counts in package_archives. The work is split by distro, each one with
+its own watermark in archive_watermarks: the last sub_id of that distro
+which was counted.
+
+After an outage whole months can be counted again with rebuild_archives,
+which keeps track of its progress in archive_runs.
+
 """
-from datetime import date
+import multiprocessing
+import time
+from datetime import date, datetime, timedelta
 
 from sqlalchemy import func
-from sqlalchemy.sql.expression import extract
 
-from popcorn.database import db_session
+from popcorn import rollups
+from popcorn.cache import response_cache
+from popcorn.configs import (ARCHIVE_CHUNK_SIZE, ARCHIVE_WORKERS,
+                             INSERT_BATCH_SIZE)
+from popcorn.database import (db_session, init_worker, insert_ignore,
+                              insert_or_add)
 from popcorn.models import (SubmissionPackage as SubPac, Submission as Sub,
-                            PackageArchive)
-
-TODAY = date.today()
-LAST_MONTH = TODAY.replace(month=TODAY.month - 1)
-
-
-def update_archives(arc_month=LAST_MONTH):
-    """Archives packages of a month, by default: last month"""
-    query = db_session.query(SubPac.pkg_name, SubPac.pkg_version,
-                             SubPac.pkg_release, SubPac.pkg_arch,
-                             SubPac.vendor_name, SubPac.pkg_status,
-                             Sub.distro_name, Sub.distro_version,
-                             func.min(SubPac.sub_date),
-                             func.count('*').label('count')
-                             ).join(Sub)
-
-    arcs = query.filter(extract('month', SubPac.sub_date) == arc_month.month,
-                        extract('year', SubPac.sub_date) == arc_month.year
-                        ).group_by(extract('month', SubPac.sub_date),
-                                   extract('year', SubPac.sub_date),
-                                   SubPac.pkg_name, SubPac.pkg_version,
-                                   SubPac.pkg_release, SubPac.pkg_arch,
-                                   SubPac.vendor_name,
-                                   SubPac.pkg_status, Sub.distro_name,
-                                   Sub.distro_version).all()
-    pkg_archives = []
-    for pkg in arcs:
-        pkg_archive = PackageArchive(*pkg)
-        pkg_archive.month = pkg_archive.month.replace(day=1)
-        pkg_archives.append(pkg_archive)
-
-    db_session.add_all(pkg_archives)
+                            Package as Pkg, PackageStatus as Status,
+                            PackageArchive, ArchiveWatermark, ArchiveRun,
+                            Distro, DroppedMonth)
+from popcorn.partitions import month_range
+
+# the name of the watermarks of package_archives
+WATERMARK = 'package_archives'
+# the columns which identify a row of package_archives, in the order of
+# the keys yielded by _count_packages
+ARCHIVE_KEY = ('pkg_name', 'pkg_version', 'pkg_release', 'pkg_epoch',
+               'pkg_arch', 'vendor_name', 'pkg_status', 'distro_name',
+               'distro_version', 'month')
+# where the columns of package_rollups are in an ARCHIVE_KEY
+ROLLUP_COLUMNS = [ARCHIVE_KEY.index(c) for c in rollups.ROLLUP_KEY]
+
+
+def update_archives(workers=ARCHIVE_WORKERS, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """Add the packages of the submissions which arrived since the last run
+    to package_archives
+
+    :workers: how many processes archive distros at the same time
+    :chunk_size: the most submissions counted in one transaction
+
+    Each chunk is committed together with the new watermark of its
+    distro, so running this again, or after it was interrupted, never
+    counts a submission twice. Returns the number of submissions which
+    were counted.
+
+    """
+    high = _committed_sub_id()
+    jobs = [(name, version, high, chunk_size) for name, version in
+            db_session.query(Distro.distro_name, Distro.distro_version)]
+    db_session.commit()
+
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=init_worker)
+        try:
+            counted = sum(pool.imap_unordered(_archive_distro, jobs))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        counted = sum(_archive_distro(job) for job in jobs)
+    if counted:
+        response_cache.bump_generation()
+    return counted
+
+
+def rebuild_archives(months, workers=ARCHIVE_WORKERS):
+    """Count the archives of whole months again from the raw submissions
+
+    :months: the first days of the months to rebuild, or None to finish the
+             rebuilds which were interrupted
+    :workers: how many months are rebuilt at the same time
+
+    Every month is replaced in a single transaction, which also records it
+    as finished in archive_runs. Yields (month, rows, seconds) for every
+    month as it's done.
+
+    The months whose raw rows were dropped or purged can't be counted
+    again: ValueError is raised for them before anything is rebuilt, and
+    the interrupted rebuilds of such months are forgotten.
+
+    """
+    if months is None:
+        months = [month for (month,) in db_session.query(ArchiveRun.month)
+                  .filter(ArchiveRun.finished.is_(None))
+                  .order_by(ArchiveRun.month)]
+        # an interrupted rebuild was rolled back, so the archive of the
+        # month is still the one it had before
+        for month in dropped_months(months):
+            db_session.query(ArchiveRun).filter_by(month=month).delete()
+            months.remove(month)
+    else:
+        dropped = dropped_months(months)
+        if dropped:
+            raise ValueError("the raw submissions of %s were dropped" %
+                             ', '.join(m.strftime('%Y-%m') for m in dropped))
+        # remembered until they're done, so they can be resumed
+        for month in months:
+            db_session.merge(ArchiveRun(month))
     db_session.commit()
 
+    if workers > 1 and len(months) > 1:
+        pool = multiprocessing.Pool(min(workers, len(months)),
+                                    initializer=init_worker)
+        try:
+            for result in pool.imap_unordered(_rebuild_month, months):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for month in months:
+            yield _rebuild_month(month)
+
+
+def dropped_months(months):
+    """Return the months, out of a list of their first days, whose raw
+    rows were dropped or purged"""
+    if not months:
+        return []
+    return [month for (month,) in db_session.query(DroppedMonth.month)
+            .filter(DroppedMonth.month.in_(months))
+            .order_by(DroppedMonth.month)]
+
+
+def months_between(first, last):
+    """Return the first days of the months from `first` to `last`"""
+    months = []
+    month = first.replace(day=1)
+    while month <= last:
+        months.append(month)
+        month = month_range(month)[1]
+    return months
+
+
+def last_month(today=None):
+    """Return the first day of the month before `today`"""
+    today = today or date.today()
+    return (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def verify_archives(month=None):
+    """Compare the archive of a month with a count from scratch of the raw
+    submissions which were archived
+
+    Returns a sorted list of (key, archived count, actual count) tuples for
+    every row of package_archives which is wrong or missing, where a key
+    is a tuple ordered like ARCHIVE_KEY. The raw rows of the month must not
+    have been dropped yet.
+
+    """
+    start, end = month_range(month or last_month())
+    archived = {}
+    for row in PackageArchive.query.filter_by(month=start):
+        archived[tuple(getattr(row, c) for c in ARCHIVE_KEY)] = row.count
+
+    actual = {}
+    for (name, version), last in _watermarks().iteritems():
+        for key, count in _count_packages(
+                Sub.distro_name == name, Sub.distro_version == version,
+                SubPac.sub_id <= last, SubPac.sub_date >= start,
+                SubPac.sub_date < end):
+            actual[key] = actual.get(key, 0) + count
+    return sorted((key, archived.get(key), actual.get(key))
+                  for key in set(archived) | set(actual)
+                  if archived.get(key) != actual.get(key))
+
+
+def is_archived(month):
+    """Whether all the submissions of a month have been archived"""
+    start, end = month_range(month)
+    watermarks = _watermarks()
+    last_ids = db_session.query(Sub.distro_name, Sub.distro_version,
+                                func.max(Sub.sub_id)).filter(
+        Sub.sub_date >= start, Sub.sub_date < end).group_by(
+        Sub.distro_name, Sub.distro_version)
+    return all(sub_id <= watermarks.get((name, version), 0)
+               for name, version, sub_id in last_ids)
+
+
+def _archive_distro(job):
+    """Archive the new submissions of a distro, chunk by chunk
+
+    Returns the number of submissions which were counted.
+
+    """
+    name, version, high, chunk_size = job
+    counted = 0
+    while True:
+        last = _lock_watermark(name, version)
+        if last >= high:
+            db_session.commit()
+            return counted
+        subs = db_session.query(Sub.sub_id, Sub.sub_date).filter(
+            Sub.distro_name == name, Sub.distro_version == version,
+            Sub.sub_id > last, Sub.sub_id <= high
+        ).order_by(Sub.sub_id).limit(chunk_size).all()
+        upto = subs[-1].sub_id if len(subs) == chunk_size else high
+
+        rollup = {}
+        if subs:
+            # the dates of the chunk let PostgreSQL skip the partitions of
+            # the other months
+            dates = [sub.sub_date for sub in subs]
+            _add_counts(_count_packages(
+                Sub.distro_name == name, Sub.distro_version == version,
+                SubPac.sub_id > last, SubPac.sub_id <= upto,
+                SubPac.sub_date >= min(dates),
+                SubPac.sub_date <= max(dates)), rollup)
+
+        db_session.query(ArchiveWatermark).filter_by(
+            archive=WATERMARK, distro_name=name, distro_version=version
+        ).update({'sub_id': upto})
+        rollups.add_counts(rollup)
+        db_session.commit()
+        counted += len(subs)
+
+
+def _rebuild_month(month):
+    """Replace the archive of a month, returning (month, rows, seconds)
+
+    The counts of each distro are replaced up to its watermark, which is
+    locked against update_archives meanwhile.
+
+    """
+    started = time.time()
+    start, end = month_range(month)
+    watermarks = _watermarks(lock=True)
+    if dropped_months([start]):
+        db_session.rollback()
+        raise ValueError("the raw submissions of %s were dropped"
+                         % start.strftime('%Y-%m'))
+    # a whole month has too many deltas to hold until the commit
+    rollup = {}
+    for (name, version), last in sorted(watermarks.iteritems()):
+        for key, count in rollups.iter_recount([
+                PackageArchive.month == start,
+                PackageArchive.distro_name == name,
+                PackageArchive.distro_version == version]):
+            rollup[key] = rollup.get(key, 0) - count
+            _flush_rollup(rollup)
+        PackageArchive.query.filter_by(
+            month=start, distro_name=name, distro_version=version
+        ).delete(synchronize_session=False)
+        _add_counts(_count_packages(
+            Sub.distro_name == name, Sub.distro_version == version,
+            SubPac.sub_id <= last, SubPac.sub_date >= start,
+            SubPac.sub_date < end), rollup, flush=True)
+
+    rows = PackageArchive.query.filter_by(month=start).count()
+    seconds = time.time() - started
+    db_session.merge(ArchiveRun(start, datetime.now(), rows, seconds))
+    rollups.add_counts(rollup)
+    db_session.commit()
+    response_cache.bump_generation()
+    return start, rows, seconds
+
+
+def _add_counts(counts, rollup, flush=False):
+    """Add the (key, count) pairs of an iterable to package_archives, a
+    batch of INSERT_BATCH_SIZE distinct keys at a time
+
+    :rollup: a dict the counts are added up into for rollups.add_counts,
+             which the caller applies once, right before it commits
+    :flush: whether to apply the rollup whenever it gets too big instead
+
+    """
+    batch = {}
+    for key, count in counts:
+        batch[key] = batch.get(key, 0) + count
+        if len(batch) >= INSERT_BATCH_SIZE:
+            _insert_counts(batch, rollup, flush)
+            batch = {}
+    _insert_counts(batch, rollup, flush)
+
+
+def _insert_counts(batch, rollup, flush):
+    insert_or_add(PackageArchive.__table__,
+                  [dict(zip(ARCHIVE_KEY, key), count=count)
+                   for key, count in sorted(batch.iteritems())],
+                  ['count'])
+    for key, count in batch.iteritems():
+        key = tuple(key[i] for i in ROLLUP_COLUMNS)
+        rollup[key] = rollup.get(key, 0) + count
+    if flush:
+        _flush_rollup(rollup)
+
+
+def _flush_rollup(rollup):
+    """Apply the deltas of a rollup and empty it, once it has at least
+    INSERT_BATCH_SIZE keys
+
+    package_rollups is locked first: the batches aren't sorted among
+    themselves, so concurrent transactions could deadlock on its rows.
+
+    """
+    if len(rollup) >= INSERT_BATCH_SIZE:
+        rollups.lock_rollups()
+        rollups.add_counts(rollup)
+        rollup.clear()
+
+
+def _count_packages(*criteria):
+    """Count the SubmissionPackages matching the criteria
+
+    Yields (key, count) pairs, where the keys are ordered like ARCHIVE_KEY.
+    The same key may be yielded more than once, its counts add up. The rows
+    are streamed from a server-side cursor where the database has them.
+
+    """
+    # count the integer ids first, the strings are only joined in for the
+    # (much fewer) rows which are left after that
+    counts = db_session.query(SubPac.pkg_id, SubPac.status_code,
+                              Sub.distro_name, Sub.distro_version,
+                              SubPac.sub_date,
+                              func.count('*').label('count')
+                              ).join(Sub)
+    counts = counts.filter(*criteria).group_by(
+        SubPac.pkg_id, SubPac.status_code, Sub.distro_name,
+        Sub.distro_version, SubPac.sub_date).subquery()
+
+    query = db_session.query(Pkg.pkg_name, Pkg.pkg_version,
+                             Pkg.pkg_release, Pkg.pkg_epoch, Pkg.pkg_arch,
+                             Pkg.vendor_name, Status.pkg_status,
+                             counts.c.distro_name, counts.c.distro_version,
+                             counts.c.sub_date, counts.c.count
+                             ).join(counts, counts.c.pkg_id == Pkg.pkg_id)
+    query = query.join(Status, Status.short_status == counts.c.status_code)
+
+    # the days add up into months
+    for row in query.yield_per(INSERT_BATCH_SIZE):
+        yield tuple(row[:9]) + (row.sub_date.replace(day=1),), row.count
+
+
+def _committed_sub_id():
+    """Return the highest sub_id below which no more submissions can be
+    committed
+    """
+    if db_session.bind.dialect.name == 'postgresql':
+        # waits for the transactions which are inserting submissions to
+        # finish, the ones after them can only get higher sub_ids
+        db_session.execute('LOCK TABLE submissions IN SHARE MODE')
+    high = db_session.query(func.max(Sub.sub_id)).scalar() or 0
+    db_session.commit()
+    return high
+
+
+def _watermarks(lock=False):
+    """Return a dict of (distro_name, distro_version) to watermarks
+
+    :lock: whether to keep the watermarks from moving until the end of the
+           transaction
+
+    """
+    query = db_session.query(ArchiveWatermark.distro_name,
+                             ArchiveWatermark.distro_version,
+                             ArchiveWatermark.sub_id
+                             ).filter_by(archive=WATERMARK)
+    if lock:
+        query = query.with_lockmode('read')
+    return dict(((name, version), sub_id) for name, version, sub_id in query)
+
+
+def _lock_watermark(name, version):
+    """Return the watermark of a distro, locked until the end of the
+    transaction so that concurrent runs don't count the same submissions
+    """
+    insert_ignore(ArchiveWatermark.__table__,
+                  [{'archive': WATERMARK, 'distro_name': name,
+                    'distro_version': version, 'sub_id': 0}])
+    return db_session.query(ArchiveWatermark.sub_id).filter_by(
+        archive=WATERMARK, distro_name=name, distro_version=version
+    ).with_lockmode('update').scalar()
+
 if __name__ == '__main__':
     update_archives()
@@ -0,0 +1,572 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Caches which stay warm across the requests of a worker"""
+
+import cPickle as pickle
+import fcntl
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from popcorn.configs import (DIMENSION_CACHE_SIZE, DIMENSION_CACHE_TTL,
+                             PACKAGE_CACHE_SIZE, RESPONSE_CACHE,
+                             RESPONSE_CACHE_DIR,
+                             RESPONSE_CACHE_INGEST_INTERVAL,
+                             RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL,
+                             RESPONSE_CACHE_TTLS,
+                             SUBMISSION_INTERVAL, SUBMISSION_LIMITER_SIZE,
+                             SUBMISSION_LIMITER_TTL)
+from popcorn.database import db_session, insert_ignore
+from popcorn.models import Arch, Distro, Package, System, Vendor
+
+# the columns which identify a Package, in the order of the tuples given to
+# PackageCache.package_ids
+PACKAGE_KEY = ('pkg_name', 'pkg_version', 'pkg_release', 'pkg_epoch',
+               'pkg_arch', 'vendor_name')
+# how many package names are looked up with one query
+LOOKUP_CHUNK_SIZE = 500
+
+
+class LRUCache(object):
+    """A mapping which holds at most `size` entries, each for at most `ttl`
+    seconds
+
+    When it's full, the least recently used entry gets evicted. It counts
+    the hits and misses of `get` so they can be reported.
+
+    """
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires < time.time():
+                self.misses += 1
+                return default
+            self._entries[key] = (value, expires)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time() + (ttl or self.ttl))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self),
+        }
+
+
+class TransactionCache(object):
+    """An LRUCache of rows read from the database, which only keeps them
+    once the transaction they were read in has committed
+
+    The rows found meanwhile are pending, for the current thread only:
+    publish() caches them after a commit and discard() forgets them after
+    a rollback, since they may have been written by the same transaction.
+    A rollback to a savepoint only forgets the rows found since the
+    savepoint(), the mark it returned is given to discard().
+
+    """
+    def __init__(self, size, ttl):
+        self._cache = LRUCache(size, ttl)
+        self._local = threading.local()
+
+    @property
+    def _pending(self):
+        try:
+            return self._local.pending
+        except AttributeError:
+            self._local.pending = {}
+            self._local.added = []
+            return self._local.pending
+
+    @property
+    def _added(self):
+        """The keys of _pending in the order they were found"""
+        self._pending
+        return self._local.added
+
+    def _get(self, key):
+        value = self._pending.get(key)
+        if value is None:
+            return self._cache.get(key)
+        self._cache.hits += 1
+        return value
+
+    def _found(self, key, value=True):
+        if key not in self._pending:
+            self._added.append(key)
+        self._pending[key] = value
+
+    def publish(self):
+        """Cache the rows found by the transaction which just committed"""
+        for key, value in self._pending.iteritems():
+            self._cache.set(key, value)
+        self._pending.clear()
+        del self._added[:]
+
+    def savepoint(self):
+        """Return a mark of the rows found so far, for discard()"""
+        return len(self._added)
+
+    def discard(self, mark=0):
+        """Forget the rows found by the transaction which was rolled back,
+        or only the ones found since the savepoint which returned `mark`"""
+        added = self._added
+        for key in added[mark:]:
+            del self._pending[key]
+        del added[mark:]
+
+    def clear(self):
+        self._cache.clear()
+        self.discard()
+
+    @property
+    def stats(self):
+        return self._cache.stats
+
+
+class DimensionCache(TransactionCache):
+    """Remembers which Arches, Distros and Vendors exist in the database
+
+    Everything is loaded with one query per table the first time it's
+    used. Like every TransactionCache it only keeps the rows it found once
+    their transaction commits, so a rolled back submission can't leave
+    behind entries for rows which were never committed.
+
+    """
+    def __init__(self, size=DIMENSION_CACHE_SIZE, ttl=DIMENSION_CACHE_TTL):
+        super(DimensionCache, self).__init__(size, ttl)
+        self._loaded = False
+
+    def preload(self):
+        for (arch,) in db_session.query(Arch.arch):
+            self._found(('arch', arch))
+        for name, version in db_session.query(Distro.distro_name,
+                                              Distro.distro_version):
+            self._found(('distro', name, version))
+        for (name,) in db_session.query(Vendor.vendor_name
+                                        ).limit(self._cache.size):
+            self._found(('vendor', name))
+        self._loaded = True
+
+    def clear(self):
+        super(DimensionCache, self).clear()
+        self._loaded = False
+
+    def _exists(self, key, query):
+        if not self._loaded:
+            self.preload()
+        if self._get(key):
+            return True
+        if query.first() is None:
+            return False
+        self._found(key)
+        return True
+
+    def has_arch(self, arch):
+        return self._exists(('arch', arch),
+                            db_session.query(Arch.arch).filter_by(arch=arch))
+
+    def has_distro(self, name, version):
+        return self._exists(('distro', name, version),
+                            db_session.query(Distro.distro_name).filter_by(
+                                distro_name=name, distro_version=version))
+
+    def add_vendors(self, vendors):
+        """Make sure all the given Vendors exist in the database
+
+        :vendors: a dict of vendor names to vendor urls
+
+        The vendors which aren't cached are looked up with one query and
+        the ones which don't exist yet are created with a single upsert.
+
+        """
+        if not self._loaded:
+            self.preload()
+        missing = set(name for name in vendors
+                      if not self._get(('vendor', name)))
+        if not missing:
+            return
+
+        query = db_session.query(Vendor.vendor_name).filter(
+            Vendor.vendor_name.in_(missing))
+        for (name,) in query:
+            self._found(('vendor', name))
+            missing.discard(name)
+        if missing:
+            # sorted, so that two transactions inserting the same vendors
+            # in one batch lock them in the same order; across the batches
+            # of a submission they still can deadlock, which rolls it back
+            insert_ignore(Vendor.__table__,
+                          [{'vendor_name': name, 'vendor_url': vendors[name]}
+                           for name in sorted(missing)])
+
+
+class PackageCache(TransactionCache):
+    """Maps Packages to their pkg_id, creating the ones which are missing
+
+    Like DimensionCache it only keeps the ids it found once their
+    transaction commits.
+
+    """
+    def __init__(self, size=PACKAGE_CACHE_SIZE, ttl=DIMENSION_CACHE_TTL):
+        super(PackageCache, self).__init__(size, ttl)
+
+    def package_ids(self, packages):
+        """Return a dict of the given Packages to their pkg_id
+
+        :packages: a collection of tuples ordered like PACKAGE_KEY, whose
+                   vendors already exist
+
+        The Packages which aren't cached are looked up by name, the ones
+        which don't exist yet are created with a single upsert and then
+        looked up again.
+
+        """
+        ids = {}
+        missing = set()
+        for package in packages:
+            pkg_id = self._get(package)
+            if pkg_id is None:
+                missing.add(package)
+            else:
+                ids[package] = pkg_id
+        if not missing:
+            return ids
+
+        found = self._lookup(missing)
+        for package, pkg_id in found.iteritems():
+            self._found(package, pkg_id)
+        missing.difference_update(found)
+        ids.update(found)
+        if missing:
+            # sorted, so that two transactions inserting the same packages
+            # in one batch lock them in the same order; across the batches
+            # of a submission they still can deadlock, which rolls it back
+            insert_ignore(Package.__table__,
+                          [dict(zip(PACKAGE_KEY, package))
+                           for package in sorted(missing)])
+            ids.update(self._lookup(missing))
+        return ids
+
+    def _lookup(self, packages):
+        """Return the pkg_id of those of the given Packages which exist"""
+        columns = [getattr(Package, column) for column in PACKAGE_KEY]
+        names = sorted(set(package[0] for package in packages))
+        found = {}
+        for i in xrange(0, len(names), LOOKUP_CHUNK_SIZE):
+            query = db_session.query(Package.pkg_id, *columns).filter(
+                Package.pkg_name.in_(names[i:i + LOOKUP_CHUNK_SIZE]))
+            for row in query:
+                # the submissions are read as UTF-8 encoded bytes
+                package = tuple(value.encode('utf-8')
+                                if isinstance(value, unicode) else value
+                                for value in row[1:])
+                if package in packages:
+                    found[package] = row[0]
+        return found
+
+
+class SubmissionLimiter(object):
+    """Remembers when Systems last submitted, so that submissions which
+    come too early can be turned away before their body is read
+
+    Systems which aren't cached get their last_sub_date read from the
+    systems table. A stale entry can only make the limiter let a
+    submission through, the database has the final word on those.
+
+    """
+    def __init__(self, size=SUBMISSION_LIMITER_SIZE,
+                 ttl=SUBMISSION_LIMITER_TTL):
+        self._cache = LRUCache(size, ttl)
+
+    def clear(self):
+        self._cache.clear()
+
+    @property
+    def stats(self):
+        return self._cache.stats
+
+    def record(self, hw_uuid, last_date):
+        if last_date is not None:
+            self._cache.set(hw_uuid, last_date)
+
+    def too_early(self, hw_uuid, today=None):
+        """Return the last submission date of a System if it submitted
+        less than SUBMISSION_INTERVAL days ago, otherwise None
+        """
+        last_date = self._cache.get(hw_uuid)
+        if last_date is None:
+            last_date = db_session.query(System.last_sub_date).filter_by(
+                sys_hwuuid=hw_uuid).scalar() or date.min
+            self._cache.set(hw_uuid, last_date)
+
+        today = today or date.today()
+        if last_date >= today - timedelta(days=SUBMISSION_INTERVAL):
+            return last_date
+
+
+class FilesystemCache(object):
+    """A cache kept in files under a directory, shared by all the workers
+    of a host
+
+    An entry is a pickled (value, expiry time) tuple, written to a
+    temporary file and renamed into place. Keys are (namespace, key)
+    tuples; clear_namespaces removes whole namespaces at once. An entry
+    which can't be written, e.g. because its namespace was just removed,
+    is simply not cached.
+
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def _path(self, namespace, key):
+        return os.path.join(self.path, str(namespace),
+                            hashlib.sha1(pickle.dumps(key)).hexdigest())
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(*key), 'rb') as f:
+                value, expires = pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            return default
+        if expires < time.time():
+            return default
+        return value
+
+    def set(self, key, value, ttl):
+        path = self._path(*key)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:  # another worker made it
+                pass
+        tmp_path = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((value, time.time() + ttl), f, -1)
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def clear_namespaces(self, keep):
+        """Remove the entries of every namespace but `keep`"""
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            if name != str(keep) and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def __len__(self):
+        return sum(len(files) for _, _, files in os.walk(self.path))
+
+
+class ResponseCache(object):
+    """Caches the responses of the views by their URL
+
+    :backend: 'memory', 'filesystem' or None to cache nothing
+    :path: the directory of the generation counter and of the filesystem
+           backend
+
+    Every cached response belongs to a generation. bump_generation, which
+    is called whenever submissions are recorded or archived, starts a new
+    one, so the responses cached until then aren't served anymore. The
+    ingestion starts one at most every `ingest_interval` seconds. The
+    generations are counted as long as there is a path, even without a
+    backend. The hits and misses are counted per view.
+
+    """
+    def __init__(self, backend=RESPONSE_CACHE, path=RESPONSE_CACHE_DIR,
+                 size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL,
+                 ttls=RESPONSE_CACHE_TTLS,
+                 ingest_interval=RESPONSE_CACHE_INGEST_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.ttls = ttls
+        self.ingest_interval = ingest_interval
+        self.hits = {}
+        self.misses = {}
+        if backend is not None and not path:
+            raise ValueError("the response cache needs RESPONSE_CACHE_DIR")
+        if backend is None:
+            self._backend = None
+        elif backend == 'memory':
+            self._backend = LRUCache(size, ttl)
+        elif backend == 'filesystem':
+            self._backend = FilesystemCache(os.path.join(path, 'responses'))
+        else:
+            raise ValueError("unknown response cache backend %s" % backend)
+
+    def _ttl(self, view):
+        if self._backend is None:
+            return 0
+        return self.ttls.get(view, self.ttl)
+
+    def get(self, view, key, generation=None):
+        """Return the cached response of a view, or None
+
+        :key: whatever tells apart the responses of the view, e.g. its
+              URL and content type
+        :generation: the generation to look in, the current one if None
+
+        """
+        if not self._ttl(view):
+            return None
+        if generation is None:
+            generation = self.generation()
+        response = self._backend.get((generation, (view, key)))
+        counts = self.misses if response is None else self.hits
+        counts[view] = counts.get(view, 0) + 1
+        return response
+
+    def set(self, view, key, response, generation=None):
+        """Cache the response of a view in a generation, which should be
+        the one which was current before the view started running
+
+        Nothing is cached if a newer generation has started since.
+
+        """
+        ttl = self._ttl(view)
+        if not ttl:
+            return
+        current = self.generation()
+        if generation is None:
+            generation = current
+        elif generation != current:
+            return
+        self._backend.set((generation, (view, key)), response, ttl)
+
+    def generation(self):
+        """Return the current generation, which every worker reads from
+        the generation file"""
+        return self.validators()[0]
+
+    def validators(self):
+        """Return the current generation and when it started, as a
+        datetime, or (0, None) if it never did
+
+        Returns None if there is no RESPONSE_CACHE_DIR, where the
+        generation is kept.
+
+        """
+        if self.path is None:
+            return None
+        try:
+            with open(os.path.join(self.path, 'generation')) as f:
+                started = datetime.utcfromtimestamp(
+                    os.fstat(f.fileno()).st_mtime)
+                return int(f.read() or 0), started
+        except IOError:
+            return 0, None
+
+    def bump_generation(self, ingested=False):
+        """Start a new generation, so nothing cached until now is served
+
+        :ingested: whether it's for newly recorded submissions, which
+                   don't start one if the current generation is less than
+                   `ingest_interval` seconds old
+
+        """
+        if self.path is None:
+            return
+        if ingested and self.ingest_interval:
+            started = self.validators()[1]
+            if (started is not None and datetime.utcnow() - started
+                    < timedelta(seconds=self.ingest_interval)):
+                return
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        with open(os.path.join(self.path, 'generation.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            generation = self.generation() + 1
+            tmp_path = os.path.join(self.path, 'generation.tmp')
+            with open(tmp_path, 'w') as f:
+                f.write(str(generation))
+            os.rename(tmp_path, os.path.join(self.path, 'generation'))
+        if isinstance(self._backend, FilesystemCache):
+            self._backend.clear_namespaces(keep=generation)
+
+    def clear(self):
+        if isinstance(self._backend, LRUCache):
+            self._backend.clear()
+        self.hits = {}
+        self.misses = {}
+
+    @property
+    def stats(self):
+        if self._backend is None:
+            return {}
+        return {
+            'hits': sum(self.hits.itervalues()),
+            'misses': sum(self.misses.itervalues()),
+            'entries': len(self._backend),
+            'generation': self.generation(),
+            'views': dict((view, {'hits': self.hits.get(view, 0),
+                                  'misses': self.misses.get(view, 0)})
+                          for view in set(self.hits) | set(self.misses)),
+        }
+
+
+dimension_cache = DimensionCache()
+package_cache = PackageCache()
+submission_limiter = SubmissionLimiter()
+response_cache = ResponseCache()
@@ -22,14 +22,33 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 
-from sqlalchemy import create_engine
+from sqlalchemy import bindparam, create_engine, event, text
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
 from popcorn.configs import DB_ENGINE
 
 
+def sqlite_savepoints(engine):
+    """Make SAVEPOINTs work on a SQLite engine
+
+    pysqlite commits the open transaction before running anything which
+    isn't DML, SAVEPOINT included, so the transactions are started by
+    SQLAlchemy instead.
+
+    """
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_con, con_record):
+        dbapi_con.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def begin(conn):
+        conn.execute('BEGIN')
+
+
 engine = create_engine(DB_ENGINE, convert_unicode=True)
+if engine.dialect.name == 'sqlite':
+    sqlite_savepoints(engine)
 db_session = scoped_session(sessionmaker(autocommit=False,
                                          autoflush=False,
                                          bind=engine))
@@ -56,3 +75,60 @@ def init_db():
 
 def drop_db():
     Base.metadata.drop_all(bind=engine)
+
+
+def init_worker():
+    """Initializer of the worker processes of a multiprocessing.Pool"""
+    # connections inherited from the parent must not be shared
+    db_session.remove()
+    engine.dispose()
+
+
+def insert_ignore(table, rows):
+    """Insert rows into a table, skipping the ones which already exist
+
+    :table: a Table object
+    :rows: a list of dicts mapping column names to values
+
+    All the rows are sent as a single INSERT ... ON CONFLICT DO NOTHING
+    statement, which both PostgreSQL and SQLite understand, so concurrent
+    inserts of the same row don't fail. Returns the number of rows which
+    were inserted when a single row is given.
+
+    """
+    columns = rows[0].keys()
+    statement = text('INSERT INTO %s (%s) VALUES (%s) ON CONFLICT DO NOTHING'
+                     % (table.name, ', '.join(columns),
+                        ', '.join(':' + c for c in columns)),
+                     bindparams=[bindparam(c, type_=table.c[c].type)
+                                 for c in columns])
+    if len(rows) == 1:
+        return db_session.execute(statement, rows[0]).rowcount
+    db_session.execute(statement, rows)
+
+
+def insert_or_add(table, rows, counters):
+    """Insert rows into a table, adding their counters to the rows which
+    already exist instead
+
+    :table: a Table object
+    :rows: a list of dicts mapping column names to values
+    :counters: the names of the columns which get added up
+
+    Rows conflict on the primary key of the table. Like insert_ignore, this
+    is an INSERT ... ON CONFLICT statement for both PostgreSQL and SQLite.
+
+    """
+    if not rows:
+        return
+    columns = rows[0].keys()
+    key = [column.name for column in table.primary_key]
+    statement = text('INSERT INTO %s (%s) VALUES (%s) '
+                     'ON CONFLICT (%s) DO UPDATE SET %s'
+                     % (table.name, ', '.join(columns),
+                        ', '.join(':' + c for c in columns), ', '.join(key),
+                        ', '.join('%s = %s.%s + excluded.%s'
+                                  % (c, table.name, c, c) for c in counters)),
+                     bindparams=[bindparam(c, type_=table.c[c].type)
+                                 for c in columns])
+    db_session.execute(statement, rows)
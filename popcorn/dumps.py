@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Static dumps of the rankings and the archives, for a file server
+
+    $ popcorn-server dump
+
+writes into DUMP_DIR:
+
+ - <distro>/<version>/<YYYY-MM>/by_<ranking>.gz, the rankings of
+   package_ranks as "rank name count" lines, like Debian popcon's by_inst
+   and by_vote files
+ - archives/<YYYY-MM>.csv.gz, the rows of package_archives of a month, like
+   /export/archives.csv
+ - manifest.json, which lists every file with its size, its SHA-256 and
+   the fingerprint of the data it was written from, and SHA256SUMS for
+   `sha256sum -c`
+
+Every file is written under a temporary name and renamed into place, and
+the manifest goes last, so a reader never sees a half written file. A file
+is only written again when the fingerprint of its data changed: how many
+rows there are and what their counts add up to, and when their month was
+last rebuilt or ranked.
+
+The distro names and versions come from the submissions. The ones which
+aren't safe as file names are changed, and get a hash of what they were
+so that two of them don't end up in the same file.
+
+"""
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import func
+
+from popcorn.configs import DUMP_DIR, EXPORT_BATCH_SIZE
+from popcorn.database import db_session
+from popcorn.export import archive_rows, csv_lines, gzip_chunks
+from popcorn.models import ArchiveRun, PackageArchive, PackageRank
+
+MANIFEST = 'manifest.json'
+CHECKSUMS = 'SHA256SUMS'
+
+
+def dump(path=DUMP_DIR):
+    """Write the files whose data changed since the last dump
+
+    Returns the paths, relative to `path`, of the files which were written.
+    The files of rankings which are gone are removed.
+
+    """
+    old = _read_manifest(path)['files']
+    files = {}
+    written = []
+    for relpath, fingerprint, chunks in _dumps():
+        entry = old.get(relpath)
+        if (entry is not None and entry['fingerprint'] == fingerprint
+                and os.path.exists(os.path.join(path, relpath))):
+            files[relpath] = entry
+            continue
+        files[relpath] = dict(_write(path, relpath, chunks()),
+                              fingerprint=fingerprint)
+        written.append(relpath)
+
+    _write(path, CHECKSUMS, ['%s  %s\n' % (files[relpath]['sha256'], relpath)
+                             for relpath in sorted(files)])
+    _write(path, MANIFEST, [json.dumps(
+        {'generated': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+         'files': files}, indent=1, sort_keys=True)])
+    for relpath in set(old) - set(files):
+        try:
+            os.remove(os.path.join(path, relpath))
+        except OSError:
+            pass
+    return sorted(written)
+
+
+def _dumps():
+    """Yield (path, fingerprint, chunks) for every file of a dump
+
+    chunks is a function which returns the contents of the file as an
+    iterable of strings.
+
+    """
+    rebuilt = dict((month, finished.strftime('%Y-%m-%dT%H:%M:%S'))
+                   for month, finished in db_session.query(
+                       ArchiveRun.month, ArchiveRun.finished)
+                   if finished is not None)
+    for month, rows, total in db_session.query(
+            PackageArchive.month, func.count(),
+            func.sum(PackageArchive.count)).group_by(PackageArchive.month):
+        yield ('archives/%s.csv.gz' % month.strftime('%Y-%m'),
+               [rows, int(total or 0), rebuilt.get(month)],
+               _archive_chunks(month))
+
+    for name, version, month, ranking, rows, total, ranked in (
+            db_session.query(
+                PackageRank.distro_name, PackageRank.distro_version,
+                PackageRank.month, PackageRank.ranking, func.count(),
+                func.sum(PackageRank.count), func.max(PackageRank.ranked)
+            ).group_by(PackageRank.distro_name, PackageRank.distro_version,
+                       PackageRank.month, PackageRank.ranking)):
+        yield ('%s/%s/%s/by_%s.gz' % (_safe(name), _safe(version),
+                                      month.strftime('%Y-%m'), ranking),
+               [rows, int(total or 0),
+                ranked.strftime('%Y-%m-%dT%H:%M:%S.%f')],
+               _ranking_chunks(name, version, month, ranking))
+
+
+def _archive_chunks(month):
+    return lambda: gzip_chunks(csv_lines(archive_rows({'month': month})))
+
+
+def _ranking_chunks(name, version, month, ranking):
+    def chunks():
+        yield ('# popcorn %s %s %s by_%s\n# rank name count\n'
+               % (name, version, month.strftime('%Y-%m'), ranking)
+               ).encode('utf-8')
+        query = db_session.query(
+            PackageRank.rank, PackageRank.pkg_name, PackageRank.count
+        ).filter_by(distro_name=name, distro_version=version, month=month,
+                    ranking=ranking).order_by(PackageRank.rank)
+        for rank, pkg_name, count in query.yield_per(EXPORT_BATCH_SIZE):
+            yield ('%d %s %d\n' % (rank, pkg_name, count)).encode('utf-8')
+    return lambda: gzip_chunks(chunks())
+
+
+def _safe(name):
+    """Turn a distro name or version, which comes from the submissions,
+    into something which can't leave DUMP_DIR"""
+    safe = re.sub(r'[^\w.+-]', '_', name).lstrip('.')
+    if safe != name:
+        safe += '-' + hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]
+    return safe
+
+
+def _write(path, relpath, chunks):
+    """Write a file under a temporary name and rename it into place
+
+    Returns a dict with its size and its SHA-256.
+
+    """
+    filename = os.path.join(path, relpath)
+    if not os.path.isdir(os.path.dirname(filename)):
+        os.makedirs(os.path.dirname(filename))
+    sha256 = hashlib.sha256()
+    size = 0
+    tmp_path = filename + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+            sha256.update(chunk)
+            size += len(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_path, filename)
+    return {'sha256': sha256.hexdigest(), 'size': size}
+
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            return json.load(f)
+    except IOError:
+        return {'files': {}}
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Bulk exports of package_archives as NDJSON or CSV
+
+The rows are read from a server-side cursor where the database has one
+and written out EXPORT_BATCH_SIZE at a time, so an export of any size
+takes the same memory. They come in no particular order, which spares
+the database a sort.
+
+"""
+import csv
+import json
+import zlib
+from cStringIO import StringIO
+
+from popcorn.archive import ARCHIVE_KEY
+from popcorn.configs import EXPORT_BATCH_SIZE, EXPORT_GZIP_LEVEL
+from popcorn.database import db_session
+from popcorn.models import PackageArchive
+
+# the columns of an export
+COLUMNS = ARCHIVE_KEY + ('count',)
+# the columns an export can be filtered by
+FILTERS = ('distro_name', 'distro_version', 'pkg_arch', 'month',
+           'pkg_status')
+
+
+def archive_rows(filters, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the rows of package_archives as tuples ordered like COLUMNS
+
+    :filters: a dict mapping some of FILTERS to the values they must have
+
+    The months are written as YYYY-MM.
+
+    """
+    query = db_session.query(
+        *[getattr(PackageArchive, c) for c in COLUMNS]).filter_by(**filters)
+    month = COLUMNS.index('month')
+    for row in query.yield_per(batch_size):
+        row = list(row)
+        row[month] = row[month].strftime('%Y-%m')
+        yield row
+
+
+def ndjson(rows, batch_size=EXPORT_BATCH_SIZE):
+    """Turn rows into chunks of JSON objects, one per line"""
+    return _batches((json.dumps(dict(zip(COLUMNS, row))) + '\n'
+                     for row in rows), batch_size)
+
+
+def csv_lines(rows, batch_size=EXPORT_BATCH_SIZE):
+    """Turn rows into chunks of CSV, after a line with the COLUMNS"""
+    buf = StringIO()
+    writer = csv.writer(buf)
+
+    def line(row):
+        writer.writerow([unicode(v).encode('utf-8') for v in row])
+        value = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return value
+    yield line(COLUMNS)
+    for chunk in _batches((line(row) for row in rows), batch_size):
+        yield chunk
+
+
+def gzip_chunks(chunks, level=EXPORT_GZIP_LEVEL):
+    """Compress chunks into a gzip stream as they come"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        # zlib holds on to small inputs until it has enough of them
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _batches(lines, batch_size):
+    """Join lines into chunks of batch_size lines"""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+# the formats of the exports, by extension: (writer, mimetype)
+FORMATS = {'ndjson': (ndjson, 'application/x-ndjson'),
+           'csv': (csv_lines, 'text/csv')}
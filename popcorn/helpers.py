@@ -22,8 +22,12 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 
+import hashlib
 from functools import wraps
-from flask import request, jsonify, render_template
+from flask import (current_app, request, jsonify, make_response,
+                   render_template)
+
+from popcorn.cache import response_cache
 
 
 def request_wants_json():
@@ -35,9 +39,41 @@ def request_wants_json():
 
 
 def render(template=None):
+    """Render what a view returns as JSON or with a template, depending on
+    what the client asked for
+
+    Successful responses are kept in the response cache, by URL and
+    content type, and carry an ETag and a Last-Modified header. When the
+    generation of the response cache is kept, those come from it (the ETag
+    from the URL too), and a client whose If-None-Match is current gets a
+    304 before the view runs. If-Modified-Since alone, which can't tell
+    the URLs apart, is only answered once the view found the page.
+    Otherwise the ETag is a hash of the response.
+
+    """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            wants_json = request_wants_json()
+            validators = response_cache.validators()
+            generation = None
+            if validators is not None:
+                # read once, so a response computed while a new generation
+                # starts is cached in the old one
+                generation = validators[0]
+            if validators is not None and request.if_none_match:
+                unchanged = _conditional(current_app.response_class(),
+                                         wants_json, validators)
+                if unchanged.status_code == 304:
+                    return unchanged
+
+            key = (request.full_path, wants_json)
+            cached = response_cache.get(f.__name__, key, generation)
+            if cached is not None:
+                data, mimetype = cached
+                return _conditional(current_app.response_class(
+                    data, mimetype=mimetype), wants_json, validators)
+
             ctx = f(*args, **kwargs)
             if ctx is None:
                 ctx = {}
@@ -49,9 +85,37 @@ def render(template=None):
             except KeyError:
                 status_code = 200
 
-            if request_wants_json():
-                return jsonify(ctx), status_code
-
-            return render_template(template, **ctx), status_code
+            if wants_json:
+                response = make_response(jsonify(ctx), status_code)
+            else:
+                response = make_response(render_template(template, **ctx),
+                                         status_code)
+            if status_code != 200:
+                return response
+            response_cache.set(f.__name__, key,
+                               (response.get_data(), response.mimetype),
+                               generation)
+            return _conditional(response, wants_json, validators)
         return decorated_function
     return decorator
+
+
+def _conditional(response, wants_json, validators):
+    """Add the validators to a response and turn it into a 304 if the
+    client's copy is still current
+
+    :validators: the (generation, started) of the response cache, or None
+                 to hash the response instead
+
+    """
+    if validators is None:
+        response.add_etag()
+    else:
+        generation, started = validators
+        # the JSON and the HTML of a URL are different representations
+        url = hashlib.sha1(request.full_path.encode('utf-8')).hexdigest()
+        response.set_etag('%s-%d-%s' % ('json' if wants_json else 'html',
+                                        generation, url[:16]), weak=True)
+        response.last_modified = started
+    response.vary.add('Accept')
+    return response.make_conditional(request)
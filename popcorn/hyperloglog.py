@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""HyperLogLog sketches, which estimate how many distinct values they've
+been fed with in a fixed amount of memory
+
+The sketches of different sets can be merged into the sketch of their
+union. NumPy is used for merging and estimating when it's installed.
+
+"""
+import hashlib
+import math
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from popcorn.configs import HLL_PRECISION
+
+
+def position(value, precision=HLL_PRECISION):
+    """Return the (register, rank) a value sets in a sketch
+
+    :value: a string
+    :precision: the number of bits of the hash which select the register
+
+    The rank is the position of the first set bit in the rest of the hash.
+
+    """
+    hashed = struct.unpack('>Q', hashlib.sha1(value).digest()[:8])[0]
+    bits = 64 - precision
+    return hashed >> bits, bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+
+
+class HyperLogLog(object):
+    """A sketch of 2 ** precision registers, each one holding the highest
+    rank seen for it
+
+    :registers: the registers of a stored sketch, as a string
+    :precision: the precision of a new, empty sketch
+
+    """
+    def __init__(self, registers=None, precision=HLL_PRECISION):
+        if registers is None:
+            registers = bytearray(1 << precision)
+        else:
+            precision = len(registers).bit_length() - 1
+            if len(registers) != 1 << precision:
+                raise ValueError("a sketch has a power of 2 registers")
+        self.precision = precision
+        self.registers = bytearray(registers)
+
+    def add(self, value):
+        """Add a value to the sketch"""
+        return self.set(*position(value, self.precision))
+
+    def set(self, register, rank):
+        """Raise a register to a rank, returns False if it was already
+        that high
+
+        """
+        if rank <= self.registers[register]:
+            return False
+        self.registers[register] = rank
+        return True
+
+    def update(self, other):
+        """Merge another sketch of the same precision into this one"""
+        if other.precision != self.precision:
+            raise ValueError("can't merge sketches of different precisions")
+        if numpy is not None:
+            self.registers = bytearray(numpy.maximum(
+                numpy.frombuffer(self.registers, numpy.uint8),
+                numpy.frombuffer(other.registers, numpy.uint8)).tostring())
+        else:
+            self.registers = bytearray(map(max, self.registers,
+                                           other.registers))
+
+    @classmethod
+    def union(cls, sketches, precision=HLL_PRECISION):
+        """Return the sketch of the union of the sets of some sketches"""
+        union = cls(precision=precision)
+        for sketch in sketches:
+            union.update(sketch)
+        return union
+
+    def count(self):
+        """Estimate how many distinct values were added"""
+        size = len(self.registers)
+        if numpy is not None:
+            registers = numpy.frombuffer(self.registers, numpy.uint8)
+            total = numpy.ldexp(1.0, -registers.astype(int)).sum()
+            zeros = size - numpy.count_nonzero(registers)
+        else:
+            total = sum(math.ldexp(1.0, -rank) for rank in self.registers)
+            zeros = self.registers.count('\x00')
+
+        if size >= 128:
+            alpha = 0.7213 / (1 + 1.079 / size)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[size]
+        estimate = alpha * size * size / total
+        if estimate <= 2.5 * size and zeros:
+            # small cardinalities are better estimated by linear counting
+            estimate = size * math.log(size / float(zeros))
+        return int(round(estimate))
+
+    def __str__(self):
+        return str(self.registers)
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Bring the databases of older versions of popcorn up to date
+
+    $ popcorn-server migrate
+
+Every migration checks whether it is needed, so running them again does
+nothing.
+
+"""
+
+from datetime import datetime
+
+from sqlalchemy import (Column, Date, Integer, MetaData, String, Table, and_,
+                        distinct, exists, func, select)
+from sqlalchemy.engine import reflection
+
+from popcorn import rollups
+from popcorn.archive import WATERMARK
+from popcorn.database import Base, engine
+from popcorn.models import (ArchiveRun, ArchiveWatermark, DistroBreakdown,
+                            DistroSummary, DroppedMonth, Package,
+                            PackageArchive, PackageRollup, Submission,
+                            SubmissionPackage)
+from popcorn.partitions import create_partitions_for, month_range, partitioned
+from popcorn.summaries import recount, recount_breakdowns
+
+# submission_packages as it was before the packages got their own table
+legacy_metadata = MetaData()
+legacy_submission_packages = Table(
+    'submission_packages', legacy_metadata,
+    Column('sub_id', Integer, primary_key=True),
+    Column('sub_date', Date(), primary_key=True),
+    Column('pkg_name', String(50), primary_key=True),
+    Column('pkg_version', String(50), primary_key=True),
+    Column('pkg_release', String(50), primary_key=True),
+    Column('pkg_epoch', String(10), primary_key=True),
+    Column('pkg_arch', String(10), primary_key=True),
+    Column('vendor_name', String(20), primary_key=True),
+    Column('pkg_status', String(10), nullable=False))
+
+
+def intern_packages(connection):
+    """Move the packages listed in submission_packages into the packages
+    table, leaving only their pkg_id and status code behind
+
+    Returns False if submission_packages already has the new layout.
+
+    """
+    inspector = reflection.Inspector.from_engine(connection)
+    if 'submission_packages' not in inspector.get_table_names():
+        return False
+    columns = [c['name'] for c in inspector.get_columns('submission_packages')]
+    if 'pkg_name' not in columns:
+        return False
+
+    connection.execute('ALTER TABLE submission_packages '
+                       'RENAME TO legacy_submission_packages')
+    if connection.dialect.name == 'postgresql':
+        # the name of the primary key's index doesn't follow the table
+        connection.execute('ALTER INDEX submission_packages_pkey '
+                           'RENAME TO legacy_submission_packages_pkey')
+    Package.__table__.create(connection, checkfirst=True)
+    SubmissionPackage.__table__.create(connection)
+    create_partitions_for(connection, 'legacy_submission_packages')
+
+    connection.execute(
+        'INSERT INTO packages (pkg_name, pkg_version, pkg_release, '
+        'pkg_epoch, pkg_arch, vendor_name) '
+        'SELECT DISTINCT pkg_name, pkg_version, pkg_release, pkg_epoch, '
+        'pkg_arch, vendor_name FROM legacy_submission_packages')
+    connection.execute(
+        'INSERT INTO submission_packages (sub_id, sub_date, pkg_id, '
+        'status_code) '
+        'SELECT l.sub_id, l.sub_date, p.pkg_id, s.short_status '
+        'FROM legacy_submission_packages l '
+        'JOIN packages p ON p.pkg_name = l.pkg_name '
+        'AND p.pkg_version = l.pkg_version '
+        'AND p.pkg_release = l.pkg_release '
+        'AND p.pkg_epoch = l.pkg_epoch '
+        'AND p.pkg_arch = l.pkg_arch '
+        'AND p.vendor_name = l.vendor_name '
+        'JOIN package_statuses s ON s.pkg_status = l.pkg_status')
+    connection.execute('DROP TABLE legacy_submission_packages')
+    return True
+
+
+def partition_submission_packages(connection):
+    """Move the rows of submission_packages into monthly partitions
+
+    Only runs on PostgreSQL when PARTITION_BY_MONTH is set. Returns False
+    if there's nothing to do.
+
+    """
+    if not partitioned(connection):
+        return False
+    relkind = connection.execute("SELECT relkind FROM pg_class "
+                                 "WHERE relname = 'submission_packages'"
+                                 ).scalar()
+    if relkind != 'r':
+        return False
+
+    indexes = connection.execute("SELECT indexname FROM pg_indexes "
+                                 "WHERE tablename = 'submission_packages'"
+                                 ).fetchall()
+    connection.execute('ALTER TABLE submission_packages '
+                       'RENAME TO unpartitioned_submission_packages')
+    for (index,) in indexes:
+        connection.execute('ALTER INDEX %s RENAME TO unpartitioned_%s'
+                           % (index, index))
+    SubmissionPackage.__table__.create(connection)
+    create_partitions_for(connection, 'unpartitioned_submission_packages')
+
+    connection.execute(
+        'INSERT INTO submission_packages (sub_id, sub_date, pkg_id, '
+        'status_code) '
+        'SELECT sub_id, sub_date, pkg_id, status_code '
+        'FROM unpartitioned_submission_packages')
+    connection.execute('DROP TABLE unpartitioned_submission_packages')
+    return True
+
+
+def add_archive_epochs(connection):
+    """Tell the epochs of the packages in package_archives apart
+
+    The archived counts are copied with the epoch of their package when
+    packages knows of only one, and an empty one otherwise. package_rollups,
+    which is added up from them, is dropped for fill_package_rollups to
+    add up again.
+
+    Returns False if package_archives already has the epochs.
+
+    """
+    inspector = reflection.Inspector.from_engine(connection)
+    tables = inspector.get_table_names()
+    if 'package_archives' not in tables:
+        return False
+    columns = [c['name'] for c in inspector.get_columns('package_archives')]
+    if 'pkg_epoch' in columns:
+        return False
+
+    connection.execute('ALTER TABLE package_archives '
+                       'RENAME TO legacy_package_archives')
+    if connection.dialect.name == 'postgresql':
+        connection.execute('ALTER INDEX package_archives_pkey '
+                           'RENAME TO legacy_package_archives_pkey')
+    PackageArchive.__table__.create(connection)
+    connection.execute(
+        "INSERT INTO package_archives (pkg_name, pkg_version, pkg_release, "
+        "pkg_epoch, pkg_arch, vendor_name, pkg_status, distro_name, "
+        "distro_version, month, count) "
+        "SELECT a.pkg_name, a.pkg_version, a.pkg_release, "
+        "COALESCE((SELECT MIN(p.pkg_epoch) FROM packages p "
+        "WHERE p.pkg_name = a.pkg_name AND p.pkg_version = a.pkg_version "
+        "AND p.pkg_release = a.pkg_release AND p.pkg_arch = a.pkg_arch "
+        "AND p.vendor_name = a.vendor_name "
+        "HAVING COUNT(DISTINCT p.pkg_epoch) = 1), ''), "
+        "a.pkg_arch, a.vendor_name, a.pkg_status, a.distro_name, "
+        "a.distro_version, a.month, a.count "
+        "FROM legacy_package_archives a")
+    connection.execute('DROP TABLE legacy_package_archives')
+    if 'package_rollups' in tables:
+        PackageRollup.__table__.drop(connection)
+    return True
+
+
+def fill_distro_summaries(connection):
+    """Create distro_summaries and count the submissions already recorded
+
+    Returns False if the table already exists.
+
+    """
+    inspector = reflection.Inspector.from_engine(connection)
+    if 'distro_summaries' in inspector.get_table_names():
+        return False
+    table = DistroSummary.__table__
+    table.create(connection)
+    rows = [{'distro_name': name, 'distro_version': version,
+             'submissions': submissions, 'packages': packages}
+            for (name, version), (submissions, packages)
+            in recount(connection).iteritems()]
+    if rows:
+        connection.execute(table.insert(), rows)
+    return True
+
+
+def fill_distro_breakdowns(connection):
+    """Create distro_breakdowns and count the submissions already recorded
+
+    Returns False if the table already exists.
+
+    """
+    inspector = reflection.Inspector.from_engine(connection)
+    if 'distro_breakdowns' in inspector.get_table_names():
+        return False
+    table = DistroBreakdown.__table__
+    table.create(connection)
+    rows = [{'distro_name': name, 'distro_version': version,
+             'breakdown': breakdown, 'value': value,
+             'submissions': submissions}
+            for (name, version, breakdown, value), submissions
+            in recount_breakdowns(connection).iteritems()]
+    if rows:
+        connection.execute(table.insert(), rows)
+    return True
+
+
+def index_submissions_by_distro(connection):
+    """Add the index which lists the submissions of a distro
+
+    Returns False if it already exists.
+
+    """
+    inspector = reflection.Inspector.from_engine(connection)
+    if 'ix_submissions_distro' in [index['name'] for index in
+                                   inspector.get_indexes('submissions')]:
+        return False
+    [index] = [index for index in Submission.__table__.indexes
+               if index.name == 'ix_submissions_distro']
+    index.create(connection)
+    return True
+
+
+def fill_package_rollups(connection):
+    """Create package_rollups and add up the packages already archived
+
+    Returns False if the table already exists.
+
+    """
+    inspector = reflection.Inspector.from_engine(connection)
+    if 'package_rollups' in inspector.get_table_names():
+        return False
+    table = PackageRollup.__table__
+    table.create(connection)
+    rows = [dict(zip(rollups.ROLLUP_KEY, key), count=count)
+            for key, count in rollups.recount(connection=connection)
+            .iteritems()]
+    if rows:
+        connection.execute(table.insert(), rows)
+    return True
+
+
+def seed_archive_watermarks(connection):
+    """Set the watermarks of package_archives from the months which were
+    archived whole, before there were watermarks
+
+    The watermark of a distro is its highest sub_id in those months, so
+    update_archives doesn't count them again. The months which weren't
+    archived but have submissions below a watermark are queued in
+    archive_runs, for `archive --resume` to count them.
+
+    Returns False if there are watermarks already, or no archives.
+
+    """
+    inspector = reflection.Inspector.from_engine(connection)
+    tables = inspector.get_table_names()
+    if 'package_archives' not in tables:
+        return False
+    watermarks = ArchiveWatermark.__table__
+    if 'archive_watermarks' in tables and connection.scalar(
+            select([func.count()]).select_from(watermarks)):
+        return False
+    archives = PackageArchive.__table__
+    archived = set(month for (month,) in connection.execute(
+        select([distinct(archives.c.month)])))
+    if not archived:
+        return False
+    runs = ArchiveRun.__table__
+    watermarks.create(connection, checkfirst=True)
+    runs.create(connection, checkfirst=True)
+
+    subs = Submission.__table__
+    last = {}
+    for month in archived:
+        start, end = month_range(month)
+        for name, version, sub_id in connection.execute(
+                select([subs.c.distro_name, subs.c.distro_version,
+                        func.max(subs.c.sub_id)])
+                .where(and_(subs.c.sub_date >= start, subs.c.sub_date < end))
+                .group_by(subs.c.distro_name, subs.c.distro_version)):
+            last[name, version] = max(sub_id, last.get((name, version), 0))
+    if last:
+        connection.execute(watermarks.insert(), [
+            {'archive': WATERMARK, 'distro_name': name,
+             'distro_version': version, 'sub_id': sub_id}
+            for (name, version), sub_id in sorted(last.iteritems())])
+
+    pending = set()
+    for (name, version), sub_id in last.iteritems():
+        pending.update(day.replace(day=1) for (day,) in connection.execute(
+            select([distinct(subs.c.sub_date)]).where(and_(
+                subs.c.distro_name == name, subs.c.distro_version == version,
+                subs.c.sub_id <= sub_id))))
+    pending -= archived
+    pending -= set(month for (month,) in connection.execute(
+        select([runs.c.month])))
+    if pending:
+        connection.execute(runs.insert(), [{'month': month}
+                                           for month in sorted(pending)])
+    return True
+
+
+def record_dropped_months(connection):
+    """Create dropped_months and record the archived months which have no
+    raw submissions left, because they were dropped or purged before
+
+    Returns False if the table already exists.
+
+    """
+    inspector = reflection.Inspector.from_engine(connection)
+    tables = inspector.get_table_names()
+    if 'dropped_months' in tables:
+        return False
+    table = DroppedMonth.__table__
+    table.create(connection)
+    if 'package_archives' not in tables:
+        return True
+    archives = PackageArchive.__table__
+    packages = SubmissionPackage.__table__
+    now = datetime.now()
+    rows = []
+    for (month,) in connection.execute(
+            select([distinct(archives.c.month)])):
+        start, end = month_range(month)
+        if not connection.scalar(select([exists().where(and_(
+                packages.c.sub_date >= start,
+                packages.c.sub_date < end))])):
+            rows.append({'month': month, 'dropped': now})
+    if rows:
+        connection.execute(table.insert(), rows)
+    return True
+
+
+def create_new_tables(connection):
+    """Create the tables added since the database was set up, empty
+
+    Returns False if there are none.
+
+    """
+    inspector = reflection.Inspector.from_engine(connection)
+    existing = set(inspector.get_table_names())
+    missing = [table for table in Base.metadata.sorted_tables
+               if table.name not in existing]
+    Base.metadata.create_all(connection, tables=missing)
+    return bool(missing)
+
+# in the order in which they have to run
+MIGRATIONS = [intern_packages, partition_submission_packages,
+              add_archive_epochs, fill_distro_summaries, fill_package_rollups,
+              fill_distro_breakdowns, index_submissions_by_distro,
+              seed_archive_watermarks, record_dropped_months,
+              create_new_tables]
+
+
+def migrate(bind=engine):
+    """Run the migrations which are needed, each in its own transaction
+
+    Returns the names of the migrations which were run.
+
+    """
+    done = []
+    for migration in MIGRATIONS:
+        with bind.begin() as connection:
+            if migration(connection):
+                done.append(migration.__name__)
+    return done
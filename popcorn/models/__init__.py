@@ -30,5 +30,14 @@ from submission import Submission
 from system import System
 from vendor import Vendor
 from package_status import PackageStatus
+from package import Package
 from submission_package import SubmissionPackage
 from package_archive import PackageArchive
+from archive_watermark import ArchiveWatermark
+from archive_run import ArchiveRun
+from dropped_month import DroppedMonth
+from distro_summary import DistroSummary
+from distro_breakdown import DistroBreakdown
+from package_rank import PackageRank
+from package_sketch import PackageSketch
+from package_rollup import PackageRollup
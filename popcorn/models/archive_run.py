@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+from sqlalchemy import Column, Date, DateTime, Float, Integer
+
+from popcorn.database import Base
+
+
+class ArchiveRun(Base):
+    """The last time the archive of a month was rebuilt from scratch
+
+    A run which hasn't finished yet has no finished time; those are
+    picked up again by `popcorn-server archive --resume`.
+
+    """
+    __tablename__ = 'archive_runs'
+    month = Column(Date(), primary_key=True)
+    finished = Column(DateTime())
+    rows = Column(Integer)
+    seconds = Column(Float)
+
+    def __init__(self, month, finished=None, rows=None, seconds=None):
+        self.month = month
+        self.finished = finished
+        self.rows = rows
+        self.seconds = seconds
+
+    def __repr__(self):
+        return '<ArchiveRun %s: %s>' % (self.month, self.finished)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+from sqlalchemy import Column, ForeignKeyConstraint, Integer, String
+
+from popcorn.database import Base
+from popcorn.models import Distro
+
+
+class ArchiveWatermark(Base):
+    """The highest sub_id of a Distro whose packages have been folded into
+    an archive
+
+    Every submission of the Distro with a lower or equal sub_id is counted
+    there.
+
+    """
+    __tablename__ = 'archive_watermarks'
+    archive = Column(String(30), primary_key=True)
+    distro_name = Column(String(30), primary_key=True)
+    distro_version = Column(String(10), primary_key=True)
+    sub_id = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        ForeignKeyConstraint([distro_name, distro_version],
+                             [Distro.distro_name, Distro.distro_version]),
+        {})
+
+    def __init__(self, archive, distro_name, distro_version, sub_id=0):
+        self.archive = archive
+        self.distro_name = distro_name
+        self.distro_version = distro_version
+        self.sub_id = sub_id
+
+    def __repr__(self):
+        return '<ArchiveWatermark %s %s %s: %s>' % (
+            self.archive, self.distro_name, self.distro_version, self.sub_id)
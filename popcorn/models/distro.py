@@ -50,5 +50,4 @@ class Distro(Base):
 
     @property
     def serialize(self):
-        return dict({'submissions': [sub._flat_attrs for sub in
-                     self.submissions]}, **self._flat_attrs)
+        return dict(**self._flat_attrs)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+from sqlalchemy import Column, ForeignKeyConstraint, Integer, String
+
+from popcorn.database import Base
+from popcorn.models import Distro
+
+
+class DistroSummary(Base):
+    """How many submissions and package rows a Distro has
+
+    Kept up to date by the ingestion, so the dashboards don't have to count
+    submission_packages.
+
+    """
+    __tablename__ = 'distro_summaries'
+    distro_name = Column(String(30), primary_key=True)
+    distro_version = Column(String(10), primary_key=True)
+    submissions = Column(Integer, nullable=False, default=0)
+    packages = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        ForeignKeyConstraint([distro_name, distro_version],
+                             [Distro.distro_name, Distro.distro_version]),
+        {})
+
+    def __init__(self, distro_name, distro_version, submissions=0,
+                 packages=0):
+        self.distro_name = distro_name
+        self.distro_version = distro_version
+        self.submissions = submissions
+        self.packages = packages
+
+    def __repr__(self):
+        return '<DistroSummary %s %s: %s %s>' % (
+            self.distro_name, self.distro_version, self.submissions,
+            self.packages)
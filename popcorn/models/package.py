@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+from sqlalchemy import Column, ForeignKey, Integer, String, UniqueConstraint
+
+from popcorn.database import Base
+
+
+class Package(Base):
+    """A package as it was seen in submissions, one row for every distinct
+    name, version, release, epoch, arch and vendor
+
+    Submissions refer to Packages by their pkg_id, so the strings are only
+    stored once.
+
+    """
+    __tablename__ = 'packages'
+    pkg_id = Column(Integer, primary_key=True, autoincrement=True)
+    pkg_name = Column(String(50), nullable=False)
+    pkg_version = Column(String(50), nullable=False)
+    pkg_release = Column(String(50), nullable=False)
+    pkg_epoch = Column(String(10), nullable=False)
+    pkg_arch = Column(String(10), ForeignKey('arches.arch'), nullable=False)
+    vendor_name = Column(String(20), ForeignKey('vendors.vendor_name'),
+                         nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint(pkg_name, pkg_version, pkg_release, pkg_epoch,
+                         pkg_arch, vendor_name),
+        {})
+
+    def __init__(self, pkg_name, pkg_version, pkg_release, pkg_epoch,
+                 pkg_arch, vendor_name):
+        self.pkg_name = pkg_name
+        self.pkg_version = pkg_version
+        self.pkg_release = pkg_release
+        self.pkg_epoch = pkg_epoch if pkg_epoch != "None" else ""
+        self.pkg_arch = pkg_arch
+        self.vendor_name = vendor_name
+
+    def __repr__(self):
+        return '<Package %s: %s %s>' % (self.pkg_id, self.nvrea,
+                                        self.vendor_name)
+
+    @property
+    def nvrea(self):
+        if self.pkg_epoch:
+            nvrea = "%(name)s-%(ver)s-%(rel)s-%(epoch)s.%(arch)s"
+        else:
+            nvrea = "%(name)s-%(ver)s-%(rel)s.%(arch)s"
+
+        return nvrea % dict(name=self.pkg_name,
+                            ver=self.pkg_version,
+                            rel=self.pkg_release,
+                            epoch=self.pkg_epoch,
+                            arch=self.pkg_arch)
+
+    @property
+    def _flat_attrs(self):
+        return {
+            'pkg_id': self.pkg_id,
+            'pkg_name': self.pkg_name,
+            'pkg_version': self.pkg_version,
+            'pkg_release': self.pkg_release,
+            'pkg_epoch': self.pkg_epoch,
+            'pkg_arch': self.pkg_arch,
+            'vendor_name': self.vendor_name,
+        }
+
+    @property
+    def serialize(self):
+        return dict(**self._flat_attrs)
@@ -35,6 +35,7 @@ class PackageArchive(Base):
     pkg_name = Column(String(50), primary_key=True)
     pkg_version = Column(String(50), primary_key=True)
     pkg_release = Column(String(50), primary_key=True)
+    pkg_epoch = Column(String(10), primary_key=True)
     pkg_arch = Column(String(10), ForeignKey('arches.arch'), primary_key=True)
     vendor_name = Column(String(20), ForeignKey('vendors.vendor_name'),
                          primary_key=True)
@@ -52,12 +53,13 @@ class PackageArchive(Base):
             ),
         )
 
-    def __init__(self, pkg_name, pkg_version, pkg_release, pkg_arch,
-                 vendor_name, pkg_status, distro_name, distro_version, month,
-                 count):
+    def __init__(self, pkg_name, pkg_version, pkg_release, pkg_epoch,
+                 pkg_arch, vendor_name, pkg_status, distro_name,
+                 distro_version, month, count):
         self.pkg_name = pkg_name
         self.pkg_version = pkg_version
         self.pkg_release = pkg_release
+        self.pkg_epoch = pkg_epoch
         self.pkg_arch = pkg_arch
         self.distro_name = distro_name
         self.distro_version = distro_version
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+from datetime import datetime
+
+from sqlalchemy import (Column, Date, DateTime, ForeignKeyConstraint, Integer,
+                        String)
+
+from popcorn.database import Base
+from popcorn.models import Distro
+
+
+class PackageRank(Base):
+    """The place of a package name in a ranking of a Distro for a month
+
+    The rankings are computed from package_archives, like the by_inst,
+    by_vote, by_old, by_recent and by_nofiles lists of Debian's popcon.
+    The primary key puts the rows of a ranking in the order of their rank,
+    so a page of it is a range scan.
+
+    """
+    __tablename__ = 'package_ranks'
+    distro_name = Column(String(20), primary_key=True)
+    distro_version = Column(String(10), primary_key=True)
+    month = Column(Date(), primary_key=True)
+    ranking = Column(String(10), primary_key=True)
+    rank = Column(Integer, primary_key=True, autoincrement=False)
+    pkg_name = Column(String(50), nullable=False)
+    count = Column(Integer, nullable=False)
+    # when the ranking was computed, the same for all of its rows
+    ranked = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        ForeignKeyConstraint([distro_name, distro_version],
+                             [Distro.distro_name, Distro.distro_version]),
+        {})
+
+    def __init__(self, distro_name, distro_version, month, ranking, rank,
+                 pkg_name, count, ranked=None):
+        self.distro_name = distro_name
+        self.distro_version = distro_version
+        self.month = month
+        self.ranking = ranking
+        self.rank = rank
+        self.pkg_name = pkg_name
+        self.count = count
+        self.ranked = ranked or datetime.now()
+
+    def __repr__(self):
+        return '<PackageRank %s %s %s by_%s #%d: %s>' % (
+            self.distro_name, self.distro_version, self.month, self.ranking,
+            self.rank, self.pkg_name)
+
+    @property
+    def serialize(self):
+        return dict(rank=self.rank, pkg_name=self.pkg_name, count=self.count)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+from sqlalchemy import Column, ForeignKey, Integer, String
+
+from popcorn.database import Base
+
+
+class PackageRollup(Base):
+    """How many times a package was archived with a status, over all the
+    distros, vendors and months of package_archives
+
+    The primary key starts with the package name, so the rows under any
+    prefix of it, e.g. all the releases of a name and version, are one
+    range of the index.
+
+    """
+    __tablename__ = 'package_rollups'
+
+    pkg_name = Column(String(50), primary_key=True)
+    pkg_version = Column(String(50), primary_key=True)
+    pkg_release = Column(String(50), primary_key=True)
+    pkg_epoch = Column(String(10), primary_key=True)
+    pkg_arch = Column(String(10), ForeignKey('arches.arch'), primary_key=True)
+    pkg_status = Column(String(10), ForeignKey('package_statuses.pkg_status'),
+                        primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __init__(self, pkg_name, pkg_version, pkg_release, pkg_epoch,
+                 pkg_arch, pkg_status, count=0):
+        self.pkg_name = pkg_name
+        self.pkg_version = pkg_version
+        self.pkg_release = pkg_release
+        self.pkg_epoch = pkg_epoch
+        self.pkg_arch = pkg_arch
+        self.pkg_status = pkg_status
+        self.count = count
+
+    def __repr__(self):
+        return '<PackageRollup %s-%s-%s.%s %s: %s>' % (
+            self.pkg_name, self.pkg_version, self.pkg_release, self.pkg_arch,
+            self.pkg_status, self.count)
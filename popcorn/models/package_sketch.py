@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+from sqlalchemy import (Column, Date, ForeignKeyConstraint, LargeBinary,
+                        String)
+
+from popcorn.database import Base
+from popcorn.models import Distro
+
+
+class PackageSketch(Base):
+    """A HyperLogLog sketch of the systems which listed a package name in
+    their submissions to a Distro during a month
+
+    Only the hash of a system's hw_uuid goes into the sketch, so it can't
+    tell which systems those were, only estimate how many.
+
+    """
+    __tablename__ = 'package_sketches'
+    distro_name = Column(String(20), primary_key=True)
+    distro_version = Column(String(10), primary_key=True)
+    month = Column(Date(), primary_key=True)
+    pkg_name = Column(String(50), primary_key=True)
+    registers = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        ForeignKeyConstraint([distro_name, distro_version],
+                             [Distro.distro_name, Distro.distro_version]),
+        {})
+
+    def __init__(self, distro_name, distro_version, month, pkg_name,
+                 registers):
+        self.distro_name = distro_name
+        self.distro_version = distro_version
+        self.month = month
+        self.pkg_name = pkg_name
+        self.registers = registers
+
+    def __repr__(self):
+        return '<PackageSketch %s %s %s %s>' % (
+            self.distro_name, self.distro_version, self.month, self.pkg_name)
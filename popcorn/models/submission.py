@@ -26,7 +26,7 @@
 from datetime import date
 
 from sqlalchemy import (Column, Date, ForeignKey, String, Integer,
-                        ForeignKeyConstraint)
+                        ForeignKeyConstraint, Index)
 from sqlalchemy.orm import relationship
 
 from popcorn.database import Base
@@ -51,6 +51,8 @@ class Submission(Base):
     __table_args__ = (
         ForeignKeyConstraint([distro_name, distro_version],
                              [Distro.distro_name, Distro.distro_version]),
+        # the submissions of a distro are listed and archived by sub_id
+        Index('ix_submissions_distro', distro_name, distro_version, sub_id),
         {})
 
     def __init__(self, distro_name, distro_version, arch, popcorn_version,
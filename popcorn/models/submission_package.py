@@ -22,8 +22,8 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 
-from sqlalchemy import (Column, Date, ForeignKey,
-                        String, Integer)
+from sqlalchemy import Column, Date, ForeignKey, Integer, String
+from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship
 
 from popcorn.database import Base
@@ -31,63 +31,51 @@ from popcorn.models import Submission
 
 
 class SubmissionPackage(Base):
+    """A Package which was listed in a Submission
+
+    The package itself lives in the packages table and its status is
+    stored as the one letter short_status, which keeps these rows small.
+    The attributes of both can still be read from here.
+
+    """
     __tablename__ = 'submission_packages'
 
-    # primary key
+    # primary key; sub_date is a part of it because the rows may be
+    # partitioned by month, see popcorn/partitions.py
     sub_id = Column(Integer, ForeignKey('submissions.sub_id'),
                     primary_key=True)
-    sub_date = Column(Date(), primary_key=True)
-    pkg_name = Column(String(50), primary_key=True)
-    pkg_version = Column(String(50), primary_key=True)
-    pkg_release = Column(String(50), primary_key=True)
-    pkg_epoch = Column(String(10), primary_key=True)
-    pkg_arch = Column(String(10), ForeignKey('arches.arch'), primary_key=True)
-    vendor_name = Column(String(20), ForeignKey('vendors.vendor_name'),
-                         primary_key=True)
+    sub_date = Column(Date(), primary_key=True, index=True)
+    pkg_id = Column(Integer, ForeignKey('packages.pkg_id'), primary_key=True,
+                    index=True)
     # not primary key
-    pkg_status = Column(String(10), ForeignKey('package_statuses.pkg_status'),
-                        nullable=False)
+    status_code = Column(String(1),
+                         ForeignKey('package_statuses.short_status'),
+                         nullable=False)
+
+    package = relationship('Package', lazy='joined')
+    status = relationship('PackageStatus', lazy='joined')
 
-    def __init__(self, sub_id, sub_date, pkg_name, pkg_version,
-                 pkg_release, pkg_epoch, pkg_arch, vendor_name, pkg_status):
+    pkg_name = association_proxy('package', 'pkg_name')
+    pkg_version = association_proxy('package', 'pkg_version')
+    pkg_release = association_proxy('package', 'pkg_release')
+    pkg_epoch = association_proxy('package', 'pkg_epoch')
+    pkg_arch = association_proxy('package', 'pkg_arch')
+    vendor_name = association_proxy('package', 'vendor_name')
+    pkg_status = association_proxy('status', 'pkg_status')
+
+    def __init__(self, sub_id, sub_date, package, status_code):
         self.sub_id = sub_id
         self.sub_date = sub_date
-        self.pkg_name = pkg_name
-        self.pkg_version = pkg_version
-        self.pkg_release = pkg_release
-        self.pkg_epoch = pkg_epoch if pkg_epoch != "None" else ""
-        self.pkg_arch = pkg_arch
-        self.vendor_name = vendor_name
-        self.pkg_status = pkg_status
+        self.package = package
+        self.status_code = status_code
 
     def __repr__(self):
-        if self.pkg_epoch:
-            output = ("<SubmissionPackage: %(sub_id)s %(sub_date)s "
-                      "%(name)s-%(ver)s-%(rel)s-%(epoch)s.%(arch)s - "
-                      "%(status)s")
-        else:
-            output = ("<SubmissionPackage: %(sub_id)s %(sub_date)s "
-                      "%(name)s-%(ver)s-%(rel)s.%(arch)s - %(status)s")
-        return output % dict(name=self.pkg_name,
-                             ver=self.pkg_version,
-                             rel=self.pkg_release,
-                             epoch=self.pkg_epoch,
-                             arch=self.pkg_arch,
-                             status=self.pkg_status,
-                             **self.__dict__)
+        return '<SubmissionPackage: %s %s %s - %s>' % (
+            self.sub_id, self.sub_date, self.nvrea, self.status_code)
 
     @property
     def nvrea(self):
-        if self.pkg_epoch:
-            nvrea = "%(name)s-%(ver)s-%(rel)s-%(epoch)s.%(arch)s"
-        else:
-            nvrea = "%(name)s-%(ver)s-%(rel)s.%(arch)s"
-
-        return nvrea % dict(name=self.pkg_name,
-                            ver=self.pkg_version,
-                            rel=self.pkg_release,
-                            epoch=self.pkg_epoch,
-                            arch=self.pkg_arch)
+        return self.package.nvrea
 
     @property
     def _flat_attrs(self):
@@ -22,14 +22,77 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 
+import base64
+import json
 from math import ceil
 
 
 class Pagination(object):
-    def __init__(self, page, per_page, total_count):
+    """The position of a page among the pages of some items
+
+    :first: the sort key of the first item of the page
+    :last: the sort key of the last item of the page
+
+    With the sort keys, the next and previous pages can be fetched by
+    keyset (WHERE key > last) instead of OFFSET, using the cursor tokens
+    of next_cursor and prev_cursor. These also carry the number of the
+    page they lead to, which decode_page_cursor gives back.
+
+    """
+    def __init__(self, page, per_page, total_count, first=None, last=None):
         self.page = page
         self.per_page = per_page
         self.total_count = total_count
+        self.first = first
+        self.last = last
+
+    @staticmethod
+    def encode_cursor(key):
+        """Turn a sort key into a token which can go in a URL"""
+        return base64.urlsafe_b64encode(json.dumps(key)).rstrip('=')
+
+    @staticmethod
+    def decode_cursor(token):
+        """Turn a cursor token back into a sort key
+
+        Raises ValueError if the token wasn't made by encode_cursor.
+
+        """
+        try:
+            token = str(token)
+            key = json.loads(base64.urlsafe_b64decode(
+                token + '=' * (-len(token) % 4)))
+        except TypeError:
+            raise ValueError("invalid cursor %s" % token)
+        if not isinstance(key, list):
+            raise ValueError("invalid cursor %s" % token)
+        return key
+
+    @classmethod
+    def decode_page_cursor(cls, token):
+        """Turn a token of next_cursor or prev_cursor back into the number
+        of the page it leads to and a sort key
+
+        Raises ValueError if the token wasn't made by either of them.
+
+        """
+        cursor = cls.decode_cursor(token)
+        if (len(cursor) != 2 or type(cursor[0]) is not int
+                or cursor[0] < 1 or not isinstance(cursor[1], list)):
+            raise ValueError("invalid cursor %s" % token)
+        return cursor
+
+    @property
+    def next_cursor(self):
+        """The token of the page after this one, or None"""
+        if self.has_next and self.last is not None:
+            return self.encode_cursor([self.page + 1, self.last])
+
+    @property
+    def prev_cursor(self):
+        """The token of the page before this one, or None"""
+        if self.has_prev and self.first is not None:
+            return self.encode_cursor([self.page - 1, self.first])
 
     @property
     def pages(self):
@@ -24,15 +24,35 @@
 
 """Parse the submissions received from the clients and save them to the DB"""
 
-from datetime import date
+import time
+import zlib
+from cStringIO import StringIO
+from datetime import date, timedelta
 
-from sqlalchemy.exc import DataError, IntegrityError
-from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy import and_, or_
 
-from popcorn.configs import SUBMISSION_INTERVAL
-from popcorn.database import db_session
-from popcorn.models import (Arch, Distro, SubmissionPackage, Submission,
-                            System, Vendor)
+from popcorn.cache import dimension_cache, package_cache, response_cache
+from popcorn.configs import (GROUP_COMMIT_SIZE, GROUP_COMMIT_TIME,
+                             INSERT_BATCH_SIZE, MAX_SUBMISSION_SIZE,
+                             SUBMISSION_INTERVAL)
+from popcorn.database import db_session, insert_ignore
+from popcorn.models import Distro, SubmissionPackage, Submission, System
+from popcorn.partitions import ensure_partition
+from popcorn.hyperloglog import position
+from popcorn.sketches import add_systems
+from popcorn.summaries import add_breakdowns, add_counts, breakdown_keys
+
+# the order of the values in the rows written to submission_packages
+PACKAGE_COLUMNS = ('sub_id', 'sub_date', 'pkg_id', 'status_code')
+
+STATUSES = {'v': 'voted',
+            'r': 'recent',
+            'o': 'old',
+            'n': 'nofiles'}
+
+GZIP_MAGIC = '\x1f\x8b'
+# how many bytes of an upload are read (or decompressed) at a time
+CHUNK_SIZE = 64 * 1024
 
 
 class FormatError(Exception):
@@ -57,92 +77,416 @@ class EarlySubmissionError(Exception):
                 % (SUBMISSION_INTERVAL, self.last_date))
 
 
+class SubmissionTooLargeError(Exception):
+    """Raised when a decompressed submission is bigger than allowed"""
+    def __init__(self, max_size):
+        self.max_size = max_size
+
+    def __str__(self):
+        return ("The submission is too large. At most %s bytes are accepted."
+                % self.max_size)
+
+
+# the errors for which a submission gets rejected
+SUBMISSION_ERRORS = (EarlySubmissionError, FormatError,
+                     SubmissionTooLargeError)
+
+
+def iter_lines(f, max_size=MAX_SUBMISSION_SIZE):
+    """Yield the lines of an uploaded submission as they are read
+
+    :f: a file-like object holding a plain text or a gzipped submission
+    :max_size: the number of bytes the decompressed submission may have
+
+    Only a chunk of the upload is kept in memory at a time. Raises
+    SubmissionTooLargeError as soon as more than max_size bytes were
+    decompressed.
+
+    """
+    size = 0
+    tail = ''
+    for data in _read_chunks(f):
+        size += len(data)
+        if size > max_size:
+            raise SubmissionTooLargeError(max_size)
+        lines = (tail + data).split('\n')
+        tail = lines.pop()
+        for line in lines:
+            yield line.rstrip('\r')
+    if tail:
+        yield tail.rstrip('\r')
+
+
+def _read_chunks(f):
+    """Yield the decompressed contents of f in chunks of at most CHUNK_SIZE
+
+    Gzipped data is recognized by its magic number, anything else is
+    returned unchanged.
+
+    """
+    chunk = f.read(CHUNK_SIZE)
+    if not chunk.startswith(GZIP_MAGIC):
+        while chunk:
+            yield chunk
+            chunk = f.read(CHUNK_SIZE)
+        return
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        while chunk:
+            while chunk:
+                data = decompressor.decompress(chunk, CHUNK_SIZE)
+                chunk = decompressor.unconsumed_tail
+                if data:
+                    yield data
+            chunk = f.read(CHUNK_SIZE)
+        data = decompressor.flush()
+    except zlib.error, e:
+        raise FormatError("invalid gzip data - %s" % e)
+    if data:
+        yield data
+
+
 def parse_text(data):
     """Parse a plaintext submission, recording everything in the database"""
-    datalines = data.splitlines()
-    (popcorn, version, distro, distrover, arch, hw_uuid) = datalines[0].split()
+    parse_lines(data.splitlines())
 
-    # we only use the underscore to make transporting easier, they
-    # shouldn't be there otherwise
-    distro = distro.replace('_', ' ')
 
+def parse_lines(lines, batch_size=INSERT_BATCH_SIZE):
+    """Parse the lines of a submission, recording everything in the database
+
+    :lines: an iterable of the lines of a plaintext submission
+    :batch_size: how many package rows to write to the database at once
+
+    The lines are consumed as they come and the packages are written in
+    batches, so the whole submission is never held in memory.
+
+    """
+    counters = _Counters()
     try:
-        system = System.query.filter_by(sys_hwuuid=hw_uuid).one()
-    except NoResultFound:
-        system = System(hw_uuid)
-        db_session.add(system)
-    else:
-        # TODO: think about moving this to the model
-        if not _can_submit(system):
-            raise EarlySubmissionError(system.last_sub_date)
-        system.last_sub_date = date.today()
+        _record_submission(lines, counters, batch_size)
+        counters.apply()
+        db_session.commit()
+    except:  # TODO mail DataErrors to the admins
+        _discard_caches()
+        raise
+    _publish_caches()
+    response_cache.bump_generation(ingested=True)
+
+
+def ingest_many(submissions, group_size=GROUP_COMMIT_SIZE,
+                group_time=GROUP_COMMIT_TIME, batch_size=INSERT_BATCH_SIZE):
+    """Record many submissions, committing them in groups
+
+    :submissions: an iterable of submissions, each one either plaintext or
+                  an iterable of its lines
+    :group_size: the most submissions committed in one transaction
+    :group_time: the most milliseconds a transaction stays open
+    :batch_size: how many package rows to write to the database at once
+
+    Each submission is recorded inside a SAVEPOINT, so one which gets
+    rejected doesn't roll back the others of its group. For every group
+    that was committed this yields a list of (index, error) pairs: the
+    index of a submission in `submissions` and either None if it was
+    recorded or the exception it was rejected with.
+
+    Any other error, also while the group gets committed, rolls back the
+    group which is being recorded and is raised.
+
+    The counters of distro_summaries and distro_breakdowns and the
+    sketches of package_sketches are updated once per group, right before
+    it's committed, so their rows stay locked only briefly.
+
+    """
+    results = []
+    counters = _Counters()
+    for i, submission in enumerate(submissions):
+        if not results:
+            started = time.time()
+        if isinstance(submission, basestring):
+            submission = submission.splitlines()
+
+        db_session.begin_nested()
+        marks = _cache_savepoints()
+        try:
+            _record_submission(submission, counters, batch_size)
+        except SUBMISSION_ERRORS, e:
+            db_session.rollback()
+            # the rows found may have been written by this savepoint, the
+            # ones found before it are still committed with the group
+            _discard_caches(marks)
+            results.append((i, e))
+        except:
+            db_session.rollback()
+            db_session.rollback()
+            _discard_caches()
+            raise
+        else:
+            db_session.commit()
+            results.append((i, None))
+
+        if (len(results) >= group_size
+                or (time.time() - started) * 1000 >= group_time):
+            _commit_group(counters)
+            yield results
+            results = []
 
-    submission = Submission(distro, distrover, arch, version)
+    if results:
+        _commit_group(counters)
+        yield results
 
+
+def _commit_group(counters):
+    """Write the counters of a group of submissions and commit it
+
+    If that fails the group is rolled back, along with what the caches
+    found meanwhile.
+
+    """
     try:
-        Arch.query.filter_by(arch=arch).one()
-    except NoResultFound:
+        counters.apply()
+        db_session.commit()
+    except:
+        db_session.rollback()
+        _discard_caches()
+        raise
+    _publish_caches()
+    response_cache.bump_generation(ingested=True)
+
+
+def _publish_caches():
+    """Cache the dimensions and packages found by the transaction which
+    just committed"""
+    dimension_cache.publish()
+    package_cache.publish()
+
+
+def _cache_savepoints():
+    """Mark what the caches found so far, for _discard_caches"""
+    return dimension_cache.savepoint(), package_cache.savepoint()
+
+
+def _discard_caches(marks=(0, 0)):
+    """Forget the dimensions and packages found by the transaction which
+    was rolled back, or since the marks of _cache_savepoints"""
+    dimension_cache.discard(marks[0])
+    package_cache.discard(marks[1])
+
+
+class _Counters(object):
+    """What a group of submissions adds to distro_summaries,
+    distro_breakdowns and package_sketches, until it's written right
+    before the group commits"""
+
+    def __init__(self):
+        self.summaries = {}
+        self.breakdowns = {}
+        self.sketches = {}
+
+    def add(self, submission, hw_uuid, names, packages):
+        """Count a submission which was recorded
+
+        :submission: the Submission
+        :names: the set of the package names it listed
+        :packages: how many package lines it had
+
+        """
+        distro = (submission.distro_name, submission.distro_version)
+        submissions, count = self.summaries.get(distro, (0, 0))
+        self.summaries[distro] = (submissions + 1, count + packages)
+        for key in breakdown_keys(submission.sub_date, submission.arch,
+                                  submission.popcorn_version):
+            key = distro + key
+            self.breakdowns[key] = self.breakdowns.get(key, 0) + 1
+
+        register, rank = position(hw_uuid)
+        month = submission.sub_date.replace(day=1)
+        for name in names:
+            registers = self.sketches.setdefault(distro + (month, name), {})
+            if rank > registers.get(register, 0):
+                registers[register] = rank
+
+    def apply(self):
+        """Write the counts to the current transaction and start over"""
+        add_counts(self.summaries)
+        add_breakdowns(self.breakdowns)
+        add_systems(self.sketches)
+        self.__init__()
+
+
+def _record_submission(lines, counters, batch_size=INSERT_BATCH_SIZE):
+    """Add a submission to the current transaction without committing it
+
+    :counters: the _Counters it gets added to once it's recorded
+
+    """
+    lines = iter(lines)
+    (version, distro, distrover, arch, hw_uuid) = parse_header(next(lines, ''))
+
+    if not dimension_cache.has_arch(arch):
         raise FormatError("unknown arch - " + arch)
 
-    try:
-        Distro.query.filter_by(distro_name=distro,
-                               distro_version=distrover).one()
-    except NoResultFound:
-        distro = Distro(distro, distrover)
-        db_session.add(distro)
+    sub_date = date.today()
+    if not _claim_system(hw_uuid, sub_date):
+        last_date = db_session.query(System.last_sub_date).filter_by(
+            sys_hwuuid=hw_uuid).scalar()
+        raise EarlySubmissionError(last_date)
+
+    if not dimension_cache.has_distro(distro, distrover):
+        insert_ignore(Distro.__table__, [{'distro_name': distro,
+                                          'distro_version': distrover}])
 
+    ensure_partition(sub_date)
+    submission = Submission(distro, distrover, arch, version, sub_date)
     db_session.add(submission)
     db_session.flush()
 
-    for line in datalines[1:]:
-        try:
-            (status, name, version, release,
-             epoch, arch, vendor) = line.split(None, 6)
-        except ValueError, e:  # test this
-            raise FormatError(e.message)
+    packages = []
+    names = set()
+    count = 0
+    for line in lines:
+        (name, version, release, epoch,
+         arch, vendor, status) = _parse_package_line(line)
+        packages.append((name, version, release, epoch, arch, vendor,
+                         status))
+        names.add(name)
+        count += 1
+        if len(packages) >= batch_size:
+            _write_packages(submission, packages)
+            packages = []
+    _write_packages(submission, packages)
+    counters.add(submission, hw_uuid, names, count)
 
-        try:
-            status = {'v': 'voted',
-                      'r': 'recent',
-                      'o': 'old',
-                      'n': 'nofiles'}[status]
-        except KeyError:
-            raise FormatError("the package's status could not be recognized")
 
-        try:
-            vendor = Vendor.query.filter_by(vendor_name=vendor[:20]).one()
-        except NoResultFound:
-            vendor = Vendor(vendor)
-            db_session.add(vendor)
-            try:
-                db_session.flush()
-            except DataError:  # TODO mail this to the admins
-                raise
-            except IntegrityError, e:
-                print str(e)
-
-        sp = SubmissionPackage(submission.sub_id, date.today(), name, version,
-                               release, epoch, arch, vendor.vendor_name,
-                               status)
-        db_session.add(sp)
+def _write_packages(submission, packages):
+    """Write a batch of the parsed package lines of a submission
+
+    :submission: the Submission the packages were listed in
+    :packages: a list of tuples as returned by _parse_package_line
+
+    """
+    vendors = {}
+    for package in packages:
+        vendors.setdefault(package[5][:20], package[5])
+    dimension_cache.add_vendors(vendors)
+
+    keys = [package[:5] + (package[5][:20],) for package in packages]
+    ids = package_cache.package_ids(set(keys))
+    _insert_packages([(submission.sub_id, submission.sub_date, ids[key],
+                       package[6]) for key, package in zip(keys, packages)])
 
+
+def parse_header(line):
+    """Split the header line of a submission into a tuple of values
+
+    :line: a line of the form "POPCORN version distro distro_version arch
+           hw_uuid"
+
+    Raises FormatError if the line can't be parsed.
+
+    """
     try:
-        db_session.commit()
-    except DataError:  # TODO mail this to the admins
-        raise
+        (popcorn, version, distro, distrover, arch, hw_uuid) = line.split()
+    except ValueError:
+        raise FormatError("the header line could not be recognized")
+    if popcorn != 'POPCORN':
+        raise FormatError("the header line doesn't start with POPCORN")
+
+    # we only use the underscore to make transporting easier, they
+    # shouldn't be there otherwise
+    distro = distro.replace('_', ' ')
+    return (version, distro, distrover, arch, hw_uuid)
 
 
-def _can_submit(system):
-    """Checks the Submission interval for this System
+def _parse_package_line(line):
+    """Split a package line of a submission into a tuple of values
 
-    :system: a System object
+    :line: a line of the form "status name version release epoch arch vendor"
 
-    If the interval has elapsed or there are no previous submissions, it
-    will return True, otherwise returns False.
+    The status is returned as its one letter code. Raises FormatError if
+    the line can't be parsed.
 
     """
-    delta = date.today() - system.last_sub_date
-    if SUBMISSION_INTERVAL < delta.days:
-        return True
+    try:
+        (status, name, version, release,
+         epoch, arch, vendor) = line.split(None, 6)
+    except ValueError, e:  # test this
+        raise FormatError(e.message)
+
+    if status not in STATUSES:
+        raise FormatError("the package's status could not be recognized")
+
+    if epoch == "None":
+        epoch = ""
+    return (name, version, release, epoch, arch, vendor, status)
+
+
+def _insert_packages(rows):
+    """Write a batch of package rows of a submission in one go
+
+    :rows: a list of tuples ordered like PACKAGE_COLUMNS
+
+    The rows are sent with COPY on PostgreSQL and with a single executemany
+    everywhere else, inside the current transaction of the session.
+
+    """
+    if not rows:
+        return
+    connection = db_session.connection()
+    if connection.dialect.driver == 'psycopg2':
+        _copy_packages(connection, rows)
     else:
-        return False
+        connection.execute(SubmissionPackage.__table__.insert(),
+                           [dict(zip(PACKAGE_COLUMNS, row)) for row in rows])
+
+
+def _copy_packages(connection, rows):
+    """COPY the rows into submission_packages using psycopg2"""
+    buf = StringIO()
+    for row in rows:
+        buf.write('\t'.join(_copy_escape(value) for value in row))
+        buf.write('\n')
+    buf.seek(0)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert('COPY submission_packages (%s) FROM STDIN'
+                           % ', '.join(PACKAGE_COLUMNS), buf)
+    finally:
+        cursor.close()
+
+
+def _copy_escape(value):
+    """Format a value for the text format of COPY"""
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    elif not isinstance(value, str):
+        value = str(value)
+    return (value.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _claim_system(hw_uuid, today):
+    """Record that a System submits today, if its interval has elapsed
+
+    :hw_uuid: the hardware uuid of the System
+    :today: the date of the submission
+
+    A new System is inserted, an existing one gets its last_sub_date moved
+    with a single conditional UPDATE, so two concurrent submissions from
+    the same System can't both get through. Returns False if the System
+    submitted less than SUBMISSION_INTERVAL days ago.
+
+    """
+    if insert_ignore(System.__table__, [{'sys_hwuuid': hw_uuid,
+                                         'last_sub_date': today}]):
+        return True
+
+    systems = System.__table__
+    interval_start = today - timedelta(days=SUBMISSION_INTERVAL)
+    result = db_session.execute(systems.update().where(and_(
+        systems.c.sys_hwuuid == hw_uuid,
+        or_(systems.c.last_sub_date.is_(None),
+            systems.c.last_sub_date < interval_start))
+    ).values(last_sub_date=today))
+    return result.rowcount == 1
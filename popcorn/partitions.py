@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Keep the rows of submission_packages in one partition per month
+
+With PARTITION_BY_MONTH set, submission_packages is created on PostgreSQL
+as a table partitioned by range of sub_date. The partition of a month is
+created the first time a row for it is written. Queries which select a
+range of sub_date only read the partitions of those months, and the raw
+rows of a month are dropped with a DROP TABLE.
+
+Other databases keep a single table, where the index on sub_date serves
+the same range queries and dropping a month is a DELETE.
+
+"""
+
+from datetime import datetime
+
+from sqlalchemy import and_, func, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateTable
+
+from popcorn.cache import response_cache
+from popcorn.configs import PARTITION_BY_MONTH
+from popcorn.database import db_session, insert_ignore
+from popcorn.models import DroppedMonth, Submission, SubmissionPackage
+from popcorn.summaries import add_counts
+
+# the first days of the months whose partitions are known to exist
+_partitions = set()
+
+
+def month_range(day):
+    """Return the first day of the month of `day` and the first day of the
+    month after it
+    """
+    start = day.replace(day=1)
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+def partitioned(bind):
+    """Whether submission_packages is partitioned on an Engine/Connection"""
+    return PARTITION_BY_MONTH and bind.dialect.name == 'postgresql'
+
+
+def partition_name(day):
+    return 'submission_packages_y%dm%02d' % (day.year, day.month)
+
+
+@compiles(CreateTable, 'postgresql')
+def _create_table(create, compiler, **kw):
+    ddl = compiler.visit_create_table(create)
+    if PARTITION_BY_MONTH and create.element is SubmissionPackage.__table__:
+        ddl = ddl.rstrip() + ' PARTITION BY RANGE (sub_date)\n\n'
+    return ddl
+
+
+def create_partition(connection, day):
+    """Create the partition of the month of `day` unless it exists
+
+    Workers which need the same partition at the same time are serialized
+    on an advisory lock held until the end of the transaction.
+
+    """
+    start, end = month_range(day)
+    name = partition_name(start)
+    connection.execute(text('SELECT pg_advisory_xact_lock(hashtext(:name))'),
+                       name=name)
+    connection.execute("CREATE TABLE IF NOT EXISTS %s PARTITION OF "
+                       "submission_packages FOR VALUES FROM ('%s') TO ('%s')"
+                       % (name, start.isoformat(), end.isoformat()))
+
+
+def create_partitions_for(connection, table):
+    """Create the partitions of all the months which have rows in `table`"""
+    if not partitioned(connection):
+        return
+    months = connection.execute("SELECT DISTINCT date_trunc('month', "
+                                "sub_date)::date FROM %s" % table).fetchall()
+    for (month,) in months:
+        create_partition(connection, month)
+
+
+def ensure_partition(day):
+    """Make sure the rows of the month of `day` can be written
+
+    The partition is created in a transaction of its own, so the lock it
+    takes on submission_packages is released right away.
+
+    """
+    bind = db_session.bind
+    if not partitioned(bind) or day.replace(day=1) in _partitions:
+        return
+    connection = bind.connect()
+    try:
+        with connection.begin():
+            create_partition(connection, day)
+    finally:
+        connection.close()
+    _partitions.add(day.replace(day=1))
+
+
+def record_dropped(months):
+    """Record in the current transaction that the raw rows of some months
+    were removed, so their archives are never counted again from them
+
+    :months: the first days of the months
+
+    """
+    now = datetime.now()
+    rows = [{'month': month, 'dropped': now} for month in sorted(set(months))]
+    if rows:
+        insert_ignore(DroppedMonth.__table__, rows)
+
+
+def drop_month(day):
+    """Remove the rows of submission_packages of the month of `day`
+
+    The month should have been archived with update_archives first. The
+    dropped rows are taken off the counters of distro_summaries in the same
+    transaction, which also records the month in dropped_months.
+
+    """
+    start, end = month_range(day)
+    dropped = db_session.query(
+        Submission.distro_name, Submission.distro_version,
+        func.count(SubmissionPackage.pkg_id)
+    ).select_from(
+        SubmissionPackage
+    ).join(
+        Submission
+    ).filter(
+        SubmissionPackage.sub_date >= start, SubmissionPackage.sub_date < end
+    ).group_by(Submission.distro_name, Submission.distro_version)
+    add_counts(dict(((name, version), (0, -count))
+                    for name, version, count in dropped))
+    record_dropped([start])
+    if partitioned(db_session.bind):
+        db_session.execute('DROP TABLE IF EXISTS %s' % partition_name(start))
+        _partitions.discard(start)
+    else:
+        table = SubmissionPackage.__table__
+        db_session.execute(table.delete().where(and_(
+            table.c.sub_date >= start, table.c.sub_date < end)))
+    db_session.commit()
+    response_cache.bump_generation()
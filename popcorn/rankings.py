@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Rank the package names of every distro by how many submissions list them
+
+Like Debian's popcon, there is one ranking by installations (every
+status counted) and one for each package status. The rankings of a month
+are computed from package_archives with one INSERT ... SELECT per ranking,
+numbered by a ROW_NUMBER() window, and stored in package_ranks.
+
+"""
+from datetime import datetime
+
+from sqlalchemy import func, text
+
+from popcorn.cache import response_cache
+from popcorn.database import db_session
+from popcorn.models import PackageRank
+
+# the rankings and the package status each one counts, None for all of them
+RANKINGS = [('inst', None),
+            ('vote', 'voted'),
+            ('old', 'old'),
+            ('recent', 'recent'),
+            ('nofiles', 'nofiles')]
+
+RANK_SQL = ('INSERT INTO package_ranks (distro_name, distro_version, month, '
+            'ranking, rank, pkg_name, count, ranked) '
+            'SELECT distro_name, distro_version, month, :ranking, '
+            'ROW_NUMBER() OVER (PARTITION BY distro_name, distro_version '
+            'ORDER BY SUM(count) DESC, pkg_name), pkg_name, SUM(count), '
+            ':ranked '
+            'FROM package_archives WHERE month = :month %s'
+            'GROUP BY distro_name, distro_version, month, pkg_name')
+
+
+def rank_month(month):
+    """Replace the rankings of every distro for a month and commit
+
+    :month: the first day of the month
+
+    The month should be archived first.
+
+    """
+    db_session.query(PackageRank).filter_by(month=month).delete()
+    ranked = datetime.now()
+    for ranking, status in RANKINGS:
+        params = dict(ranking=ranking, month=month, ranked=ranked)
+        if status is None:
+            statement = text(RANK_SQL % '')
+        else:
+            statement = text(RANK_SQL % 'AND pkg_status = :status ')
+            params['status'] = status
+        db_session.execute(statement, params)
+    db_session.commit()
+    response_cache.bump_generation()
+
+
+def top_packages(distro_name, distro_version, ranking, month=None, after=0,
+                 limit=50):
+    """Return a page of a ranking as a list of PackageRanks
+
+    :ranking: one of the names in RANKINGS
+    :month: the first day of the month, the latest one ranked if None
+    :after: the rank of the last package of the previous page
+    :limit: how many packages a page has
+
+    """
+    if month is None:
+        month = latest_month(distro_name, distro_version)
+    return PackageRank.query.filter(
+        PackageRank.distro_name == distro_name,
+        PackageRank.distro_version == distro_version,
+        PackageRank.month == month, PackageRank.ranking == ranking,
+        PackageRank.rank > after).order_by(PackageRank.rank).limit(
+        limit).all()
+
+
+def latest_month(distro_name, distro_version):
+    """Return the last month a distro was ranked for, or None"""
+    return db_session.query(func.max(PackageRank.month)).filter(
+        PackageRank.distro_name == distro_name,
+        PackageRank.distro_version == distro_version).scalar()
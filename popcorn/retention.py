@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Delete the raw submissions which have been archived and are old enough
+
+The submissions are deleted in small batches walking up their sub_id,
+each batch in its own short transaction followed by a pause, so the purge
+can run next to the ingestion without holding locks for long or piling up
+WAL. Only the months before RETENTION_MONTHS ago are purged, and only up
+to the first one which hasn't been archived yet.
+
+"""
+import time
+from datetime import date
+
+from sqlalchemy import func
+
+from popcorn.archive import is_archived, months_between
+from popcorn.cache import response_cache
+from popcorn.configs import PURGE_BATCH_SIZE, PURGE_PAUSE, RETENTION_MONTHS
+from popcorn.database import db_session
+from popcorn.models import Submission, SubmissionPackage
+from popcorn.partitions import record_dropped
+from popcorn.summaries import add_breakdowns, add_counts, breakdown_keys
+
+
+def purge(retention_months=RETENTION_MONTHS, batch_size=PURGE_BATCH_SIZE,
+          pause=PURGE_PAUSE, today=None):
+    """Delete the old submissions and their packages, batch by batch
+
+    :retention_months: how many months of submissions, the current one
+                       included, are kept
+    :batch_size: how many submissions are deleted per transaction
+    :pause: how many seconds to sleep between two transactions
+
+    The submissions of a month whose packages were already dropped with
+    drop_month are deleted too. Returns a dict with the number of deleted
+    submissions and package rows.
+
+    """
+    deleted = {'submissions': 0, 'packages': 0}
+    cutoff = purge_before(retention_months, today)
+    last = 0
+    while True:
+        batch = db_session.query(Submission.sub_id, Submission.sub_date,
+                                 Submission.distro_name,
+                                 Submission.distro_version, Submission.arch,
+                                 Submission.popcorn_version).filter(
+            Submission.sub_id > last).order_by(Submission.sub_id).limit(
+            batch_size).all()
+        # sub_date is the day a submission was recorded, so it only grows
+        # with the sub_id
+        old = [row for row in batch if row.sub_date < cutoff]
+        if old:
+            submissions, packages = _delete(old)
+            deleted['submissions'] += submissions
+            deleted['packages'] += packages
+            last = old[-1].sub_id
+        if len(old) < batch_size:
+            db_session.commit()
+            if deleted['submissions']:
+                response_cache.bump_generation()
+            return deleted
+        time.sleep(pause)
+
+
+def purge_before(retention_months=RETENTION_MONTHS, today=None):
+    """Return the first day of the first month which mustn't be purged"""
+    today = today or date.today()
+    total = today.year * 12 + today.month - retention_months
+    cutoff = date(total // 12, total % 12 + 1, 1)
+
+    first = db_session.query(func.min(Submission.sub_date)).scalar()
+    if first is None:
+        return cutoff
+    for month in months_between(first, cutoff):
+        if month == cutoff or not is_archived(month):
+            return month
+    return cutoff
+
+
+def _delete(submissions):
+    """Delete some submissions and their packages in one transaction
+
+    :submissions: rows of sub_id, sub_date, distro_name, distro_version,
+                  arch and popcorn_version
+
+    The counters of distro_summaries and distro_breakdowns go down by as
+    much, and the months of the submissions are recorded in dropped_months.
+
+    """
+    sub_ids = [row.sub_id for row in submissions]
+    deltas = {}
+    breakdowns = {}
+    for row in submissions:
+        distro = (row.distro_name, row.distro_version)
+        deltas[distro] = (deltas.get(distro, (0, 0))[0] - 1, 0)
+        for key in breakdown_keys(row.sub_date, row.arch,
+                                  row.popcorn_version):
+            key = distro + key
+            breakdowns[key] = breakdowns.get(key, 0) - 1
+    packages = db_session.query(
+        Submission.distro_name, Submission.distro_version,
+        func.count(SubmissionPackage.pkg_id)
+    ).select_from(
+        SubmissionPackage
+    ).join(
+        Submission
+    ).filter(
+        SubmissionPackage.sub_id.in_(sub_ids)
+    ).group_by(Submission.distro_name, Submission.distro_version)
+    total = 0
+    for name, version, count in packages:
+        deltas[(name, version)] = (deltas[(name, version)][0], -count)
+        total += count
+
+    add_counts(deltas)
+    add_breakdowns(breakdowns)
+    record_dropped(row.sub_date.replace(day=1) for row in submissions)
+    db_session.execute(SubmissionPackage.__table__.delete().where(
+        SubmissionPackage.sub_id.in_(sub_ids)))
+    db_session.execute(Submission.__table__.delete().where(
+        Submission.sub_id.in_(sub_ids)))
+    db_session.commit()
+    return len(sub_ids), total
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Package counts rolled up over the distros, vendors and months
+
+package_rollups adds up package_archives by package name, version,
+release, epoch, arch and status. It is changed in the same transactions as
+package_archives, so the two always agree. The breadcrumbs of
+/package/<name>/... read the rows under a name, version or release,
+which are one range of its primary key, instead of scanning
+submission_packages. rebuild_rollups replaces it with a sum from
+scratch.
+
+"""
+from sqlalchemy import func, select
+
+from popcorn.cache import response_cache
+from popcorn.database import db_session, insert_or_add
+from popcorn.models import PackageArchive, PackageRollup
+
+# the columns which identify a row of package_rollups
+ROLLUP_KEY = ('pkg_name', 'pkg_version', 'pkg_release', 'pkg_epoch',
+              'pkg_arch', 'pkg_status')
+# the levels of the breadcrumbs, from the widest to the narrowest
+LEVELS = ('pkg_name', 'pkg_version', 'pkg_release', 'pkg_arch')
+
+
+def add_counts(deltas):
+    """Add to the counts of package_rollups in the current transaction
+
+    :deltas: a dict mapping keys ordered like ROLLUP_KEY to counts, which
+             may be negative
+
+    The rows are updated in sorted order. A transaction should add all of
+    its deltas with one call, right before it commits: the rows are shared
+    by every distro and month, and only then do concurrent transactions
+    lock them in the same order, and not for long. One with more deltas
+    than it should hold in memory calls lock_rollups before its first
+    call instead.
+
+    """
+    insert_or_add(PackageRollup.__table__,
+                  [dict(zip(ROLLUP_KEY, key), count=count)
+                   for key, count in sorted(deltas.iteritems()) if count],
+                  ['count'])
+
+
+def lock_rollups():
+    """Keep other transactions from changing package_rollups until the
+    current one ends
+
+    On PostgreSQL only, the other databases lock whole tables anyway.
+
+    """
+    if db_session.bind.dialect.name == 'postgresql':
+        db_session.execute('LOCK TABLE package_rollups IN EXCLUSIVE MODE')
+
+
+def recount(criteria=(), connection=db_session):
+    """Add up the rows of package_archives matching the criteria
+
+    :connection: the session or Connection to count with
+
+    Returns a dict shaped like the deltas of add_counts.
+
+    """
+    return dict(iter_recount(criteria, connection))
+
+
+def iter_recount(criteria=(), connection=db_session):
+    """Yield the (key, count) pairs of recount one at a time, streamed
+    from a server-side cursor where the database has them
+    """
+    query = select([getattr(PackageArchive, c) for c in ROLLUP_KEY] +
+                   [func.sum(PackageArchive.count)])
+    for criterion in criteria:
+        query = query.where(criterion)
+    query = query.group_by(*[getattr(PackageArchive, c) for c in ROLLUP_KEY])
+    width = len(ROLLUP_KEY)
+    for row in connection.execute(
+            query.execution_options(stream_results=True)):
+        yield tuple(row[:width]), int(row[width])
+
+
+def breakdown(*prefix):
+    """Return the counts of the packages under a prefix of LEVELS
+
+    :prefix: a name, version and release, or fewer of them from the left
+
+    Returns a dict of the counts of the whole prefix by status, and a list
+    of dicts with the counts by status of every value of the next level,
+    sorted by that value. The arches of a release are told apart by epoch
+    too, and also carry their pkg_epoch. The list is empty if there are no
+    such packages.
+
+    """
+    columns = [getattr(PackageRollup, LEVELS[len(prefix)])]
+    if columns[0].key == 'pkg_arch':
+        columns.append(PackageRollup.pkg_epoch)
+    query = db_session.query(
+        PackageRollup.pkg_status, func.sum(PackageRollup.count), *columns
+    ).filter(
+        *[getattr(PackageRollup, c) == value
+          for c, value in zip(LEVELS, prefix)]
+    ).group_by(PackageRollup.pkg_status, *columns).order_by(*columns)
+
+    totals = {}
+    children = []
+    for row in query:
+        status, count, values = row[0], row[1], dict(
+            (c.key, value) for c, value in zip(columns, row[2:]))
+        # rebuilt months may leave rows which were counted down to 0
+        if not count:
+            continue
+        if not children or any(children[-1][c] != value
+                               for c, value in values.iteritems()):
+            children.append(values)
+        children[-1][status] = int(count)
+        totals[status] = totals.get(status, 0) + int(count)
+    return totals, children
+
+
+def rebuild_rollups():
+    """Replace package_rollups with a sum of package_archives and commit
+
+    The table is locked against the archiving until the new counts are
+    committed.
+
+    """
+    lock_rollups()
+    counts = recount()
+    db_session.execute(PackageRollup.__table__.delete())
+    add_counts(counts)
+    db_session.commit()
+    response_cache.bump_generation()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Estimates of how many distinct systems use a package
+
+Every submission sets one register, picked by the hash of its hw_uuid, in
+the sketch of each package name it lists for its distro and month. The
+sketches of several months and distros are merged when they're read, which
+gives the number of systems over a quarter or a whole distro without
+linking their submissions together.
+
+"""
+from itertools import groupby
+
+from sqlalchemy import LargeBinary, and_, bindparam, select
+
+from popcorn.configs import HLL_PRECISION
+from popcorn.database import db_session, insert_ignore
+from popcorn.hyperloglog import HyperLogLog
+from popcorn.models import PackageSketch
+
+# the columns which identify a sketch, in the order of the keys of the
+# updates given to add_systems
+SKETCH_KEY = ('distro_name', 'distro_version', 'month', 'pkg_name')
+# how many sketches are read and locked at once
+LOCK_CHUNK_SIZE = 500
+
+
+def add_systems(updates):
+    """Raise the registers of some sketches in the current transaction
+
+    :updates: a dict mapping keys ordered like SKETCH_KEY to dicts of
+              {register: rank}
+
+    The sketches are read and locked a chunk at a time, in sorted order so
+    concurrent transactions can't deadlock on them, and merged with the
+    updates in Python. The missing ones are inserted with the updates
+    already set; those another transaction inserted first are read and
+    merged like the rest. Only the sketches which change are written back,
+    with a single executemany.
+
+    """
+    if not updates:
+        return
+    keys = sorted(updates)
+    sketches = _lock_sketches(keys)
+    missing = [key for key in keys if key not in sketches]
+    if missing:
+        rows = []
+        for key in missing:
+            hll = HyperLogLog(precision=HLL_PRECISION)
+            for register, rank in updates[key].iteritems():
+                hll.set(register, rank)
+            rows.append(dict(zip(SKETCH_KEY, key), registers=str(hll)))
+        insert_ignore(PackageSketch.__table__, rows)
+        sketches.update(_lock_sketches(missing))
+
+    changed = []
+    for key in keys:
+        hll = HyperLogLog(sketches[key])
+        raised = False
+        for register, rank in updates[key].iteritems():
+            raised = hll.set(register, rank) or raised
+        if raised:
+            changed.append(dict(zip(['_' + c for c in SKETCH_KEY], key),
+                                _registers=str(hll)))
+    if changed:
+        table = PackageSketch.__table__
+        statement = table.update().where(and_(
+            *[table.c[c] == bindparam('_' + c) for c in SKETCH_KEY])
+        ).values(registers=bindparam('_registers', type_=LargeBinary))
+        db_session.execute(statement, changed)
+
+
+def _lock_sketches(keys):
+    """Return the registers of those of the sorted keys whose sketches
+    exist, locked until the end of the transaction"""
+    table = PackageSketch.__table__
+    sketches = {}
+    for (distro, version, month), group in groupby(keys, lambda k: k[:3]):
+        names = [key[3] for key in group]
+        for i in xrange(0, len(names), LOCK_CHUNK_SIZE):
+            query = select(
+                [table.c.pkg_name, table.c.registers], and_(
+                    table.c.distro_name == distro,
+                    table.c.distro_version == version,
+                    table.c.month == month,
+                    table.c.pkg_name.in_(names[i:i + LOCK_CHUNK_SIZE])),
+                order_by=table.c.pkg_name, for_update=True)
+            for name, registers in db_session.execute(query):
+                sketches[(distro, version, month, name)] = registers
+    return sketches
+
+
+def count_systems(pkg_name, months, distros=None):
+    """Estimate how many distinct systems listed a package during some
+    months
+
+    :pkg_name: the name of the package
+    :months: a list of the first days of the months
+    :distros: a list of (distro_name, distro_version) tuples, every distro
+              if None
+
+    """
+    sketches = PackageSketch.query.filter(
+        PackageSketch.pkg_name == pkg_name, PackageSketch.month.in_(months))
+    if distros is not None:
+        distros = set(distros)
+    return HyperLogLog.union(
+        HyperLogLog(sketch.registers) for sketch in sketches
+        if distros is None
+        or (sketch.distro_name, sketch.distro_version) in distros).count()
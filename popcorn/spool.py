@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Spool submissions to disk and record them in the database later
+
+The spool directory is laid out like a maildir: a submission is written
+to tmp/, fsync'ed and then renamed into new/. A draining worker claims it
+by renaming it into cur/ and deletes it once it has been committed.
+Submissions which keep failing are moved into bad/ so they can be looked
+at.
+
+"""
+
+import fcntl
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+
+from popcorn.configs import (DRAIN_RETRIES, DRAIN_WORKERS, GROUP_COMMIT_SIZE,
+                             SPOOL_DIR)
+from popcorn.database import db_session, init_worker
+from popcorn.parse import (EarlySubmissionError, CHUNK_SIZE,
+                           SUBMISSION_ERRORS, ingest_many, iter_lines,
+                           parse_header, parse_lines)
+
+SUBDIRS = ('tmp', 'new', 'cur', 'bad')
+
+log = logging.getLogger(__name__)
+
+
+def spool_submission(f, spool_dir=SPOOL_DIR):
+    """Check the header line of an upload and write it to the spool
+
+    :f: a seekable file-like object holding a plain text or a gzipped
+        submission
+
+    The upload is written as it was received. Raises FormatError if the
+    header line is invalid. Returns the name of the spooled file.
+
+    """
+    parse_header(next(iter_lines(f), ''))
+    f.seek(0)
+
+    _make_dirs(spool_dir)
+    name = '%d.%d.%s' % (time.time(), os.getpid(), uuid.uuid4().hex)
+    tmp_path = os.path.join(spool_dir, 'tmp', name)
+    with open(tmp_path, 'wb') as out:
+        shutil.copyfileobj(f, out, CHUNK_SIZE)
+        out.flush()
+        os.fsync(out.fileno())
+    os.rename(tmp_path, os.path.join(spool_dir, 'new', name))
+    _fsync_dir(os.path.join(spool_dir, 'new'))
+    return name
+
+
+def drain(spool_dir=SPOOL_DIR, workers=DRAIN_WORKERS, retries=DRAIN_RETRIES):
+    """Record all the spooled submissions in the database
+
+    :workers: how many processes record submissions at the same time
+    :retries: how many more times a submission is tried after an
+              unexpected error before it gets quarantined
+
+    Every worker commits the submissions it records in groups of
+    GROUP_COMMIT_SIZE. Returns a dict counting the submissions which were
+    'recorded', 'rejected' (too early) and 'quarantined'.
+
+    """
+    _make_dirs(spool_dir)
+    with open(os.path.join(spool_dir, 'drain.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        # anything left in cur/ was claimed by a drain which didn't finish
+        for name in os.listdir(os.path.join(spool_dir, 'cur')):
+            os.rename(os.path.join(spool_dir, 'cur', name),
+                      os.path.join(spool_dir, 'new', name))
+
+        names = sorted(os.listdir(os.path.join(spool_dir, 'new')))
+        jobs = [(spool_dir, names[i:i + GROUP_COMMIT_SIZE], retries)
+                for i in xrange(0, len(names), GROUP_COMMIT_SIZE)]
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, initializer=init_worker)
+            try:
+                counts = _count(pool.imap_unordered(_drain_group, jobs))
+                pool.close()
+            except:
+                # the groups which are left stay in new/ or cur/ for the
+                # next drain
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            counts = _count(_drain_group(job) for job in jobs)
+    return counts
+
+
+def _count(results):
+    """Add up what happened to the submissions of every group"""
+    counts = dict(recorded=0, rejected=0, quarantined=0)
+    for group_results in results:
+        for result in group_results:
+            counts[result] += 1
+    return counts
+
+
+def _drain_group(job):
+    """Record a group of spooled submissions, committing them together
+
+    Returns what happened to each of them. If the group can't be
+    committed, its submissions are retried one at a time.
+
+    """
+    spool_dir, names, retries = job
+    paths = []
+    for name in names:
+        path = os.path.join(spool_dir, 'cur', name)
+        os.rename(os.path.join(spool_dir, 'new', name), path)
+        paths.append(path)
+
+    results = {}
+    try:
+        for group in ingest_many(_read_spooled(paths)):
+            for i, error in group:
+                results[i] = _settle(spool_dir, paths[i], error)
+    except Exception, e:
+        db_session.rollback()
+        log.warning("group commit failed: %s", e)
+
+    return [results[i] if i in results
+            else _drain_file(spool_dir, path, retries)
+            for i, path in enumerate(paths)]
+
+
+def _read_spooled(paths):
+    for path in paths:
+        with open(path, 'rb') as f:
+            yield iter_lines(f)
+
+
+def _drain_file(spool_dir, path, retries):
+    """Record one claimed submission, returning what happened to it"""
+    for attempt in xrange(retries + 1):
+        try:
+            with open(path, 'rb') as f:
+                parse_lines(iter_lines(f))
+        except SUBMISSION_ERRORS, e:
+            db_session.rollback()
+            return _settle(spool_dir, path, e)
+        except Exception, e:
+            db_session.rollback()
+            log.warning("%s: attempt %d failed: %s",
+                        os.path.basename(path), attempt + 1, e)
+            if attempt < retries:
+                time.sleep(min(2 ** attempt, 30))
+        else:
+            return _settle(spool_dir, path, None)
+
+    os.rename(path, os.path.join(spool_dir, 'bad', os.path.basename(path)))
+    return 'quarantined'
+
+
+def _settle(spool_dir, path, error):
+    """Get rid of a claimed submission once it was recorded or rejected"""
+    if error is None:
+        os.unlink(path)
+        return 'recorded'
+    if isinstance(error, EarlySubmissionError):
+        os.unlink(path)
+        return 'rejected'
+    name = os.path.basename(path)
+    log.error("%s: quarantined: %s", name, error)
+    os.rename(path, os.path.join(spool_dir, 'bad', name))
+    return 'quarantined'
+
+
+def _make_dirs(spool_dir):
+    for subdir in SUBDIRS:
+        path = os.path.join(spool_dir, subdir)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+
+def _fsync_dir(path):
+    """Make a rename into the directory at path durable"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
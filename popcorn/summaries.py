@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""Counters of submissions and packages per distro for the dashboards
+
+distro_summaries is updated in the same transaction as the submissions it
+counts, so the index and the distro pages read a handful of rows instead
+of counting submission_packages. check_summaries compares it with a count
+from scratch and rebuild_summaries replaces it with one.
+
+distro_breakdowns is kept the same way. It counts the submissions of
+every distro by week, arch and popcorn version.
+
+"""
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from popcorn.cache import response_cache
+from popcorn.configs import DISTRO_WEEKS
+from popcorn.database import db_session, insert_or_add
+from popcorn.models import (DistroBreakdown, DistroSummary, Submission,
+                            SubmissionPackage)
+
+COUNTERS = ['submissions', 'packages']
+# the ways the submissions of a distro are counted in distro_breakdowns
+BREAKDOWNS = ['week', 'arch', 'popcorn_version']
+
+
+def add_counts(deltas):
+    """Add to the counters of distro_summaries in the current transaction
+
+    :deltas: a dict mapping (distro_name, distro_version) tuples to
+             (submissions, packages) tuples, which may be negative
+
+    The rows are updated in sorted order, so concurrent transactions lock
+    them in the same order and can't deadlock.
+
+    """
+    insert_or_add(DistroSummary.__table__,
+                  [{'distro_name': name, 'distro_version': version,
+                    'submissions': submissions, 'packages': packages}
+                   for (name, version), (submissions, packages)
+                   in sorted(deltas.iteritems())
+                   if submissions or packages],
+                  COUNTERS)
+
+
+def recount(connection=db_session):
+    """Count the submissions and packages of every distro from scratch
+
+    :connection: the session or Connection to count with
+
+    Returns a dict shaped like the deltas of add_counts.
+
+    """
+    sub_packages = select(
+        [SubmissionPackage.sub_id, func.count().label('packages')]
+    ).group_by(SubmissionPackage.sub_id).alias()
+    query = select(
+        [Submission.distro_name, Submission.distro_version,
+         func.count(Submission.sub_id),
+         func.coalesce(func.sum(sub_packages.c.packages), 0)]
+    ).select_from(
+        Submission.__table__.outerjoin(
+            sub_packages, sub_packages.c.sub_id == Submission.sub_id)
+    ).group_by(Submission.distro_name, Submission.distro_version)
+    return dict(((name, version), (submissions, int(packages)))
+                for name, version, submissions, packages
+                in connection.execute(query))
+
+
+def breakdown_keys(sub_date, arch, popcorn_version):
+    """Return the (breakdown, value) pairs a submission is counted under"""
+    week = sub_date - timedelta(days=sub_date.weekday())
+    return [('week', week.strftime('%Y-%m-%d')), ('arch', arch),
+            ('popcorn_version', popcorn_version)]
+
+
+def add_breakdowns(deltas):
+    """Add to the counters of distro_breakdowns in the current transaction
+
+    :deltas: a dict mapping (distro_name, distro_version, breakdown, value)
+             tuples to numbers of submissions, which may be negative
+
+    Like add_counts, the rows are updated in sorted order.
+
+    """
+    insert_or_add(DistroBreakdown.__table__,
+                  [{'distro_name': name, 'distro_version': version,
+                    'breakdown': breakdown, 'value': value,
+                    'submissions': submissions}
+                   for (name, version, breakdown, value), submissions
+                   in sorted(deltas.iteritems()) if submissions],
+                  ['submissions'])
+
+
+def recount_breakdowns(connection=db_session):
+    """Count the submissions of every distro by breakdown from scratch
+
+    :connection: the session or Connection to count with
+
+    Returns a dict shaped like the deltas of add_breakdowns. The
+    submissions are counted by day and added up into weeks here, which
+    every database can do the same way.
+
+    """
+    query = select(
+        [Submission.distro_name, Submission.distro_version,
+         Submission.sub_date, Submission.arch, Submission.popcorn_version,
+         func.count(Submission.sub_id)]
+    ).group_by(Submission.distro_name, Submission.distro_version,
+               Submission.sub_date, Submission.arch,
+               Submission.popcorn_version)
+    deltas = {}
+    for name, version, sub_date, arch, popcorn_version, count in \
+            connection.execute(query):
+        for key in breakdown_keys(sub_date, arch, popcorn_version):
+            key = (name, version) + key
+            deltas[key] = deltas.get(key, 0) + count
+    return deltas
+
+
+def distro_breakdowns(name, version, weeks=DISTRO_WEEKS):
+    """Return the counters of distro_breakdowns of a distro
+
+    :weeks: how many of the latest weeks to return
+
+    Returns a dict mapping every one of BREAKDOWNS to a list of [value,
+    submissions] pairs, sorted by value.
+
+    """
+    query = db_session.query(
+        DistroBreakdown.breakdown, DistroBreakdown.value,
+        DistroBreakdown.submissions
+    ).filter(DistroBreakdown.distro_name == name,
+             DistroBreakdown.distro_version == version,
+             DistroBreakdown.submissions > 0)
+    breakdowns = dict((breakdown, []) for breakdown in BREAKDOWNS)
+    for breakdown, value, submissions in query.filter(
+            DistroBreakdown.breakdown != 'week').order_by(
+            DistroBreakdown.breakdown, DistroBreakdown.value):
+        breakdowns[breakdown].append([value, submissions])
+    latest = query.filter(DistroBreakdown.breakdown == 'week').order_by(
+        DistroBreakdown.value.desc()).limit(weeks).all()
+    breakdowns['week'] = [[value, submissions]
+                          for breakdown, value, submissions
+                          in reversed(latest)]
+    return breakdowns
+
+
+def check_summaries():
+    """Compare distro_summaries with a count from scratch
+
+    Returns a sorted list of ((distro_name, distro_version), stored counts,
+    actual counts) tuples for every distro whose counters are wrong or
+    missing.
+
+    """
+    stored = dict(((row.distro_name, row.distro_version),
+                   (row.submissions, row.packages))
+                  for row in DistroSummary.query)
+    actual = recount()
+    return sorted((key, stored.get(key, (0, 0)), actual.get(key, (0, 0)))
+                  for key in set(stored) | set(actual)
+                  if stored.get(key, (0, 0)) != actual.get(key, (0, 0)))
+
+
+def rebuild_summaries():
+    """Replace distro_summaries and distro_breakdowns with a count from
+    scratch and commit
+
+    On PostgreSQL the table is locked against the ingestion until the new
+    counters are committed, so no submission is counted twice or missed.
+
+    """
+    if db_session.bind.dialect.name == 'postgresql':
+        db_session.execute('LOCK TABLE distro_summaries, distro_breakdowns '
+                           'IN EXCLUSIVE MODE')
+    counts = recount()
+    breakdowns = recount_breakdowns()
+    db_session.execute(DistroSummary.__table__.delete())
+    db_session.execute(DistroBreakdown.__table__.delete())
+    add_counts(counts)
+    add_breakdowns(breakdowns)
+    db_session.commit()
+    response_cache.bump_generation()
@@ -23,14 +23,35 @@
 # OTHER DEALINGS IN THE SOFTWARE.
 
 from datetime import date, timedelta
+import unittest
 
-from popcorn.archive import update_archives
+from popcorn import archive
+from popcorn.archive import (is_archived, last_month, months_between,
+                             rebuild_archives, update_archives,
+                             verify_archives)
 from popcorn.models import (System, Submission, SubmissionPackage,
-                            PackageArchive)
+                            Package, PackageArchive, ArchiveWatermark,
+                            ArchiveRun, DroppedMonth)
+from popcorn.configs import INSERT_BATCH_SIZE
 from popcorn.database import db_session
+from popcorn.partitions import drop_month
+from popcorn.retention import purge
 from popcorn.test.test_models import ModelsTest
 
 
+class TestMonths(unittest.TestCase):
+    def test_last_month(self):
+        self.assertEqual(last_month(date(2012, 6, 20)), date(2012, 5, 1))
+        self.assertEqual(last_month(date(2013, 1, 31)), date(2012, 12, 1))
+
+    def test_months_between(self):
+        self.assertEqual(months_between(date(2012, 11, 15), date(2013, 1, 1)),
+                         [date(2012, 11, 1), date(2012, 12, 1),
+                          date(2013, 1, 1)])
+        self.assertEqual(months_between(date(2013, 1, 1), date(2012, 1, 1)),
+                         [])
+
+
 class TestArchivePackages(ModelsTest):
     def setUp(self):
         super(TestArchivePackages, self).setUp()
@@ -39,18 +60,20 @@ class TestArchivePackages(ModelsTest):
 
         sub1 = Submission('openSUSE', '12.1', 'i586', 'POPCORN v0.0.1',
                           self.old_date)
+        self.python = Package('python', '2.7', '3', '', 'i586',
+                              'http://repo.url')
+        self.chrome = Package('chrome', '2.7', '3', '', 'i586',
+                              'http://repo.url')
         db_session.add(sub1)
         db_session.flush()
 
-        subp1 = SubmissionPackage(sub1.sub_id, self.old_date, 'python',
-                                  '2.7', '3', '', 'i586', 'http://repo.url',
-                                  'voted')
-        subp2 = SubmissionPackage(sub1.sub_id, self.old_date, 'chrome',
-                                  '2.7', '3', '', 'i586', 'http://repo.url',
-                                  'voted')
+        subp1 = SubmissionPackage(sub1.sub_id, self.old_date,
+                                  self.python, 'v')
+        subp2 = SubmissionPackage(sub1.sub_id, self.old_date,
+                                  self.chrome, 'v')
         db_session.add_all([subp1, subp2])
         db_session.flush()
-        update_archives(self.old_date)
+        update_archives(workers=1)
 
     def test_archive_package_month(self):
         self.assertEqual(len(PackageArchive.query.all()), 2)
@@ -62,12 +85,10 @@ class TestArchivePackages(ModelsTest):
         db_session.add(sub2)
         db_session.flush()
 
-        subp3 = SubmissionPackage(sub2.sub_id, self.today, 'python',
-                                  '2.7', '3', '', 'i586', 'http://repo.url',
-                                  'voted')
-        subp4 = SubmissionPackage(sub2.sub_id, self.today, 'chrome',
-                                  '2.7', '3', '', 'i586', 'http://repo.url',
-                                  'voted')
+        subp3 = SubmissionPackage(sub2.sub_id, self.today,
+                                  self.python, 'v')
+        subp4 = SubmissionPackage(sub2.sub_id, self.today,
+                                  self.chrome, 'v')
 
         db_session.add_all([subp3, subp4])
         db_session.flush()
@@ -76,17 +97,160 @@ class TestArchivePackages(ModelsTest):
         db_session.add(sub3)
         db_session.flush()
 
-        subp5 = SubmissionPackage(sub3.sub_id, self.today, 'python',
-                                  '2.7', '3', '', 'i586', 'http://repo.url',
-                                  'voted')
+        subp5 = SubmissionPackage(sub3.sub_id, self.today,
+                                  self.python, 'v')
 
         db_session.add(subp5)
         db_session.flush()
 
-        update_archives(date.today())
+        update_archives(workers=1)
 
         self.assertEqual(len(PackageArchive.query.all()), 4)
 
         query = PackageArchive.query.filter_by(pkg_name='python',
                                                month=self.today.replace(day=1))
         count = self.assertEqual(query.one().count, 2)
+
+    def add_submission(self, day, packages, distro=('Fedora', '16')):
+        sub = Submission(distro[0], distro[1], 'i586', 'v1', day)
+        db_session.add(sub)
+        db_session.flush()
+        db_session.add_all([SubmissionPackage(sub.sub_id, day, package, 'v')
+                            for package in packages])
+        db_session.commit()
+
+    def test_update_archives_twice(self):
+        self.add_submission(self.today, [self.python])
+
+        self.assertEqual(update_archives(workers=1), 1)
+        self.assertEqual(update_archives(workers=1), 0)
+
+        query = PackageArchive.query.filter_by(pkg_name='python',
+                                               month=self.today.replace(day=1))
+        self.assertEqual(query.one().count, 1)
+
+    def test_update_archives_in_chunks(self):
+        for i in range(3):
+            self.add_submission(self.today, [self.python, self.chrome])
+
+        self.assertEqual(update_archives(workers=1, chunk_size=2), 3)
+
+        self.assertEqual(verify_archives(self.today), [])
+        query = PackageArchive.query.filter_by(pkg_name='chrome',
+                                               month=self.today.replace(day=1))
+        self.assertEqual(query.one().count, 3)
+
+    def test_verify_archives(self):
+        self.assertEqual(verify_archives(self.old_date), [])
+
+        archive = PackageArchive.query.filter_by(pkg_name='python').one()
+        archive.count = 5
+        db_session.commit()
+
+        [(key, archived, actual)] = verify_archives(self.old_date)
+        self.assertEqual(key[0], 'python')
+        self.assertEqual((archived, actual), (5, 1))
+
+    def test_is_archived(self):
+        self.assertTrue(is_archived(self.old_date))
+
+        self.add_submission(self.today, [self.python])
+        self.assertFalse(is_archived(self.today))
+        update_archives(workers=1)
+        self.assertTrue(is_archived(self.today))
+
+    def test_watermarks_per_distro(self):
+        self.add_submission(self.today, [self.python])
+        self.add_submission(self.today, [self.chrome], ('openSUSE', '12.1'))
+        self.add_submission(self.today, [self.python])
+
+        self.assertEqual(update_archives(workers=1), 3)
+
+        watermarks = dict(((w.distro_name, w.distro_version), w.sub_id)
+                          for w in ArchiveWatermark.query)
+        self.assertEqual(watermarks, {('Fedora', '16'): 4,
+                                      ('openSUSE', '12.1'): 4})
+
+    def test_update_archives_in_batches(self):
+        self.add_submission(self.today, [self.python, self.chrome])
+        archive.INSERT_BATCH_SIZE = 1
+        try:
+            update_archives(workers=1)
+        finally:
+            archive.INSERT_BATCH_SIZE = INSERT_BATCH_SIZE
+
+        self.assertEqual(verify_archives(self.today), [])
+        self.assertEqual(PackageArchive.query.count(), 4)
+
+    def test_rebuild_archives(self):
+        old_month = self.old_date.replace(day=1)
+        PackageArchive.query.filter_by(pkg_name='chrome').delete()
+        archive = PackageArchive.query.filter_by(pkg_name='python').one()
+        archive.count = 5
+        db_session.commit()
+
+        [(month, rows, seconds)] = rebuild_archives([old_month], workers=1)
+
+        self.assertEqual((month, rows), (old_month, 2))
+        self.assertEqual(verify_archives(old_month), [])
+        run = ArchiveRun.query.get(old_month)
+        self.assertEqual(run.rows, 2)
+        self.assertTrue(run.finished)
+
+    def test_rebuild_archives_leaves_unarchived_submissions(self):
+        self.add_submission(self.old_date, [self.python])
+
+        list(rebuild_archives([self.old_date.replace(day=1)], workers=1))
+
+        query = PackageArchive.query.filter_by(pkg_name='python')
+        self.assertEqual(query.one().count, 1)
+
+    def test_rebuild_archives_resume(self):
+        months = [self.today.replace(day=1), self.old_date.replace(day=1)]
+        db_session.add_all([ArchiveRun(months[0]),
+                            ArchiveRun(months[1], date.today(), 2, 1.0)])
+        db_session.commit()
+
+        self.assertEqual([m for m, rows, seconds in
+                          rebuild_archives(None, workers=1)], months[:1])
+        self.assertEqual(ArchiveRun.query.filter(
+            ArchiveRun.finished.is_(None)).count(), 0)
+
+    def test_rebuild_archives_refuses_dropped_months(self):
+        old_month = self.old_date.replace(day=1)
+        drop_month(old_month)
+
+        self.assertRaises(ValueError, list,
+                          rebuild_archives([old_month], workers=1))
+        self.assertEqual(PackageArchive.query.filter_by(
+            month=old_month).count(), 2)
+        self.assertEqual(ArchiveRun.query.count(), 0)
+
+    def test_rebuild_archives_refuses_purged_months(self):
+        old_month = self.old_date.replace(day=1)
+        purge(3, pause=0)
+        self.assertEqual(DroppedMonth.query.get(old_month).month, old_month)
+
+        self.assertRaises(ValueError, list,
+                          rebuild_archives([old_month], workers=1))
+        self.assertEqual(PackageArchive.query.filter_by(
+            month=old_month).count(), 2)
+
+    def test_rebuild_archives_resume_skips_dropped_months(self):
+        old_month = self.old_date.replace(day=1)
+        db_session.add(ArchiveRun(old_month))
+        db_session.commit()
+        drop_month(old_month)
+
+        self.assertEqual(list(rebuild_archives(None, workers=1)), [])
+        self.assertEqual(ArchiveRun.query.count(), 0)
+        self.assertEqual(PackageArchive.query.filter_by(
+            month=old_month).count(), 2)
+
+    def test_rebuild_month_refuses_dropped_months(self):
+        old_month = self.old_date.replace(day=1)
+        drop_month(old_month)
+
+        self.assertRaises(ValueError, archive._rebuild_month, old_month)
+        self.assertEqual(PackageArchive.query.filter_by(
+            month=old_month).count(), 2)
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+from popcorn.cache import (DimensionCache, FilesystemCache, LRUCache,
+                           PackageCache, ResponseCache, SubmissionLimiter)
+from popcorn.configs import SUBMISSION_INTERVAL
+from popcorn.database import db_session
+from popcorn.models import Package, System, Vendor
+from popcorn.test.test_models import ModelsTest
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_set(self):
+        cache = LRUCache(10, 60)
+        cache.set('a', 1)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.stats, {'hits': 1, 'misses': 1, 'entries': 1})
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2, 60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expires_entries(self):
+        cache = LRUCache(10, -1)
+        cache.set('a', 1)
+
+        self.assertEqual(cache.get('a', 'expired'), 'expired')
+
+
+class TestDimensionCache(ModelsTest):
+    def setUp(self):
+        super(TestDimensionCache, self).setUp()
+        self.cache = DimensionCache(100, 60)
+
+    def test_preloaded_arches(self):
+        self.cache.preload()
+        self.cache.publish()
+
+        self.assertTrue(self.cache.has_arch('i586'))
+        self.assertFalse(self.cache.has_arch('sparc'))
+        self.assertEqual(self.cache.stats['hits'], 1)
+
+    def test_discarded_rows_arent_cached(self):
+        self.cache.add_vendors({'openSUSE': 'openSUSE'})
+        self.cache.add_vendors({'openSUSE': 'openSUSE'})
+        db_session.rollback()
+        self.cache.discard()
+
+        self.cache.add_vendors({'openSUSE': 'openSUSE'})
+        self.assertEqual(Vendor.query.filter_by(vendor_name='openSUSE'
+                                                ).count(), 1)
+        self.assertEqual(self.cache.stats['entries'], 0)
+
+    def test_discard_since_savepoint(self):
+        self.cache.preload()
+        self.cache.publish()
+        entries = self.cache.stats['entries']
+
+        # the vendors which get inserted are only found the next time
+        self.cache.add_vendors({'NewVendor': 'NewVendor'})
+        self.cache.add_vendors({'NewVendor': 'NewVendor'})
+        mark = self.cache.savepoint()
+        self.cache.add_vendors({'NewVendor': 'NewVendor',
+                                'OtherVendor': 'OtherVendor'})
+        self.cache.discard(mark)
+        self.cache.publish()
+
+        self.assertEqual(self.cache.stats['entries'], entries + 1)
+        self.assertTrue(self.cache._get(('vendor', 'NewVendor')))
+        self.assertFalse(self.cache._get(('vendor', 'OtherVendor')))
+
+    def test_has_distro(self):
+        self.assertTrue(self.cache.has_distro('Fedora', '16'))
+        self.assertFalse(self.cache.has_distro('Fedora', '17'))
+
+    def test_add_vendors(self):
+        self.cache.add_vendors({'http://repo.url': 'http://repo.url',
+                                'openSUSE': 'openSUSE'})
+        self.cache.add_vendors({'openSUSE': 'openSUSE'})
+
+        self.assertEqual(sorted(v.vendor_name for v in Vendor.query.all()),
+                         ['http://repo.url', 'openSUSE'])
+
+
+class TestPackageCache(ModelsTest):
+    def setUp(self):
+        super(TestPackageCache, self).setUp()
+        self.cache = PackageCache(100, 60)
+        self.python = ('python', '2.7', '3', '', 'i586', 'http://repo.url')
+        self.zsh = ('zsh', '4.3', '2', '1', 'x86_64', 'http://repo.url')
+
+    def test_package_ids_creates_packages(self):
+        ids = self.cache.package_ids([self.python, self.zsh])
+
+        self.assertEqual(Package.query.count(), 2)
+        zsh = Package.query.filter_by(pkg_name='zsh').one()
+        self.assertEqual(ids[self.zsh], zsh.pkg_id)
+
+    def test_package_ids_cached(self):
+        db_session.add(Package(*self.python))
+        db_session.flush()
+
+        ids = self.cache.package_ids([self.python])
+        self.cache.publish()
+        self.assertEqual(self.cache.package_ids([self.python]), ids)
+        self.assertEqual(self.cache.stats['hits'], 1)
+        self.assertEqual(Package.query.count(), 1)
+
+
+class TestSubmissionLimiter(ModelsTest):
+    def setUp(self):
+        super(TestSubmissionLimiter, self).setUp()
+        self.limiter = SubmissionLimiter(100, 60)
+        self.today = date(2012, 6, 20)
+
+    def test_unknown_system(self):
+        self.assertIsNone(self.limiter.too_early('new-uuid', self.today))
+
+    def test_recent_system_from_database(self):
+        system = System('hwuuid')
+        system.last_sub_date = self.today - timedelta(days=1)
+        db_session.add(system)
+        db_session.commit()
+
+        self.assertEqual(self.limiter.too_early('hwuuid', self.today),
+                         system.last_sub_date)
+
+    def test_recorded_dates(self):
+        last = self.today - timedelta(days=SUBMISSION_INTERVAL)
+        self.limiter.record('hwuuid', last)
+        self.assertEqual(self.limiter.too_early('hwuuid', self.today), last)
+
+        self.limiter.record('hwuuid', last - timedelta(days=1))
+        self.assertIsNone(self.limiter.too_early('hwuuid', self.today))
+        self.assertEqual(self.limiter.stats['hits'], 2)
+
+
+class TestResponseCache(unittest.TestCase):
+    backend = 'memory'
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = ResponseCache(self.backend, self.path, size=10, ttl=60,
+                                   ttls={'index': -1, 'faq': 0})
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_get_set(self):
+        self.cache.set('vendor', '/vendor/a', 'response')
+
+        self.assertEqual(self.cache.get('vendor', '/vendor/a'), 'response')
+        self.assertEqual(self.cache.get('vendor', '/vendor/b'), None)
+        self.assertEqual(self.cache.get('distro', '/vendor/a'), None)
+
+    def test_bump_generation(self):
+        self.cache.set('vendor', '/vendor/a', 'response')
+
+        self.cache.bump_generation()
+
+        self.assertEqual(self.cache.generation(), 1)
+        self.assertEqual(self.cache.get('vendor', '/vendor/a'), None)
+        # the workers share the generation
+        other = ResponseCache(self.backend, self.path)
+        self.assertEqual(other.generation(), 1)
+
+    def test_ingestion_bumps_are_spaced_out(self):
+        self.cache.bump_generation()
+        self.cache.bump_generation(ingested=True)
+        self.assertEqual(self.cache.generation(), 1)
+
+        self.cache.ingest_interval = 0
+        self.cache.bump_generation(ingested=True)
+        self.assertEqual(self.cache.generation(), 2)
+
+    def test_set_in_an_old_generation(self):
+        self.cache.bump_generation()
+        self.cache.set('vendor', '/vendor/a', 'response', generation=0)
+
+        self.assertEqual(self.cache.get('vendor', '/vendor/a', 0), None)
+        self.assertEqual(self.cache.stats['entries'], 0)
+
+    def test_ttls(self):
+        self.cache.set('index', '/', 'expired')
+        self.cache.set('faq', '/faq', 'not cached')
+
+        self.assertEqual(self.cache.get('index', '/'), None)
+        self.assertEqual(self.cache.get('faq', '/faq'), None)
+
+    def test_stats(self):
+        self.cache.set('vendor', '/vendor/a', 'response')
+        self.cache.get('vendor', '/vendor/a')
+        self.cache.get('vendor', '/vendor/b')
+        self.cache.get('faq', '/faq')
+
+        stats = self.cache.stats
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']),
+                         (1, 1, 1))
+        self.assertEqual(stats['views'], {'vendor': {'hits': 1,
+                                                     'misses': 1}})
+
+    def test_disabled(self):
+        cache = ResponseCache(None, None)
+        cache.set('vendor', '/vendor/a', 'response')
+        cache.bump_generation()
+
+        self.assertEqual(cache.get('vendor', '/vendor/a'), None)
+        self.assertEqual(cache.stats, {})
+
+
+class TestFilesystemResponseCache(TestResponseCache):
+    backend = 'filesystem'
+
+    def test_shared(self):
+        self.cache.set('vendor', '/vendor/a', 'response')
+
+        other = ResponseCache(self.backend, self.path)
+        self.assertEqual(other.get('vendor', '/vendor/a'), 'response')
+
+    def test_failed_writes_are_ignored(self):
+        path = os.path.join(self.path, 'file')
+        open(path, 'w').close()
+        cache = FilesystemCache(path)
+
+        cache.set((1, 'key'), 'response', 60)
+        self.assertEqual(cache.get((1, 'key')), None)
+
+    def test_old_generations_are_removed(self):
+        self.cache.set('vendor', '/vendor/a', 'response')
+        self.cache.bump_generation()
+        self.cache.set('vendor', '/vendor/a', 'response')
+
+        self.assertEqual(len(FilesystemCache(self.path + '/responses')), 1)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+
+from popcorn.database import db_session
+from popcorn.dumps import dump
+from popcorn.models import ArchiveRun, Distro, PackageArchive, PackageRank
+
+from popcorn.test.test_models import ModelsTest
+
+MAY = date(2012, 5, 1)
+JUNE = date(2012, 6, 1)
+
+
+class TestDump(ModelsTest):
+    def setUp(self):
+        super(TestDump, self).setUp()
+        self.path = tempfile.mkdtemp()
+        for name, month in [('python', MAY), ('python', JUNE),
+                            ('zsh', JUNE)]:
+            db_session.add(PackageArchive(name, '2.7', '3', '', 'i586',
+                                          'http://repo.url', 'voted',
+                                          'Fedora', '16', month, 4))
+        db_session.add_all([
+            PackageRank('Fedora', '16', JUNE, 'inst', 1, 'python', 4),
+            PackageRank('Fedora', '16', JUNE, 'inst', 2, 'zsh', 3)])
+        db_session.commit()
+
+    def tearDown(self):
+        super(TestDump, self).tearDown()
+        shutil.rmtree(self.path)
+
+    def read(self, relpath):
+        return gzip.open(os.path.join(self.path, relpath)).read()
+
+    def manifest(self):
+        with open(os.path.join(self.path, 'manifest.json')) as f:
+            return json.load(f)
+
+    def test_dump(self):
+        self.assertEqual(dump(self.path), ['Fedora/16/2012-06/by_inst.gz',
+                                           'archives/2012-05.csv.gz',
+                                           'archives/2012-06.csv.gz'])
+
+        self.assertEqual(self.read('Fedora/16/2012-06/by_inst.gz'),
+                         '# popcorn Fedora 16 2012-06 by_inst\n'
+                         '# rank name count\n'
+                         '1 python 4\n'
+                         '2 zsh 3\n')
+        self.assertEqual(len(self.read('archives/2012-06.csv.gz')
+                             .splitlines()), 3)
+        files = self.manifest()['files']
+        with open(os.path.join(self.path, 'archives/2012-05.csv.gz')) as f:
+            data = f.read()
+        self.assertEqual(files['archives/2012-05.csv.gz']['sha256'],
+                         hashlib.sha256(data).hexdigest())
+        self.assertEqual(files['archives/2012-05.csv.gz']['size'], len(data))
+        with open(os.path.join(self.path, 'SHA256SUMS')) as f:
+            self.assertEqual(len(f.readlines()), 3)
+        self.assertFalse([name for name in os.listdir(self.path)
+                          if name.endswith('.tmp')])
+
+    def test_dump_changed_months(self):
+        dump(self.path)
+        self.assertEqual(dump(self.path), [])
+
+        db_session.query(PackageArchive).filter_by(
+            pkg_name='zsh').update({'count': 5})
+        db_session.add(ArchiveRun(MAY, datetime.now(), 1, 0.1))
+        db_session.commit()
+
+        self.assertEqual(dump(self.path), ['archives/2012-05.csv.gz',
+                                           'archives/2012-06.csv.gz'])
+
+    def test_dump_removed_ranking(self):
+        dump(self.path)
+        db_session.query(PackageRank).delete()
+        db_session.commit()
+
+        self.assertEqual(dump(self.path), [])
+        self.assertFalse(os.path.exists(os.path.join(
+            self.path, 'Fedora/16/2012-06/by_inst.gz')))
+        self.assertNotIn('Fedora/16/2012-06/by_inst.gz',
+                         self.manifest()['files'])
+
+    def test_dump_unsafe_distro_name(self):
+        db_session.add_all([Distro('../..', '16'), Distro('/..', '16')])
+        db_session.flush()
+        db_session.add_all([
+            PackageRank('../..', '16', JUNE, 'vote', 1, 'zsh', 1),
+            PackageRank('/..', '16', JUNE, 'vote', 1, 'zsh', 1)])
+        db_session.commit()
+
+        written = [relpath for relpath in dump(self.path)
+                   if relpath.endswith('by_vote.gz')]
+        self.assertEqual(len(written), 2)
+        self.assertTrue(all(relpath.startswith('_..-') for relpath in written))
+
+    def test_dump_ranked_again(self):
+        dump(self.path)
+        db_session.query(PackageRank).update(
+            {'ranked': datetime.now() + timedelta(seconds=1)})
+        db_session.commit()
+
+        self.assertEqual(dump(self.path), ['Fedora/16/2012-06/by_inst.gz'])
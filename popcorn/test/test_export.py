@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import gzip
+import json
+from cStringIO import StringIO
+from datetime import date
+
+from popcorn.database import db_session
+from popcorn.export import archive_rows, csv_lines, gzip_chunks, ndjson
+from popcorn.models import PackageArchive
+
+from popcorn.test.test_models import ModelsTest
+
+
+class TestExport(ModelsTest):
+    def setUp(self):
+        super(TestExport, self).setUp()
+        for name, month, status in [('python', date(2012, 5, 1), 'voted'),
+                                    ('python', date(2012, 6, 1), 'voted'),
+                                    ('zsh', date(2012, 6, 1), 'old')]:
+            db_session.add(PackageArchive(name, '2.7', '3', '', 'i586',
+                                          'http://repo.url', status, 'Fedora',
+                                          '16', month, 4))
+        db_session.commit()
+
+    def test_archive_rows(self):
+        rows = sorted(archive_rows({'month': date(2012, 6, 1)}))
+
+        self.assertEqual(rows, [
+            ['python', '2.7', '3', '', 'i586', 'http://repo.url', 'voted',
+             'Fedora', '16', '2012-06', 4],
+            ['zsh', '2.7', '3', '', 'i586', 'http://repo.url', 'old',
+             'Fedora', '16', '2012-06', 4]])
+        self.assertEqual(len(list(archive_rows({'pkg_status': 'voted'}))), 2)
+
+    def test_ndjson(self):
+        chunks = list(ndjson(archive_rows({}), batch_size=2))
+
+        self.assertEqual([chunk.count('\n') for chunk in chunks], [2, 1])
+        rows = [json.loads(line) for line in ''.join(chunks).splitlines()]
+        self.assertEqual(sorted(row['pkg_name'] for row in rows),
+                         ['python', 'python', 'zsh'])
+        self.assertEqual(rows[0]['count'], 4)
+
+    def test_csv(self):
+        lines = ''.join(csv_lines(archive_rows({'pkg_name': 'zsh'}))
+                        ).splitlines()
+
+        self.assertEqual(lines, [
+            'pkg_name,pkg_version,pkg_release,pkg_epoch,pkg_arch,'
+            'vendor_name,pkg_status,distro_name,distro_version,month,count',
+            'zsh,2.7,3,,i586,http://repo.url,old,Fedora,16,2012-06,4'])
+
+    def test_gzip_chunks(self):
+        chunks = ['line %d\n' % i for i in range(1000)]
+
+        data = ''.join(gzip_chunks(iter(chunks)))
+
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO(data)).read(),
+                         ''.join(chunks))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+import unittest
+
+from popcorn import hyperloglog
+from popcorn.hyperloglog import HyperLogLog, position
+
+
+def sketch(values, precision=10):
+    hll = HyperLogLog(precision=precision)
+    for value in values:
+        hll.add(value)
+    return hll
+
+
+class TestHyperLogLog(unittest.TestCase):
+    def assertClose(self, estimate, actual, precision=10):
+        # three standard errors
+        error = 3 * 1.04 / (2 ** precision) ** 0.5
+        self.assertTrue(abs(estimate - actual) <= error * actual,
+                        "%d is too far from %d" % (estimate, actual))
+
+    def test_position(self):
+        register, rank = position('hw_uuid', 10)
+        self.assertTrue(0 <= register < 1024)
+        self.assertTrue(1 <= rank <= 55)
+        self.assertEqual(position('hw_uuid', 10), (register, rank))
+
+    def test_empty(self):
+        self.assertEqual(HyperLogLog().count(), 0)
+
+    def test_small_counts(self):
+        self.assertEqual(sketch(['a', 'b', 'c', 'a']).count(), 3)
+
+    def test_accuracy(self):
+        for actual in [1000, 5000, 50000]:
+            self.assertClose(sketch(str(i) for i in xrange(actual)).count(),
+                             actual)
+
+    def test_accuracy_low_precision(self):
+        self.assertClose(sketch((str(i) for i in xrange(20000)),
+                                precision=6).count(), 20000, precision=6)
+
+    def test_union(self):
+        first = sketch(str(i) for i in xrange(6000))
+        second = sketch(str(i) for i in xrange(4000, 10000))
+
+        union = HyperLogLog.union([first, second])
+
+        self.assertEqual(str(union),
+                         str(sketch(str(i) for i in xrange(10000))))
+        self.assertClose(union.count(), 10000)
+
+    def test_set(self):
+        hll = HyperLogLog()
+        self.assertTrue(hll.set(3, 5))
+        self.assertFalse(hll.set(3, 4))
+        self.assertEqual(hll.registers[3], 5)
+
+    def test_stored(self):
+        hll = sketch(['a', 'b'])
+        self.assertEqual(HyperLogLog(str(hll)).registers, hll.registers)
+        self.assertEqual(HyperLogLog(str(hll)).precision, 10)
+        self.assertRaises(ValueError, HyperLogLog, 'abc')
+        self.assertRaises(ValueError, hll.update, HyperLogLog(precision=4))
+
+    @unittest.skipIf(hyperloglog.numpy is None, "NumPy isn't installed")
+    def test_pure_python(self):
+        values = [str(i) for i in xrange(3000)]
+        union = HyperLogLog.union([sketch(values[:2000]),
+                                   sketch(values[1000:])])
+        numpy, hyperloglog.numpy = hyperloglog.numpy, None
+        try:
+            pure = HyperLogLog.union([sketch(values[:2000]),
+                                      sketch(values[1000:])])
+            self.assertEqual(pure.count(), union.count())
+        finally:
+            hyperloglog.numpy = numpy
+        self.assertEqual(str(pure), str(union))
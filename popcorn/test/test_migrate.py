@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from datetime import date
+
+from sqlalchemy import Column, Date, Integer, MetaData, String, Table
+
+from popcorn.archive import rebuild_archives, update_archives, verify_archives
+from popcorn.database import db_session
+from popcorn.migrate import legacy_submission_packages, migrate
+from popcorn.models import (ArchiveRun, ArchiveWatermark, DroppedMonth,
+                            Package, PackageArchive, PackageRollup,
+                            PackageSketch, Submission, SubmissionPackage)
+from popcorn.partitions import drop_month
+from popcorn.test.test_models import ModelsTest
+
+
+class TestInternPackages(ModelsTest):
+    def setUp(self):
+        super(TestInternPackages, self).setUp()
+        self.engine = db_session.bind
+        sub = Submission('openSUSE', '12.1', 'i586', 'POPCORN v0.0.1')
+        db_session.add(sub)
+        db_session.commit()
+
+        SubmissionPackage.__table__.drop(self.engine)
+        legacy_submission_packages.create(self.engine)
+        row = dict(sub_id=sub.sub_id, sub_date=date.today(),
+                   pkg_version='2.7', pkg_release='3', pkg_epoch='',
+                   pkg_arch='i586', vendor_name='http://repo.url')
+        self.engine.execute(legacy_submission_packages.insert(), [
+            dict(row, pkg_name='python', pkg_status='voted'),
+            dict(row, pkg_name='zsh', pkg_status='old')])
+
+    def test_migrate(self):
+        self.assertEqual(migrate(self.engine), ['intern_packages'])
+
+        self.assertEqual(sorted(p.pkg_name for p in Package.query), [
+            'python', 'zsh'])
+        subp = SubmissionPackage.query.join(Package).filter(
+            Package.pkg_name == 'zsh').one()
+        self.assertEqual(subp.pkg_status, 'old')
+        self.assertEqual(subp.sub_date, date.today())
+
+    def test_migrate_twice(self):
+        migrate(self.engine)
+
+        self.assertEqual(migrate(self.engine), [])
+        self.assertEqual(SubmissionPackage.query.count(), 2)
+
+
+class TestAddArchiveEpochs(ModelsTest):
+    def setUp(self):
+        super(TestAddArchiveEpochs, self).setUp()
+        self.engine = db_session.bind
+        db_session.add_all([
+            Package('python', '2.7', '3', '', 'i586', 'http://repo.url'),
+            Package('vim', '7.3', '1', '2', 'i586', 'http://repo.url'),
+            Package('perl', '5.16', '1', '', 'i586', 'http://repo.url'),
+            Package('perl', '5.16', '1', '4', 'i586', 'http://repo.url')])
+        db_session.commit()
+
+        PackageRollup.__table__.drop(self.engine)
+        PackageArchive.__table__.drop(self.engine)
+        # package_archives as it was before it had the epochs
+        legacy = Table(
+            'package_archives', MetaData(),
+            *[Column(name, String(50), primary_key=True)
+              for name in ['pkg_name', 'pkg_version', 'pkg_release',
+                           'pkg_arch', 'vendor_name', 'pkg_status',
+                           'distro_name', 'distro_version']] +
+            [Column('month', Date(), primary_key=True),
+             Column('count', Integer)])
+        legacy.create(self.engine)
+        row = dict(pkg_release='1', pkg_arch='i586',
+                   vendor_name='http://repo.url', pkg_status='voted',
+                   distro_name='openSUSE', distro_version='12.1',
+                   month=date(2012, 6, 1), count=3)
+        self.engine.execute(legacy.insert(), [
+            dict(row, pkg_name='python', pkg_version='2.7', pkg_release='3'),
+            dict(row, pkg_name='vim', pkg_version='7.3'),
+            dict(row, pkg_name='perl', pkg_version='5.16')])
+
+    def test_migrate(self):
+        self.assertEqual(migrate(self.engine),
+                         ['add_archive_epochs', 'fill_package_rollups',
+                          'seed_archive_watermarks'])
+        self.assertNotIn('add_archive_epochs', migrate(self.engine))
+
+        self.assertEqual(sorted((a.pkg_name, a.pkg_epoch, a.count)
+                                for a in PackageArchive.query),
+                         [('perl', '', 3), ('python', '', 3),
+                          ('vim', '2', 3)])
+        self.assertEqual(sorted((r.pkg_name, r.pkg_epoch, r.count)
+                                for r in PackageRollup.query),
+                         [('perl', '', 3), ('python', '', 3),
+                          ('vim', '2', 3)])
+
+
+class TestCreateNewTables(ModelsTest):
+    def test_migrate(self):
+        engine = db_session.bind
+        db_session.commit()
+        PackageSketch.__table__.drop(engine)
+
+        self.assertEqual(migrate(engine), ['create_new_tables'])
+        self.assertEqual(migrate(engine), [])
+        self.assertEqual(PackageSketch.query.count(), 0)
+
+    def test_index_submissions_by_distro(self):
+        engine = db_session.bind
+        db_session.commit()
+        engine.execute('DROP INDEX ix_submissions_distro')
+
+        self.assertEqual(migrate(engine), ['index_submissions_by_distro'])
+        self.assertEqual(migrate(engine), [])
+
+
+class TestRecordDroppedMonths(ModelsTest):
+    def test_migrate(self):
+        engine = db_session.bind
+        python = Package('python', '2.7', '3', '', 'i586', 'http://repo.url')
+        for day in [date(2012, 5, 10), date(2012, 6, 10)]:
+            sub = Submission('openSUSE', '12.1', 'i586', 'v1', day)
+            db_session.add(sub)
+            db_session.flush()
+            db_session.add(SubmissionPackage(sub.sub_id, day, python, 'v'))
+        db_session.commit()
+        update_archives(workers=1)
+        drop_month(date(2012, 5, 1))
+        DroppedMonth.__table__.drop(engine)
+
+        self.assertEqual(migrate(engine), ['record_dropped_months'])
+        self.assertEqual(migrate(engine), [])
+        self.assertEqual([m.month for m in DroppedMonth.query],
+                         [date(2012, 5, 1)])
+
+
+class TestSeedArchiveWatermarks(ModelsTest):
+    def setUp(self):
+        super(TestSeedArchiveWatermarks, self).setUp()
+        self.engine = db_session.bind
+        self.python = Package('python', '2.7', '3', '', 'i586',
+                              'http://repo.url')
+        # submitted late, with the date of a month which isn't archived yet
+        self.add_submission(date(2012, 6, 10))
+        self.add_submission(date(2012, 5, 10))
+        update_archives(workers=1)
+        # the months were archived whole before there were watermarks
+        PackageArchive.query.filter_by(month=date(2012, 6, 1)).delete()
+        ArchiveWatermark.query.delete()
+        db_session.commit()
+
+    def add_submission(self, day):
+        sub = Submission('openSUSE', '12.1', 'i586', 'v1', day)
+        db_session.add(sub)
+        db_session.flush()
+        db_session.add(SubmissionPackage(sub.sub_id, day, self.python, 'v'))
+        db_session.commit()
+
+    def test_migrate(self):
+        self.assertEqual(migrate(self.engine), ['seed_archive_watermarks'])
+        self.assertEqual(migrate(self.engine), [])
+
+        self.assertEqual([(w.distro_name, w.sub_id)
+                          for w in ArchiveWatermark.query],
+                         [('openSUSE', 2)])
+        self.assertEqual([run.month for run in ArchiveRun.query],
+                         [date(2012, 6, 1)])
+
+    def test_update_archives_after_migrate(self):
+        migrate(self.engine)
+
+        self.assertEqual(update_archives(workers=1), 0)
+        self.assertEqual(PackageArchive.query.filter_by(
+            month=date(2012, 5, 1)).one().count, 1)
+        self.assertEqual(verify_archives(date(2012, 5, 1)), [])
+
+        list(rebuild_archives(None, workers=1))
+        self.assertEqual(verify_archives(date(2012, 6, 1)), [])
+        self.assertEqual(PackageArchive.query.filter_by(
+            month=date(2012, 6, 1)).one().count, 1)
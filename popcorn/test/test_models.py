@@ -31,8 +31,9 @@ import unittest
 from sqlalchemy import create_engine, event
 from sqlalchemy.exc import IntegrityError
 
-from popcorn.database import db_session, Base
-from popcorn.models import (Arch, Distro, System, Submission,
+from popcorn.cache import dimension_cache, package_cache
+from popcorn.database import db_session, sqlite_savepoints, Base
+from popcorn.models import (Arch, Distro, System, Submission, Package,
                             PackageStatus, SubmissionPackage, Vendor,
                             PackageArchive)
 
@@ -49,7 +50,10 @@ class ModelsTest(unittest.TestCase):
         # engine = create_engine('sqlite:///test.db')
 
         event.listen(engine, 'connect', _fk_pragma_on_connect)
+        sqlite_savepoints(engine)
         db_session.configure(bind=engine)
+        dimension_cache.clear()
+        package_cache.clear()
 
         Base.metadata.create_all(bind=engine)
 
@@ -100,19 +104,30 @@ class ModelsSimpleTests(ModelsTest):
         db_session.add(vendor)
         db_session.flush()
 
-        subp = SubmissionPackage(sub.sub_id, date.today(), 'python',
-                                 '2.7', '3', '', 'i586', 'repo1', 'voted')
+        pkg = Package('python', '2.7', '3', '', 'i586', 'repo1')
+        subp = SubmissionPackage(sub.sub_id, date.today(), pkg, 'v')
         db_session.add(subp)
         db_session.flush()
 
         self.assertEqual(SubmissionPackage.query.first(), subp)
+        self.assertEqual(subp.pkg_id, pkg.pkg_id)
+        self.assertEqual(subp.nvrea, 'python-2.7-3.i586')
+        self.assertEqual(subp.vendor_name, 'repo1')
+        self.assertEqual(subp.pkg_status, 'voted')
+
+    def test_package_unique_constraint(self):
+        db_session.add_all([
+            Package('python', '2.7', '3', '', 'i586', 'http://repo.url'),
+            Package('python', '2.7', '3', '', 'i586', 'http://repo.url')])
+
+        self.assertRaises(IntegrityError, db_session.commit)
 
     def test_submission_package_no_epoch(self):
         sub = Submission('openSUSE', '12.1', 'i586', 'POPCORN v0.0.1')
 
     def test_package_archives_foreign_key_constraint(self):
         vendor = Vendor('repo1')
-        archive = PackageArchive('firefox', 'v1', 'r1', 'i586', 'dummy',
+        archive = PackageArchive('firefox', 'v1', 'r1', '', 'i586', 'dummy',
                                  '12.1', 'vendor', 'voted', date.today(), 1)
         db_session.add(archive)
 
@@ -120,7 +135,7 @@ class ModelsSimpleTests(ModelsTest):
 
     def test_package_archive_creation(self):
         vendor = Vendor('repo1')
-        archive = PackageArchive('firefox', 'v1', 'r1', 'i586',
+        archive = PackageArchive('firefox', 'v1', 'r1', '', 'i586',
                                  'http://repo.url', 'voted', 'openSUSE',
                                  '12.1', date.today(), 1)
         db_session.add(vendor)
@@ -22,14 +22,22 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
 # OTHER DEALINGS IN THE SOFTWARE.
 
+from cStringIO import StringIO
 from datetime import date, timedelta
+import gzip
+import unittest
 
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm.exc import NoResultFound
 
-from popcorn.parse import (parse_text, _can_submit, EarlySubmissionError,
-                           FormatError)
-from popcorn.models import (Distro, System, Submission, SubmissionPackage,
-                            Vendor)
+from popcorn import parse
+from popcorn.cache import package_cache
+from popcorn.parse import (ingest_many, iter_lines, parse_lines, parse_text,
+                           _claim_system, _copy_escape, EarlySubmissionError,
+                           FormatError, SubmissionTooLargeError)
+from popcorn.models import (Distro, Package, System, Submission,
+                            SubmissionPackage, Vendor)
+from popcorn.sketches import add_systems
 
 from popcorn.test.test_models import ModelsTest
 
@@ -53,7 +61,8 @@ class TestParsePopcorn(ModelsTest):
         self.assertEqual(SubmissionPackage.query.count(), 2)
         self.assertEqual(Vendor.query.first().vendor_name, "http://repo.url")
 
-        p1 = SubmissionPackage.query.filter_by(pkg_name="python").one()
+        p1 = SubmissionPackage.query.join(Package).filter(
+            Package.pkg_name == "python").one()
         self.assertEqual(p1.pkg_name, "python")
         self.assertEqual(p1.pkg_version, "2.5")
         self.assertEqual(p1.pkg_release, "1.1")
@@ -61,6 +70,65 @@ class TestParsePopcorn(ModelsTest):
         self.assertEqual(p1.pkg_arch, "x86_64")
         self.assertEqual(p1.pkg_status, "voted")
 
+    def test_parse_new_vendors(self):
+        subm_text = ("POPCORN 0.1 openSUSE 12.1 i586 TEST_SYSID\n"
+                     "v python 2.5 1.1 None x86_64 http://new.repo/one\n"
+                     "r python-lint 1.1 1 None noarch http://new.repo/one\n"
+                     "o zsh 4.3 2 1 x86_64 openSUSE\n")
+        parse_text(subm_text)
+
+        self.assertEqual(sorted(v.vendor_url for v in Vendor.query.all()),
+                         ["http://new.repo/one", "http://repo.url",
+                          "openSUSE"])
+        self.assertEqual(SubmissionPackage.query.count(), 3)
+
+        p = SubmissionPackage.query.join(Package).filter(
+            Package.pkg_name == "zsh").one()
+        self.assertEqual(p.pkg_epoch, "1")
+        self.assertEqual(p.pkg_status, "old")
+        self.assertEqual(p.vendor_name, "openSUSE")
+
+    def test_parse_packages_are_interned(self):
+        parse_text("POPCORN 0.1 openSUSE 12.1 i586 SYSID_1\n"
+                   "v python 2.5 1.1 None x86_64 http://repo.url\n"
+                   "o zsh 4.3 2 1 x86_64 http://repo.url\n")
+        parse_text("POPCORN 0.1 openSUSE 12.1 i586 SYSID_2\n"
+                   "r python 2.5 1.1 None x86_64 http://repo.url\n"
+                   "v python 2.6 1.1 None x86_64 http://repo.url\n")
+
+        self.assertEqual(Package.query.count(), 3)
+        self.assertEqual(SubmissionPackage.query.count(), 4)
+        python = Package.query.filter_by(pkg_version="2.5").one()
+        self.assertEqual(sorted(p.status_code for p in
+                                SubmissionPackage.query.filter_by(
+                                    pkg_id=python.pkg_id)), ['r', 'v'])
+
+    def test_parse_unknown_status_error(self):
+        subm_text = ("POPCORN 0.1 openSUSE 12.1 i586 TEST_SYSID\n"
+                     "x python 2.5 1.1 None x86_64 http://repo.url\n")
+
+        self.assertRaises(FormatError, parse_text, subm_text)
+
+    def test_parse_short_package_line_error(self):
+        subm_text = ("POPCORN 0.1 openSUSE 12.1 i586 TEST_SYSID\n"
+                     "v python 2.5 1.1\n")
+
+        self.assertRaises(FormatError, parse_text, subm_text)
+
+    def test_parse_lines_in_batches(self):
+        lines = ["POPCORN 0.1 openSUSE 12.1 i586 TEST_SYSID",
+                 "v python 2.5 1.1 None x86_64 http://repo.url",
+                 "o python-lint 1.1 1 None noarch http://new.repo",
+                 "r zsh 4.3 2 None x86_64 http://repo.url"]
+        parse_lines(iter(lines), batch_size=2)
+
+        self.assertEqual(SubmissionPackage.query.count(), 3)
+        self.assertEqual(Vendor.query.count(), 2)
+
+    def test_parse_invalid_header_error(self):
+        self.assertRaises(FormatError, parse_text, "POPCORN 0.1 openSUSE\n")
+        self.assertRaises(FormatError, parse_text, "")
+
     def test_parse_unknown_arch_error(self):
         subm_text = ("POPCORN 0.1 Fedora 12 unknown-arch TEST_SUBID\n")
 
@@ -85,6 +153,19 @@ class TestParsePopcorn(ModelsTest):
 
         self.assertRaises(EarlySubmissionError, parse_text, sub)
 
+    def test_parse_early_submission_error_keeps_last_date(self):
+        last_date = date.today() - timedelta(days=2)
+        self.db_session.add(System("TEST_HWUUID", last_date))
+        self.db_session.commit()
+
+        sub = "POPCORN 0.1 openSUSE 11.4 x86_64 TEST_HWUUID\n"
+        try:
+            parse_text(sub)
+        except EarlySubmissionError, e:
+            self.assertEqual(e.last_date, last_date)
+        else:
+            self.fail("EarlySubmissionError not raised")
+
     def test_parse_distro_doesnt_exist_gets_created(self):
         self.assertRaises(NoResultFound,
                           Distro.query.filter_by(distro_name="new_Distro").one)
@@ -96,26 +177,188 @@ class TestParsePopcorn(ModelsTest):
         self.assertEqual("Distroxillix", distro.distro_name)
         self.assertEqual("1.0", distro.distro_version)
 
+    def test_rolled_back_vendor_isnt_cached(self):
+        self.db_session.commit()
+        lines = ["POPCORN 0.1 openSUSE 12.1 i586 SYS1",
+                 "v python 2.5 1.1 None x86_64 NewVendor",
+                 "v zsh 4.3 2 None x86_64 NewVendor",
+                 "x bad line"]
+        self.assertRaises(FormatError, parse_lines, lines, batch_size=1)
+        self.db_session.rollback()
+
+        parse_lines(["POPCORN 0.1 openSUSE 12.1 i586 SYS2",
+                     "v zsh 4.3 2 None x86_64 NewVendor"], batch_size=1)
+
+        self.assertEqual(Vendor.query.filter_by(vendor_name="NewVendor"
+                                                ).count(), 1)
+        self.assertEqual(SubmissionPackage.query.count(), 1)
+
+
+class TestIngestMany(ModelsTest):
+    submission = ("POPCORN 0.1 openSUSE 12.1 i586 %s\n"
+                  "v python 2.5 1.1 None x86_64 http://repo.url\n")
+
+    def test_groups(self):
+        submissions = [self.submission % i for i in range(5)]
+
+        groups = list(ingest_many(submissions, group_size=2))
+
+        self.assertEqual(groups, [[(0, None), (1, None)],
+                                  [(2, None), (3, None)],
+                                  [(4, None)]])
+        self.assertEqual(Submission.query.count(), 5)
+
+    def test_group_time(self):
+        submissions = [self.submission % i for i in range(3)]
+
+        groups = list(ingest_many(submissions, group_time=0))
+
+        self.assertEqual(len(groups), 3)
+
+    def test_rejected_submissions_are_isolated(self):
+        self.db_session.add(System("EARLY", date.today()))
+        self.db_session.commit()
+        submissions = [self.submission % "SYS1",
+                       self.submission % "EARLY",
+                       self.submission % "SYS2" + "x bad line\n",
+                       self.submission % "SYS3"]
 
-class TestCanSubmit(ModelsTest):
-    def test_can_submit(self):
+        (group,) = list(ingest_many(submissions))
+
+        self.assertEqual([i for i, error in group], [0, 1, 2, 3])
+        self.assertEqual(group[0][1], None)
+        self.assertTrue(isinstance(group[1][1], EarlySubmissionError))
+        self.assertTrue(isinstance(group[2][1], FormatError))
+        self.assertEqual(group[3][1], None)
+
+        self.db_session.rollback()
+        self.assertEqual(Submission.query.count(), 2)
+        self.assertEqual(SubmissionPackage.query.count(), 2)
+        self.assertEqual(sorted(s.sys_hwuuid for s in System.query),
+                         ["EARLY", "SYS1", "SYS3"])
+
+    def test_rejected_submission_vendor_isnt_cached(self):
+        rejected = ("POPCORN 0.1 openSUSE 12.1 i586 SYS1\n"
+                    "v python 2.5 1.1 None x86_64 NewVendor\n" * 2 +
+                    "x bad line\n")
+        submissions = [rejected,
+                       "POPCORN 0.1 openSUSE 12.1 i586 SYS2\n"
+                       "v zsh 4.3 2 None x86_64 NewVendor\n"]
+
+        groups = list(ingest_many(submissions, group_size=1, batch_size=1))
+
+        self.assertTrue(isinstance(groups[0][0][1], FormatError))
+        self.assertEqual(groups[1], [(1, None)])
+        self.assertEqual(SubmissionPackage.query.count(), 1)
+
+    def test_rejected_submission_keeps_the_group_cached(self):
+        self.db_session.add(Package('python', '2.5', '1.1', '', 'x86_64',
+                                    'http://repo.url'))
+        self.db_session.commit()
+        package_cache.clear()
+        submissions = [self.submission % "SYS1",
+                       self.submission % "SYS2" +
+                       "v zsh 4.3 2 None x86_64 http://repo.url\n"
+                       "x bad line\n"]
+
+        list(ingest_many(submissions, batch_size=1))
+
+        # python was found by the first submission, zsh was written by
+        # the one which was rolled back
+        self.assertEqual(package_cache.stats['entries'], 1)
+
+    def test_failed_group_commit_rolls_back(self):
+        self.db_session.commit()
+        submission = ("POPCORN 0.1 openSUSE 12.1 i586 SYS1\n"
+                      "v python 2.5 1.1 None x86_64 NewVendor\n"
+                      "v zsh 4.3 2 None x86_64 NewVendor\n")
+
+        def fail(sketches):
+            raise OperationalError('INSERT', {}, 'database is locked')
+        parse.add_systems = fail
+        try:
+            self.assertRaises(OperationalError, list,
+                              ingest_many([submission], batch_size=1))
+        finally:
+            parse.add_systems = add_systems
+
+        parse_lines(submission.splitlines(), batch_size=1)
+        self.assertEqual(Submission.query.count(), 1)
+        self.assertEqual(SubmissionPackage.query.count(), 2)
+
+
+class TestIterLines(unittest.TestCase):
+    text = ("POPCORN 0.1 openSUSE 12.1 i586 TEST_SYSID\r\n"
+            "v python 2.5 1.1 None x86_64 http://repo.url\n"
+            "o python-lint 1.1 1 None noarch http://repo.url")
+    lines = ["POPCORN 0.1 openSUSE 12.1 i586 TEST_SYSID",
+             "v python 2.5 1.1 None x86_64 http://repo.url",
+             "o python-lint 1.1 1 None noarch http://repo.url"]
+
+    def gzipped(self, text):
+        f = StringIO()
+        g = gzip.GzipFile(mode='wb', fileobj=f)
+        g.write(text)
+        g.close()
+        f.seek(0)
+        return f
+
+    def test_plaintext(self):
+        self.assertEqual(list(iter_lines(StringIO(self.text))), self.lines)
+
+    def test_gzip(self):
+        self.assertEqual(list(iter_lines(self.gzipped(self.text))),
+                         self.lines)
+
+    def test_too_large(self):
+        f = self.gzipped("v python 2.5 1.1 None x86_64 http://repo.url\n"
+                         * 100000)
+
+        lines = iter_lines(f, max_size=1024 * 1024)
+        self.assertRaises(SubmissionTooLargeError, list, lines)
+
+    def test_invalid_gzip(self):
+        f = StringIO('\x1f\x8b' + 'garbage' * 10)
+
+        self.assertRaises(FormatError, list, iter_lines(f))
+
+
+class TestCopyEscape(unittest.TestCase):
+    def test_copy_escape(self):
+        self.assertEqual(_copy_escape('a\tb\\c\nd'), 'a\\tb\\\\c\\nd')
+        self.assertEqual(_copy_escape(42), '42')
+        self.assertEqual(_copy_escape(date(2012, 5, 1)), '2012-05-01')
+
+
+class TestClaimSystem(ModelsTest):
+    def test_claim_system(self):
         # make last submission 400 days ago
         sys = System("TEST_HWUUID", date.today() - timedelta(days=400))
         self.db_session.add(sys)
         self.db_session.commit()
 
-        self.assertTrue(_can_submit(sys))
+        self.assertTrue(_claim_system("TEST_HWUUID", date.today()))
+        self.db_session.commit()
+        self.assertEqual(sys.last_sub_date, date.today())
 
-    def test_can_submit_no_last_submission(self):
-        sys = System.query.first()
+    def test_claim_new_system(self):
+        self.assertTrue(_claim_system("TEST_HWUUID", date.today()))
 
-        # No entry in UniqueSystem model if no last submission
-        self.assertIsNone(sys)
+        sys = System.query.one()
+        self.assertEqual(sys.sys_hwuuid, "TEST_HWUUID")
+        self.assertEqual(sys.last_sub_date, date.today())
 
-    def test_can_submit_too_early(self):
+    def test_claim_system_too_early(self):
         # 1 day ago should be too early for another submission
-        sys = System("TEST_HWUUID", date.today() - timedelta(days=1))
+        last_date = date.today() - timedelta(days=1)
+        sys = System("TEST_HWUUID", last_date)
         self.db_session.add(sys)
         self.db_session.commit()
 
-        self.assertFalse(_can_submit(sys))
+        self.assertFalse(_claim_system("TEST_HWUUID", date.today()))
+        self.db_session.commit()
+        self.assertEqual(sys.last_sub_date, last_date)
+
+    def test_claim_system_twice(self):
+        self.assertTrue(_claim_system("TEST_HWUUID", date.today()))
+        self.assertFalse(_claim_system("TEST_HWUUID", date.today()))
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from datetime import date
+import unittest
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from popcorn import partitions
+from popcorn.database import db_session
+from popcorn.models import (DistroSummary, Package, Submission,
+                            SubmissionPackage)
+from popcorn.partitions import drop_month, month_range, partition_name
+from popcorn.test.test_models import ModelsTest
+
+
+class TestMonths(unittest.TestCase):
+    def test_month_range(self):
+        self.assertEqual(month_range(date(2012, 6, 20)),
+                         (date(2012, 6, 1), date(2012, 7, 1)))
+        self.assertEqual(month_range(date(2012, 12, 31)),
+                         (date(2012, 12, 1), date(2013, 1, 1)))
+
+    def test_partition_name(self):
+        self.assertEqual(partition_name(date(2012, 6, 20)),
+                         'submission_packages_y2012m06')
+
+
+class TestPartitionedTable(unittest.TestCase):
+    def create_ddl(self, table):
+        return str(CreateTable(table).compile(dialect=postgresql.dialect()))
+
+    def tearDown(self):
+        partitions.PARTITION_BY_MONTH = False
+
+    def test_not_partitioned(self):
+        self.assertNotIn('PARTITION BY',
+                         self.create_ddl(SubmissionPackage.__table__))
+
+    def test_partitioned(self):
+        partitions.PARTITION_BY_MONTH = True
+
+        self.assertIn('PARTITION BY RANGE (sub_date)',
+                      self.create_ddl(SubmissionPackage.__table__))
+        self.assertNotIn('PARTITION BY',
+                         self.create_ddl(Submission.__table__))
+
+
+class TestDropMonth(ModelsTest):
+    def test_drop_month(self):
+        package = Package('python', '2.7', '3', '', 'i586', 'http://repo.url')
+        for day in [date(2012, 5, 31), date(2012, 6, 1), date(2012, 6, 30),
+                    date(2012, 7, 1)]:
+            sub = Submission('openSUSE', '12.1', 'i586', '0.1', day)
+            db_session.add(sub)
+            db_session.flush()
+            db_session.add(SubmissionPackage(sub.sub_id, day, package, 'v'))
+        db_session.add(DistroSummary('openSUSE', '12.1', 4, 4))
+        db_session.commit()
+
+        drop_month(date(2012, 6, 15))
+
+        self.assertEqual(sorted(p.sub_date for p in SubmissionPackage.query),
+                         [date(2012, 5, 31), date(2012, 7, 1)])
+        self.assertEqual(DistroSummary.query.one().packages, 2)
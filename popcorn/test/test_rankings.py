@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from datetime import date
+import json
+
+from popcorn import app, views
+from popcorn.database import db_session
+from popcorn.models import PackageArchive
+from popcorn.rankings import latest_month, rank_month, top_packages
+from popcorn.test.test_models import ModelsTest
+
+MONTH = date(2012, 6, 1)
+
+
+class TestRankings(ModelsTest):
+    def setUp(self):
+        super(TestRankings, self).setUp()
+        counts = [('python', '2.7', 'voted', 5),
+                  ('python', '2.6', 'old', 4),
+                  ('chrome', '20', 'voted', 7),
+                  ('zsh', '4.3', 'recent', 1),
+                  ('bash', '4.2', 'voted', 1)]
+        for name, version, status, count in counts:
+            db_session.add(PackageArchive(
+                name, version, '1', '', 'i586', 'http://repo.url', status,
+                'openSUSE', '12.1', MONTH, count))
+        db_session.add(PackageArchive(
+            'bash', '4.2', '1', '', 'i586', 'http://repo.url', 'voted',
+            'Fedora', '16', MONTH, 100))
+        db_session.commit()
+        rank_month(MONTH)
+
+    def ranking(self, ranking, **kwargs):
+        return [(p.rank, p.pkg_name, p.count) for p in
+                top_packages('openSUSE', '12.1', ranking, **kwargs)]
+
+    def test_by_inst(self):
+        self.assertEqual(self.ranking('inst'), [(1, 'python', 9),
+                                                (2, 'chrome', 7),
+                                                (3, 'bash', 1),
+                                                (4, 'zsh', 1)])
+
+    def test_by_status(self):
+        self.assertEqual(self.ranking('vote'), [(1, 'chrome', 7),
+                                                (2, 'python', 5),
+                                                (3, 'bash', 1)])
+        self.assertEqual(self.ranking('old'), [(1, 'python', 4)])
+        self.assertEqual(self.ranking('nofiles'), [])
+
+    def test_cursor(self):
+        self.assertEqual(self.ranking('inst', after=2, limit=1),
+                         [(3, 'bash', 1)])
+
+    def test_rank_again(self):
+        db_session.add(PackageArchive(
+            'zsh', '4.3', '1', '', 'i586', 'http://repo.url', 'voted',
+            'openSUSE', '12.1', MONTH, 20))
+        db_session.commit()
+
+        rank_month(MONTH)
+
+        self.assertEqual(self.ranking('inst')[0], (1, 'zsh', 21))
+        self.assertEqual(len(self.ranking('inst')), 4)
+
+    def test_latest_month(self):
+        self.assertEqual(latest_month('openSUSE', '12.1'), MONTH)
+        self.assertEqual(latest_month('openSUSE', '11.4'), None)
+
+    def test_view(self):
+        client = app.test_client()
+        views.PER_PAGE, per_page = 2, views.PER_PAGE
+        try:
+            response = client.get('/distro/openSUSE/12.1/top/inst',
+                                  headers=[('Accept', 'application/json')])
+            page = json.loads(response.data)
+            response = client.get('/distro/openSUSE/12.1/top/inst?'
+                                  'month=2012-06&after=%d' % page['next'],
+                                  headers=[('Accept', 'application/json')])
+            next_page = json.loads(response.data)
+        finally:
+            views.PER_PAGE = per_page
+
+        self.assertEqual(page['month'], '2012-06')
+        self.assertEqual([p['pkg_name'] for p in page['packages']],
+                         ['python', 'chrome'])
+        self.assertEqual([p['pkg_name'] for p in next_page['packages']],
+                         ['bash', 'zsh'])
+        self.assertEqual(page['next'], 2)
+        self.assertEqual(next_page['next'], None)
+
+    def test_view_unknown_ranking(self):
+        response = app.test_client().get('/distro/openSUSE/12.1/top/foo')
+        self.assertEqual(response.status_code, 404)
+
+    def test_view_html(self):
+        response = app.test_client().get('/distro/openSUSE/12.1/top/inst')
+        self.assertIn('<th>Submissions</th>', response.data)
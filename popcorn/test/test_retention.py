@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from datetime import date
+
+from popcorn import retention
+from popcorn.archive import update_archives
+from popcorn.database import db_session
+from popcorn.models import (DistroBreakdown, DistroSummary, Package,
+                            PackageArchive, Submission, SubmissionPackage)
+from popcorn.partitions import drop_month
+from popcorn.retention import purge, purge_before
+from popcorn.summaries import (check_summaries, rebuild_summaries,
+                               recount_breakdowns)
+from popcorn.test.test_models import ModelsTest
+
+TODAY = date(2012, 8, 15)
+
+
+class TestPurge(ModelsTest):
+    def setUp(self):
+        super(TestPurge, self).setUp()
+        self.package = Package('python', '2.7', '3', '', 'i586',
+                               'http://repo.url')
+        for day in [date(2012, 4, 2), date(2012, 5, 1), date(2012, 5, 20),
+                    date(2012, 6, 3), date(2012, 7, 9)]:
+            self.add_submission(day)
+        db_session.commit()
+        update_archives(workers=1)
+        rebuild_summaries()
+
+    def add_submission(self, day):
+        sub = Submission('openSUSE', '12.1', 'i586', '0.1', day)
+        db_session.add(sub)
+        db_session.flush()
+        db_session.add(SubmissionPackage(sub.sub_id, day, self.package, 'v'))
+
+    def test_purge_before(self):
+        self.assertEqual(purge_before(3, TODAY), date(2012, 6, 1))
+        self.add_submission(date(2012, 5, 25))
+        db_session.commit()
+        self.assertEqual(purge_before(3, TODAY), date(2012, 5, 1))
+
+    def test_purge(self):
+        deleted = purge(3, batch_size=2, pause=0, today=TODAY)
+
+        self.assertEqual(deleted, {'submissions': 3, 'packages': 3})
+        self.assertEqual(sorted(s.sub_date for s in Submission.query),
+                         [date(2012, 6, 3), date(2012, 7, 9)])
+        self.assertEqual(SubmissionPackage.query.count(), 2)
+        self.assertEqual(check_summaries(), [])
+        self.assertEqual(DistroSummary.query.one().submissions, 2)
+        self.assertEqual(dict(((b.distro_name, b.distro_version,
+                                b.breakdown, b.value), b.submissions)
+                              for b in DistroBreakdown.query
+                              if b.submissions), recount_breakdowns())
+        self.assertEqual(PackageArchive.query.count(), 4)
+
+    def test_purge_batches(self):
+        pauses = []
+        sleep, retention.time.sleep = retention.time.sleep, pauses.append
+        try:
+            purge(3, batch_size=1, pause=0.5, today=TODAY)
+        finally:
+            retention.time.sleep = sleep
+
+        self.assertEqual(pauses, [0.5, 0.5, 0.5])
+
+    def test_purge_stops_at_unarchived_months(self):
+        self.add_submission(date(2012, 5, 25))
+        db_session.commit()
+
+        self.assertEqual(purge(3, pause=0, today=TODAY),
+                         {'submissions': 1, 'packages': 1})
+        self.assertEqual(Submission.query.count(), 5)
+
+    def test_purge_dropped_month(self):
+        drop_month(date(2012, 4, 1))
+
+        self.assertEqual(purge(4, pause=0, today=TODAY),
+                         {'submissions': 1, 'packages': 0})
+        self.assertEqual(check_summaries(), [])
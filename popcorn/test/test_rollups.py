@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from datetime import date
+
+from popcorn import app, archive, rollups
+from popcorn.archive import rebuild_archives, update_archives
+from popcorn.configs import INSERT_BATCH_SIZE
+from popcorn.database import db_session
+from popcorn.migrate import fill_package_rollups
+from popcorn.models import (Package, PackageArchive, PackageRollup,
+                            Submission, SubmissionPackage)
+from popcorn.rollups import breakdown, rebuild_rollups
+
+from popcorn.test.test_models import ModelsTest
+
+
+class TestPackageRollups(ModelsTest):
+    def setUp(self):
+        super(TestPackageRollups, self).setUp()
+        self.today = date.today()
+        self.packages = [
+            Package('python', '2.7', '3', '', 'i586', 'http://repo.url'),
+            Package('python', '2.7', '3', '', 'x86_64', 'http://repo.url'),
+            Package('python', '2.7', '4', '', 'i586', 'http://repo.url'),
+            Package('python', '3.2', '1', '', 'i586', 'http://repo.url'),
+            Package('zsh', '4.3', '1', '', 'i586', 'http://repo.url')]
+        self.add_submission(('Fedora', '16'), self.packages, 'v')
+        self.add_submission(('openSUSE', '12.1'), self.packages[:2], 'o')
+        update_archives(workers=1)
+
+    def add_submission(self, distro, packages, status):
+        sub = Submission(distro[0], distro[1], 'i586', 'v1', self.today)
+        db_session.add(sub)
+        db_session.flush()
+        db_session.add_all([SubmissionPackage(sub.sub_id, self.today,
+                                              package, status)
+                            for package in packages])
+        db_session.commit()
+
+    def rollups(self):
+        return sorted((r.pkg_name, r.pkg_version, r.pkg_release, r.pkg_arch,
+                       r.pkg_status, r.count) for r in PackageRollup.query)
+
+    def test_breakdown_name(self):
+        self.assertEqual(breakdown('python'), (
+            {'voted': 4, 'old': 2},
+            [{'pkg_version': '2.7', 'voted': 3, 'old': 2},
+             {'pkg_version': '3.2', 'voted': 1}]))
+
+    def test_breakdown_release(self):
+        self.assertEqual(breakdown('python', '2.7', '3'), (
+            {'voted': 2, 'old': 2},
+            [{'pkg_arch': 'i586', 'pkg_epoch': '', 'voted': 1, 'old': 1},
+             {'pkg_arch': 'x86_64', 'pkg_epoch': '', 'voted': 1, 'old': 1}]))
+
+    def test_breakdown_epochs(self):
+        self.add_submission(('Fedora', '16'), [
+            Package('python', '2.7', '3', '1', 'i586', 'http://repo.url')],
+            'v')
+        update_archives(workers=1)
+
+        self.assertEqual(breakdown('python', '2.7', '3')[1], [
+            {'pkg_arch': 'i586', 'pkg_epoch': '', 'voted': 1, 'old': 1},
+            {'pkg_arch': 'i586', 'pkg_epoch': '1', 'voted': 1},
+            {'pkg_arch': 'x86_64', 'pkg_epoch': '', 'voted': 1, 'old': 1}])
+        page = app.test_client().get('/package/python/2.7/3').data
+        self.assertIn('href="/package/python/2.7/3/1/i586"', page)
+        self.assertIn('href="/package/python/2.7/3/i586"', page)
+
+    def test_breakdown_missing(self):
+        self.assertEqual(breakdown('python', '2.6'), ({}, []))
+
+    def test_rebuild_archives(self):
+        rollups = self.rollups()
+
+        list(rebuild_archives([self.today.replace(day=1)], workers=1))
+
+        self.assertEqual(self.rollups(), rollups)
+
+    def record_deltas(self, run):
+        """Return the sizes of the deltas given to add_counts by run()"""
+        sizes = []
+        add_counts = rollups.add_counts
+
+        def record(counts):
+            sizes.append(len([count for count in counts.values() if count]))
+            add_counts(counts)
+        rollups.add_counts = record
+        try:
+            run()
+        finally:
+            archive.INSERT_BATCH_SIZE = INSERT_BATCH_SIZE
+            rollups.add_counts = add_counts
+        return [size for size in sizes if size]
+
+    def test_added_once_per_chunk(self):
+        self.add_submission(('Fedora', '16'), self.packages, 'v')
+        archive.INSERT_BATCH_SIZE = 1
+
+        self.assertEqual(self.record_deltas(
+            lambda: update_archives(workers=1)), [5])
+        rollups_before = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), rollups_before)
+
+    def test_rebuilt_in_batches(self):
+        rollups_before = self.rollups()
+        archive.INSERT_BATCH_SIZE = 2
+
+        sizes = self.record_deltas(lambda: list(rebuild_archives(
+            [self.today.replace(day=1)], workers=1)))
+
+        self.assertTrue(len(sizes) > 1)
+        self.assertTrue(max(sizes) <= 3)
+        self.assertEqual(self.rollups(), rollups_before)
+
+    def test_rebuild_rollups(self):
+        rollups = self.rollups()
+        db_session.query(PackageRollup).filter_by(pkg_name='zsh').update(
+            {'count': 5})
+        db_session.commit()
+
+        rebuild_rollups()
+
+        self.assertEqual(self.rollups(), rollups)
+
+    def test_fill_package_rollups(self):
+        rollups = self.rollups()
+        engine = db_session.bind
+        db_session.commit()
+        PackageRollup.__table__.drop(engine)
+
+        with engine.begin() as connection:
+            self.assertTrue(fill_package_rollups(connection))
+        with engine.begin() as connection:
+            self.assertFalse(fill_package_rollups(connection))
+        self.assertEqual(self.rollups(), rollups)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from datetime import date
+
+from popcorn.database import db_session
+from popcorn.hyperloglog import position
+from popcorn.models import PackageSketch, System
+from popcorn.parse import ingest_many, parse_text
+from popcorn.sketches import add_systems, count_systems
+
+from popcorn.test.test_models import ModelsTest
+
+SUBMISSION = ("POPCORN 0.1 %s i586 %s\n"
+              "v python 2.5 1.1 None x86_64 http://repo.url\n"
+              "o python 2.6 1 None x86_64 http://repo.url\n"
+              "o zsh 4.3 1 None i586 http://repo.url\n")
+
+
+class TestSketches(ModelsTest):
+    def add(self, month, hw_uuids, distro=('openSUSE', '12.1'),
+            pkg_name='python'):
+        updates = {}
+        for hw_uuid in hw_uuids:
+            register, rank = position(hw_uuid)
+            registers = updates.setdefault(distro + (month, pkg_name), {})
+            registers[register] = max(rank, registers.get(register, 0))
+        add_systems(updates)
+        db_session.commit()
+
+    def test_ingestion(self):
+        today = date.today().replace(day=1)
+        parse_text(SUBMISSION % ('openSUSE 12.1', 'SYS1'))
+        parse_text(SUBMISSION % ('openSUSE 12.1', 'SYS2'))
+        parse_text(SUBMISSION % ('Fedora 16', 'SYS3'))
+
+        self.assertEqual(PackageSketch.query.count(), 4)
+        self.assertEqual(count_systems('python', [today]), 3)
+        self.assertEqual(count_systems('zsh', [today],
+                                       [('openSUSE', '12.1')]), 2)
+        self.assertEqual(count_systems('bash', [today]), 0)
+
+    def test_ingest_many_skips_rejected_submissions(self):
+        today = date.today().replace(day=1)
+        db_session.add(System('EARLY', date.today()))
+        db_session.commit()
+
+        list(ingest_many([SUBMISSION % ('openSUSE 12.1', 'SYS1'),
+                          SUBMISSION % ('openSUSE 12.1', 'EARLY'),
+                          SUBMISSION % ('Fedora 16', 'SYS2') + 'x bad\n']))
+
+        self.assertEqual(count_systems('python', [today]), 1)
+
+    def test_union_of_months_and_distros(self):
+        may, june = date(2012, 5, 1), date(2012, 6, 1)
+        self.add(may, ['SYS%d' % i for i in range(100)])
+        self.add(june, ['SYS%d' % i for i in range(50, 150)])
+        self.add(june, ['SYS%d' % i for i in range(150, 200)],
+                 distro=('Fedora', '16'))
+
+        # a few systems share a register, so the estimates are approximate
+        self.assertAlmostEqual(count_systems('python', [may]), 100,
+                               delta=10)
+        self.assertAlmostEqual(count_systems('python', [may, june],
+                                             [('openSUSE', '12.1')]), 150,
+                               delta=15)
+        self.assertAlmostEqual(count_systems('python', [may, june]), 200,
+                               delta=20)
+
+    def test_the_same_system_again(self):
+        self.add(date(2012, 5, 1), ['SYS1'])
+        registers = PackageSketch.query.one().registers
+
+        self.add(date(2012, 5, 1), ['SYS1'])
+
+        self.assertEqual(PackageSketch.query.one().registers, registers)
+        self.assertEqual(count_systems('python', [date(2012, 5, 1)]), 1)
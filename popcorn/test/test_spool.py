@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from cStringIO import StringIO
+from datetime import date
+import os
+import shutil
+import tempfile
+
+from popcorn import parse, spool
+from popcorn.models import Submission, SubmissionPackage, System
+from popcorn.parse import FormatError
+from popcorn.spool import drain, spool_submission
+from popcorn.test.test_models import ModelsTest
+
+SUBMISSION = ("POPCORN 0.1 openSUSE 12.1 i586 %s\n"
+              "v python 2.5 1.1 None x86_64 http://repo.url\n")
+
+
+class TestSpool(ModelsTest):
+    def setUp(self):
+        super(TestSpool, self).setUp()
+        self.spool_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(TestSpool, self).tearDown()
+        shutil.rmtree(self.spool_dir)
+
+    def listdir(self, subdir):
+        return os.listdir(os.path.join(self.spool_dir, subdir))
+
+    def test_spool_submission(self):
+        name = spool_submission(StringIO(SUBMISSION % 'SYS1'), self.spool_dir)
+
+        self.assertEqual(self.listdir('new'), [name])
+        self.assertEqual(self.listdir('tmp'), [])
+        with open(os.path.join(self.spool_dir, 'new', name)) as f:
+            self.assertEqual(f.read(), SUBMISSION % 'SYS1')
+
+    def test_spool_invalid_header(self):
+        self.assertRaises(FormatError, spool_submission,
+                          StringIO("bogus\n"), self.spool_dir)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+
+    def test_drain(self):
+        spool_submission(StringIO(SUBMISSION % 'SYS1'), self.spool_dir)
+        spool_submission(StringIO(SUBMISSION % 'SYS2'), self.spool_dir)
+
+        counts = drain(self.spool_dir, workers=1, retries=0)
+
+        self.assertEqual(counts, dict(recorded=2, rejected=0,
+                                      quarantined=0))
+        self.assertEqual(Submission.query.count(), 2)
+        self.assertEqual(SubmissionPackage.query.count(), 2)
+        self.assertEqual(self.listdir('new') + self.listdir('cur'), [])
+
+    def test_drain_rejected_submissions_dont_undo_others(self):
+        self.db_session.add(System('SYS1', date.today()))
+        self.db_session.commit()
+        spool_submission(StringIO(SUBMISSION % 'SYS1'), self.spool_dir)
+        spool_submission(StringIO(SUBMISSION % 'SYS2' + "x bad line\n"),
+                         self.spool_dir)
+        spool_submission(StringIO(SUBMISSION % 'SYS3'), self.spool_dir)
+
+        counts = drain(self.spool_dir, workers=1, retries=0)
+
+        self.assertEqual(counts, dict(recorded=1, rejected=1,
+                                      quarantined=1))
+        self.assertEqual(Submission.query.count(), 1)
+        self.assertEqual(System.query.count(), 2)
+
+    def test_drain_early_submission(self):
+        self.db_session.add(System('SYS1', date.today()))
+        self.db_session.commit()
+        spool_submission(StringIO(SUBMISSION % 'SYS1'), self.spool_dir)
+
+        counts = drain(self.spool_dir, workers=1, retries=0)
+
+        self.assertEqual(counts['rejected'], 1)
+        self.assertEqual(self.listdir('bad'), [])
+
+    def test_drain_quarantines_poison_files(self):
+        spool_submission(StringIO(SUBMISSION % 'SYS1' + "x bad line\n"),
+                         self.spool_dir)
+        name = spool_submission(StringIO(SUBMISSION % 'SYS2'),
+                                self.spool_dir)
+
+        def failing_record(lines, counters, batch_size=None):
+            raise RuntimeError("database is down")
+        record, parse._record_submission = (parse._record_submission,
+                                            failing_record)
+        try:
+            counts = drain(self.spool_dir, workers=1, retries=0)
+        finally:
+            parse._record_submission = record
+
+        self.assertEqual(counts['quarantined'], 2)
+        self.assertEqual(len(self.listdir('bad')), 2)
+        self.assertIn(name, self.listdir('bad'))
+
+    def test_drain_picks_up_unfinished_files(self):
+        name = spool_submission(StringIO(SUBMISSION % 'SYS1'),
+                                self.spool_dir)
+        os.rename(os.path.join(self.spool_dir, 'new', name),
+                  os.path.join(self.spool_dir, 'cur', name))
+
+        self.assertEqual(drain(self.spool_dir, workers=1)['recorded'], 1)
+
+    def test_drain_terminates_workers_on_errors(self):
+        spool_submission(StringIO(SUBMISSION % 'SYS1'), self.spool_dir)
+        calls = []
+
+        class Pool(object):
+            def __init__(self, workers, initializer):
+                pass
+
+            def imap_unordered(self, function, jobs):
+                raise KeyboardInterrupt
+
+            def __getattr__(self, name):
+                return lambda: calls.append(name)
+        pool, spool.multiprocessing.Pool = spool.multiprocessing.Pool, Pool
+        try:
+            self.assertRaises(KeyboardInterrupt, drain, self.spool_dir,
+                              workers=2)
+        finally:
+            spool.multiprocessing.Pool = pool
+
+        self.assertEqual(calls, ['terminate', 'join'])
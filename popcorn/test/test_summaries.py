@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from datetime import date, timedelta
+
+from popcorn.database import db_session
+from popcorn.migrate import fill_distro_breakdowns, fill_distro_summaries
+from popcorn.models import DistroBreakdown, DistroSummary, Submission, System
+from popcorn.parse import ingest_many, parse_text
+from popcorn.summaries import (add_breakdowns, add_counts, check_summaries,
+                               distro_breakdowns, rebuild_summaries,
+                               recount_breakdowns)
+
+from popcorn.test.test_models import ModelsTest
+
+
+class TestDistroSummaries(ModelsTest):
+    submission = ("POPCORN 0.1 %s i586 %s\n"
+                  "v python 2.5 1.1 None x86_64 http://repo.url\n"
+                  "o python-lint 1.1 1 None noarch http://repo.url\n")
+
+    def summaries(self):
+        return sorted((s.distro_name, s.distro_version, s.submissions,
+                       s.packages) for s in DistroSummary.query)
+
+    def test_parse_counts(self):
+        parse_text(self.submission % ('openSUSE 12.1', 'SYS1'))
+        parse_text(self.submission % ('openSUSE 12.1', 'SYS2'))
+        parse_text(self.submission % ('Fedora 16', 'SYS3'))
+
+        self.assertEqual(self.summaries(), [('Fedora', '16', 1, 2),
+                                            ('openSUSE', '12.1', 2, 4)])
+        self.assertEqual(check_summaries(), [])
+
+    def test_ingest_many_counts_committed_submissions(self):
+        db_session.add(System('EARLY', date.today()))
+        db_session.commit()
+        submissions = [self.submission % ('openSUSE 12.1', 'SYS1'),
+                       self.submission % ('openSUSE 12.1', 'EARLY'),
+                       self.submission % ('Fedora 16', 'SYS2') + 'x bad\n',
+                       self.submission % ('Fedora 16', 'SYS3')]
+
+        list(ingest_many(submissions, group_size=2))
+
+        self.assertEqual(self.summaries(), [('Fedora', '16', 1, 2),
+                                            ('openSUSE', '12.1', 1, 2)])
+        self.assertEqual(check_summaries(), [])
+
+    def test_check_and_rebuild(self):
+        parse_text(self.submission % ('openSUSE 12.1', 'SYS1'))
+        add_counts({('openSUSE', '12.1'): (1, -1),
+                    ('Fedora', '16'): (0, 3)})
+        db_session.commit()
+
+        self.assertEqual(check_summaries(),
+                         [(('Fedora', '16'), (0, 3), (0, 0)),
+                          (('openSUSE', '12.1'), (2, 1), (1, 2))])
+
+        rebuild_summaries()
+
+        self.assertEqual(self.summaries(), [('openSUSE', '12.1', 1, 2)])
+        self.assertEqual(check_summaries(), [])
+
+    def test_fill_distro_summaries(self):
+        parse_text(self.submission % ('openSUSE 12.1', 'SYS1'))
+        db_session.add(Submission('Fedora', '16', 'i586', '0.1'))
+        db_session.commit()
+        connection = db_session.connection()
+        DistroSummary.__table__.drop(connection)
+
+        self.assertTrue(fill_distro_summaries(connection))
+        self.assertFalse(fill_distro_summaries(connection))
+
+        self.assertEqual(self.summaries(), [('Fedora', '16', 1, 0),
+                                            ('openSUSE', '12.1', 1, 2)])
+
+
+class TestDistroBreakdowns(ModelsTest):
+    submission = TestDistroSummaries.submission
+
+    def breakdowns(self):
+        return dict(((b.distro_name, b.distro_version, b.breakdown,
+                      b.value), b.submissions)
+                    for b in DistroBreakdown.query if b.submissions)
+
+    def test_parse_counts(self):
+        parse_text(self.submission % ('openSUSE 12.1', 'SYS1'))
+        parse_text(self.submission.replace('0.1', '0.2').replace(
+            'i586', 'x86_64') % ('openSUSE 12.1', 'SYS2'))
+        parse_text(self.submission % ('Fedora 16', 'SYS3'))
+        week = date.today() - timedelta(days=date.today().weekday())
+
+        self.assertEqual(distro_breakdowns('openSUSE', '12.1'), {
+            'week': [[week.strftime('%Y-%m-%d'), 2]],
+            'arch': [['i586', 1], ['x86_64', 1]],
+            'popcorn_version': [['0.1', 1], ['0.2', 1]]})
+        self.assertEqual(self.breakdowns(), recount_breakdowns())
+
+    def test_latest_weeks(self):
+        add_breakdowns(dict((('Fedora', '16', 'week', '2012-%02d-01' % m), m)
+                            for m in range(1, 5)))
+
+        self.assertEqual(distro_breakdowns('Fedora', '16', weeks=2)['week'],
+                         [['2012-03-01', 3], ['2012-04-01', 4]])
+
+    def test_rebuild(self):
+        parse_text(self.submission % ('openSUSE 12.1', 'SYS1'))
+        add_breakdowns({('openSUSE', '12.1', 'arch', 'i586'): 2,
+                        ('Fedora', '16', 'arch', 'i586'): 1})
+        db_session.commit()
+
+        rebuild_summaries()
+
+        self.assertEqual(self.breakdowns(), recount_breakdowns())
+        self.assertEqual(len(self.breakdowns()), 3)
+
+    def test_fill_distro_breakdowns(self):
+        parse_text(self.submission % ('openSUSE 12.1', 'SYS1'))
+        db_session.add(Submission('Fedora', '16', 'i586', '0.1'))
+        db_session.commit()
+        breakdowns = self.breakdowns()
+        connection = db_session.connection()
+        DistroBreakdown.__table__.drop(connection)
+
+        self.assertTrue(fill_distro_breakdowns(connection))
+        self.assertFalse(fill_distro_breakdowns(connection))
+
+        self.assertEqual(self.breakdowns(), recount_breakdowns())
+        self.assertEqual(len(self.breakdowns()), len(breakdowns) + 3)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+from datetime import date
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from popcorn import app, trends, views
+from popcorn.database import db_session
+from popcorn.models import PackageArchive
+from popcorn.trends import TrendStore, compact, trend_store, update_trends
+from popcorn.test.test_models import ModelsTest
+
+MAY, JUNE, JULY = date(2012, 5, 1), date(2012, 6, 1), date(2012, 7, 1)
+
+
+@unittest.skipIf(trends.numpy is None, "NumPy isn't installed")
+class TestTrends(ModelsTest):
+    def setUp(self):
+        super(TestTrends, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.archive('python', 'voted', MAY, 3)
+        self.archive('python', 'old', MAY, 1)
+        self.archive('python', 'voted', MAY, 2, distro=('Fedora', '16'))
+        self.archive('zsh', 'recent', JUNE, 7)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        super(TestTrends, self).tearDown()
+
+    def archive(self, name, status, month, count,
+                distro=('openSUSE', '12.1')):
+        db_session.add(PackageArchive(name, '1', '1', '', 'i586',
+                                      'http://repo.url', status,
+                                      distro[0], distro[1], month, count))
+        db_session.commit()
+
+    def series(self, name, store=None):
+        store = store or TrendStore(self.path)
+        return store.months, store.series(name).tolist()
+
+    def test_update_trends(self):
+        self.assertEqual(update_trends(path=self.path), [MAY, JUNE])
+
+        self.assertEqual(self.series('python'),
+                         ([MAY, JUNE], [[5, 0, 1, 0], [0, 0, 0, 0]]))
+        self.assertEqual(self.series('zsh'),
+                         ([MAY, JUNE], [[0, 0, 0, 0], [0, 7, 0, 0]]))
+        self.assertEqual(TrendStore(self.path).series('bash'), None)
+
+    def test_update_trends_appends(self):
+        update_trends(path=self.path)
+        self.archive('zsh', 'recent', JULY, 2)
+        self.archive('python', 'voted', JUNE, 4)
+
+        # the last month stored is counted again
+        self.assertEqual(update_trends(path=self.path), [JUNE, JULY])
+
+        self.assertEqual(self.series('python')[1],
+                         [[5, 0, 1, 0], [4, 0, 0, 0], [0, 0, 0, 0]])
+        self.assertEqual(sorted(os.listdir(self.path)), [
+            'manifest.json', 'segment-2012-05-1.npy',
+            'segment-2012-06-3.npy', 'segment-2012-07-4.npy'])
+
+    def test_compact(self):
+        update_trends(path=self.path)
+        compact(self.path)
+        self.archive('zsh', 'recent', JULY, 2)
+        self.archive('bash', 'voted', JULY, 9)
+        update_trends([JULY], path=self.path)
+
+        self.assertEqual(self.series('zsh')[1],
+                         [[0, 0, 0, 0], [0, 7, 0, 0], [0, 2, 0, 0]])
+
+        compact(self.path)
+
+        store = TrendStore(self.path)
+        self.assertEqual(store.segments, [])
+        self.assertEqual(store.base.shape, (3, 3, 4))
+        self.assertEqual(self.series('zsh', store)[1],
+                         [[0, 0, 0, 0], [0, 7, 0, 0], [0, 2, 0, 0]])
+        self.assertEqual(self.series('bash', store)[1],
+                         [[0, 0, 0, 0], [0, 0, 0, 0], [9, 0, 0, 0]])
+        self.assertEqual(sorted(os.listdir(self.path)),
+                         ['base-5.npy', 'manifest.json'])
+
+    def test_trend_store_is_reopened(self):
+        update_trends([MAY], path=self.path)
+        store = trend_store(self.path)
+        self.assertTrue(trend_store(self.path) is store)
+
+        update_trends([JUNE], path=self.path)
+
+        self.assertEqual(trend_store(self.path).months, [MAY, JUNE])
+
+    def test_view(self):
+        update_trends(path=self.path)
+        trends_dir, views.TRENDS_DIR = views.TRENDS_DIR, self.path
+        try:
+            client = app.test_client()
+            response = client.get('/package/python/trend')
+            missing = client.get('/package/bash/trend')
+        finally:
+            views.TRENDS_DIR = trends_dir
+
+        self.assertEqual(json.loads(response.data), {
+            'months': ['2012-05', '2012-06'], 'voted': [5, 0],
+            'recent': [0, 0], 'old': [1, 0], 'nofiles': [0, 0]})
+        self.assertEqual(missing.status_code, 404)
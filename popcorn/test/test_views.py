@@ -24,16 +24,24 @@
 
 import json
 import os
+import re
 import gzip
 import cStringIO
+import shutil
+import tempfile
 import unittest
-from datetime import date
+from datetime import date, timedelta
 
 from sqlalchemy import create_engine, event
 
-from popcorn import app
-from popcorn.database import db_session, Base
-from popcorn.models import Arch, PackageStatus
+from popcorn import app, helpers, parse, views
+from popcorn.archive import update_archives
+from popcorn.cache import (ResponseCache, dimension_cache, package_cache,
+                           submission_limiter)
+from popcorn.database import db_session, sqlite_savepoints, Base
+from popcorn.models import (Arch, DistroSummary, Package, PackageStatus,
+                            Submission, SubmissionPackage)
+from popcorn.pagination import Pagination
 
 today = date.today()
 SYS_HWUUID = '33d08e56f1d2748bc7d056375042dcd1336a7635fdc1cec159bedacfce9c2c4f'
@@ -50,7 +58,11 @@ class TestViews(unittest.TestCase):
         engine = create_engine('sqlite:///:memory:')
 
         event.listen(engine, 'connect', _fk_pragma_on_connect)
+        sqlite_savepoints(engine)
         db_session.configure(bind=engine)
+        dimension_cache.clear()
+        package_cache.clear()
+        submission_limiter.clear()
 
         Base.metadata.create_all(bind=engine)
 
@@ -100,6 +112,31 @@ class TestViews(unittest.TestCase):
         rv = self.submit(compress=False, header=False)
         self.assertEqual('Submission received. Thanks!', rv.data)
 
+    def test_submission_too_early(self):
+        self.submit(compress=False, header=False)
+        rv = self.submit(compress=True, header=True)
+
+        self.assertIn('You need to wait', rv.data)
+
+    def test_submission_too_early_turned_away_from_cache(self):
+        submission_limiter.record(SYS_HWUUID, today)
+        rv = self.submit(compress=True, header=True)
+
+        self.assertIn('You need to wait', rv.data)
+        self.assertEqual(Submission.query.count(), 0)
+
+    def test_submission_spooled(self):
+        views.SPOOL_DIR = tempfile.mkdtemp()
+        try:
+            rv = self.submit(compress=True, header=True)
+            spooled = os.listdir(os.path.join(views.SPOOL_DIR, 'new'))
+        finally:
+            shutil.rmtree(views.SPOOL_DIR)
+            views.SPOOL_DIR = None
+
+        self.assertEqual(rv.status_code, 202)
+        self.assertEqual(len(spooled), 1)
+
     def test_index_json(self):
         self.submit(compress=False, header=False)
 
@@ -142,53 +179,121 @@ class TestViews(unittest.TestCase):
         response = self.app.get('/package/sed/4.2.1/5.1.2/x86_64',
                                 headers=[('Accept', 'application/json')])
         self.assertEqual(json.loads(response.data), {
-            "packages": [{
-                "sub_id": 1,
-                "sub_date": today.strftime("%Y-%m-%d"),
-                "pkg_status": "voted",
-                "pkg_name": "sed",
-                "pkg_version": "4.2.1",
-                "pkg_arch": "x86_64",
-                "vendor_name": "openSUSE",
-                "pkg_epoch": "",
-                "pkg_release": "5.1.2"
-                }],
             "voted": 1,
             "generic_package": {
-                "sub_id": 1,
-                "sub_date": today.strftime("%Y-%m-%d"),
-                "pkg_status": "voted",
                 "pkg_name": "sed",
                 "pkg_version": "4.2.1",
                 "pkg_arch": "x86_64",
-                "vendor_name": "openSUSE",
                 "pkg_epoch": "",
                 "pkg_release": "5.1.2"
                 }})
         self.assertEqual(response.headers['Content-Type'],
                          'application/json')
 
+    def test_package_breadcrumbs(self):
+        self.submit(compress=False, header=False)
+        update_archives(workers=1)
+        response = self.app.get('/package/sed',
+                                headers=[('Accept', 'application/json')])
+        html = self.app.get('/package/sed/4.2.1/5.1.2')
+        missing = self.app.get('/package/sed/4.2.2')
+
+        self.assertEqual(json.loads(response.data), {
+            "generic_package": {"pkg_name": "sed"},
+            "level": "pkg_version",
+            "children": [{"pkg_version": "4.2.1", "voted": 1}],
+            "voted": 1})
+        self.assertIn('href="/package/sed/4.2.1/5.1.2/x86_64"', html.data)
+        self.assertEqual(missing.status_code, 404)
+
+    def test_package_not_found(self):
+        response = self.app.get('/package/sed/4.2.1/5.1.2/x86_64',
+                                headers=[('Accept', 'application/json')])
+        self.assertEqual(response.status_code, 404)
+
+    def test_package_submissions(self):
+        self.submit(compress=False, header=False)
+        sed = Package.query.filter_by(pkg_name='sed').one()
+        for i in range(2):
+            sub = Submission('openSUSE', '12.1', 'x86_64', '0.1')
+            db_session.add(sub)
+            db_session.flush()
+            db_session.add(SubmissionPackage(sub.sub_id, sub.sub_date, sed,
+                                             'o'))
+        db_session.commit()
+        url = '/package/sed/4.2.1/5.1.2/x86_64/submissions'
+        views.SUBMISSIONS_PER_PAGE, per_page = 2, views.SUBMISSIONS_PER_PAGE
+        try:
+            first = json.loads(self.app.get(url).data)
+            second = json.loads(self.app.get(
+                url + '?after=' + first['next']).data)
+            bad_cursor = self.app.get(url + '?after=xyz')
+        finally:
+            views.SUBMISSIONS_PER_PAGE = per_page
+
+        self.assertEqual([p['sub_id'] for p in first['submissions']], [3, 2])
+        self.assertEqual(first['submissions'][0]['pkg_status'], 'old')
+        self.assertEqual([p['sub_id'] for p in second['submissions']], [1])
+        self.assertIsNone(second['next'])
+        self.assertEqual(bad_cursor.status_code, 404)
+
+    def test_package_systems(self):
+        self.submit(compress=False, header=False)
+
+        systems = json.loads(self.app.get('/package/sed/systems').data)
+        other = json.loads(self.app.get(
+            '/package/sed/systems?months=1&distro=Fedora&version=16').data)
+
+        self.assertEqual(systems['systems'], 1)
+        self.assertEqual(len(systems['months']), 3)
+        self.assertEqual(systems['months'][-1], today.strftime('%Y-%m'))
+        self.assertEqual(other['systems'], 0)
+        self.assertEqual(self.app.get(
+            '/package/sed/systems?months=0').status_code, 404)
+
     def test_distro_json(self):
         self.submit(compress=False, header=False)
         response = self.app.get('/distro/openSUSE/12.1',
                                 headers=[('Accept', 'application/json')])
+        week = today - timedelta(days=today.weekday())
         self.assertEqual(json.loads(response.data), {
             "distro": {
-                "submissions": [{
-                    "sub_id": 1,
-                    "sub_date": today.strftime("%Y-%m-%d"),
-                    "distro_version": "12.1",
-                    "popcorn_version": "0.1",
-                    "distro_name": "openSUSE",
-                    "arch": "x86_64"
-                    }],
                 "distro_name": "openSUSE",
-                "distro_version": "12.1"
-                }
+                "distro_version": "12.1",
+                "submissions": 1,
+                "packages": 1285
+                },
+            "week": [[week.strftime("%Y-%m-%d"), 1]],
+            "arch": [["x86_64", 1]],
+            "popcorn_version": [["0.1", 1]]
             })
         self.assertEqual(response.headers['Content-Type'],
                          'application/json')
 
+    def test_distro_submissions(self):
+        self.submit(compress=False, header=False)
+        for i in range(2):
+            db_session.add(Submission('openSUSE', '12.1', 'x86_64', '0.1'))
+        db_session.commit()
+        url = '/distro/openSUSE/12.1/submissions'
+        views.PER_PAGE, per_page = 2, views.PER_PAGE
+        try:
+            first = json.loads(self.app.get(
+                url, headers=[('Accept', 'application/json')]).data)
+            second = json.loads(self.app.get(
+                url + '?after=%d' % first['next'],
+                headers=[('Accept', 'application/json')]).data)
+            html = self.app.get(url)
+        finally:
+            views.PER_PAGE = per_page
+
+        self.assertEqual([s['sub_id'] for s in first['submissions']], [3, 2])
+        self.assertEqual([s['sub_id'] for s in second['submissions']], [1])
+        self.assertIsNone(second['next'])
+        self.assertIn('href="/submission/3/"', html.data)
+        self.assertEqual(self.app.get(
+            '/distro/Fedora/16/submissions').status_code, 404)
+
     def test_distro_doc_json(self):
         self.submit(compress=False, header=False)
         response = self.app.get('/distro',
@@ -199,6 +304,174 @@ class TestViews(unittest.TestCase):
         self.assertEqual(response.headers['Content-Type'],
                          'application/json')
 
+    def test_export_archives(self):
+        self.submit(compress=False, header=False)
+        update_archives(workers=1)
+        month = today.strftime('%Y-%m')
+        ndjson = self.app.get('/export/archives.ndjson?distro=openSUSE'
+                              '&month=%s&status=voted' % month)
+        csv = self.app.get('/export/archives.csv?arch=noarch',
+                           headers=[('Accept-Encoding', 'gzip')])
+        lines = gzip.GzipFile(fileobj=cStringIO.StringIO(csv.data)).read(
+            ).splitlines()
+
+        self.assertEqual(ndjson.mimetype, 'application/x-ndjson')
+        rows = [json.loads(line) for line in ndjson.data.splitlines()]
+        self.assertIn({"pkg_name": "sed", "pkg_version": "4.2.1",
+                       "pkg_release": "5.1.2", "pkg_epoch": "",
+                       "pkg_arch": "x86_64",
+                       "vendor_name": "openSUSE", "pkg_status": "voted",
+                       "distro_name": "openSUSE", "distro_version": "12.1",
+                       "month": month, "count": 1}, rows)
+        self.assertEqual(csv.headers['Content-Encoding'], 'gzip')
+        self.assertTrue(lines[0].startswith('pkg_name,'))
+        self.assertTrue(len(lines) > 1)
+        self.assertTrue(all(',noarch,' in line for line in lines[1:]))
+        self.assertEqual(self.app.get(
+            '/export/archives.xml').status_code, 404)
+        self.assertEqual(self.app.get(
+            '/export/archives.csv?month=june').status_code, 404)
+
+    def test_stats(self):
+        self.submit(compress=False, header=False)
+        response = self.app.get('/stats')
+
+        stats = json.loads(response.data)['dimension_cache']
+        self.assertEqual(sorted(stats), ['entries', 'hits', 'misses'])
+        self.assertTrue(stats['hits'] > 0)
+
+    def test_response_cache(self):
+        path = tempfile.mkdtemp()
+        cache = ResponseCache('memory', path)
+        old_cache = helpers.response_cache
+        helpers.response_cache = views.response_cache = cache
+        parse.response_cache = cache
+        try:
+            self.submit(compress=False, header=False)
+            first = self.app.get('/distro', headers=[
+                ('Accept', 'application/json')]).data
+            DistroSummary.query.one().submissions = 5
+            self.db_session.commit()
+            cached = self.app.get('/distro', headers=[
+                ('Accept', 'application/json')]).data
+            html = self.app.get('/distro')
+            stats = json.loads(self.app.get('/stats').data)
+            cache.bump_generation()
+            fresh = self.app.get('/distro', headers=[
+                ('Accept', 'application/json')]).data
+        finally:
+            helpers.response_cache = views.response_cache = old_cache
+            parse.response_cache = old_cache
+            shutil.rmtree(path)
+
+        self.assertEqual(cached, first)
+        self.assertIn('text/html', html.headers['Content-Type'])
+        self.assertEqual(stats['response_cache']['views'],
+                         {'distro_doc': {'hits': 1, 'misses': 2}})
+        # recording the submission started the first generation
+        self.assertEqual(stats['response_cache']['generation'], 1)
+        self.assertEqual(json.loads(fresh), {
+            "submissions_distrover": u'[["openSUSE 12.1", 5]]'})
+
+    def test_etag(self):
+        self.submit(compress=False, header=False)
+        response = self.app.get('/distro',
+                                headers=[('Accept', 'application/json')])
+        etag = response.headers['ETag']
+
+        unchanged = self.app.get('/distro', headers=[
+            ('Accept', 'application/json'), ('If-None-Match', etag)])
+
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.data, '')
+        self.assertEqual(unchanged.headers['ETag'], etag)
+
+    def test_conditional_get_from_generation(self):
+        path = tempfile.mkdtemp()
+        cache = ResponseCache(None, path)
+        old_cache = helpers.response_cache
+        helpers.response_cache = parse.response_cache = cache
+        submissions_distrover = views._submissions_distrover
+        try:
+            self.submit(compress=False, header=False)
+            json_response = self.app.get('/distro', headers=[
+                ('Accept', 'application/json')])
+            html_response = self.app.get('/distro')
+
+            # a current client doesn't make the view run
+            views._submissions_distrover = None
+            unchanged = self.app.get('/distro', headers=[
+                ('Accept', 'application/json'),
+                ('If-None-Match', json_response.headers['ETag'])])
+            views._submissions_distrover = submissions_distrover
+            not_modified = self.app.get('/distro', headers=[
+                ('If-Modified-Since',
+                 html_response.headers['Last-Modified'])])
+            # the validators of a URL don't hold for any other one
+            other_url = self.app.get('/vendor/nobody', headers=[
+                ('Accept', 'application/json'),
+                ('If-None-Match', json_response.headers['ETag'])])
+            missing = self.app.get('/vendor/nobody', headers=[
+                ('If-Modified-Since',
+                 html_response.headers['Last-Modified'])])
+
+            cache.bump_generation()
+            changed = self.app.get('/distro', headers=[
+                ('Accept', 'application/json'),
+                ('If-None-Match', json_response.headers['ETag'])])
+        finally:
+            views._submissions_distrover = submissions_distrover
+            helpers.response_cache = parse.response_cache = old_cache
+            shutil.rmtree(path)
+
+        self.assertTrue(json_response.headers['ETag'].startswith('W/"json-1-'))
+        self.assertTrue(html_response.headers['ETag'].startswith('W/"html-1-'))
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(other_url.status_code, 404)
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(changed.status_code, 200)
+        self.assertTrue(changed.headers['ETag'].startswith('W/"json-2-'))
+
+    def test_submission_pages(self):
+        self.submit(compress=False, header=False)
+        views.PER_PAGE, per_page = 500, views.PER_PAGE
+        try:
+            first = self.app.get('/submission/1/')
+            after = re.search(r'after=([\w-]+)', first.data).group(1)
+            second = self.app.get('/submission/1/?after=%s' % after)
+            before = re.search(r'before=([\w-]+)', second.data).group(1)
+            back = self.app.get('/submission/1/?before=%s' % before)
+            last = self.app.get('/submission/1/?after=%s' % re.search(
+                r'after=([\w-]+)', second.data).group(1))
+            page = self.app.get('/submission/1/?page=3')
+        finally:
+            views.PER_PAGE = per_page
+
+        def packages(response):
+            return re.findall(r'<a href="/package/[^"]+">([^<]+)</a>',
+                              response.data)
+        self.assertEqual(len(packages(first)), 500)
+        self.assertEqual(packages(back), packages(first))
+        self.assertEqual(len(packages(last)), 285)
+        self.assertEqual(len(set(packages(first) + packages(second) +
+                                 packages(last))), 1285)
+        self.assertIn('2 / 3', second.data)
+        self.assertIn('1 / 3', back.data)
+        self.assertIn('3 / 3', last.data)
+        self.assertNotIn('after=', last.data)
+        self.assertEqual(packages(page), packages(first))
+        self.assertIn('1 / 3', page.data)
+
+    def test_submission_bad_cursor(self):
+        self.submit(compress=False, header=False)
+        response = self.app.get('/submission/1/?after=nonsense')
+        self.assertEqual(response.status_code, 404)
+        # a bare sort key, without the number of its page
+        response = self.app.get('/submission/1/?after=%s' %
+                                Pagination.encode_cursor(['bash']))
+        self.assertEqual(response.status_code, 404)
+
     def test_404_json(self):
         response = self.app.get('/notFound',
                                 headers=[('Accept', 'application/json')])
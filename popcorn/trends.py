@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2026 The Popcorn contributors
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+
+"""A columnar store of the monthly counts of every package name, for the
+trend charts
+
+The counts are taken from package_archives and kept in TRENDS_DIR as NumPy
+arrays, which the web workers memory-map read-only:
+
+ - base-N.npy holds the compacted months, shaped [package, month, status],
+   so the whole series of a package is a single slice of it;
+ - segment-YYYY-MM-N.npy holds one month which was added since, shaped
+   [package, status];
+ - manifest.json lists the package names, whose position is their index in
+   the arrays, and the files of the arrays.
+
+update_trends writes a new segment for every month it counts and compact
+folds the segments into a new base. Files are never changed once written:
+a new manifest is renamed over the old one, so readers always see a
+consistent store.
+
+"""
+import json
+import os
+from datetime import date
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from sqlalchemy import func
+
+from popcorn.archive import months_between
+from popcorn.configs import TRENDS_DIR
+from popcorn.database import db_session
+from popcorn.models import PackageArchive
+
+# the order of the statuses in the arrays
+STATUSES = ['voted', 'recent', 'old', 'nofiles']
+MANIFEST = 'manifest.json'
+DTYPE = 'uint32'
+
+
+def update_trends(months=None, path=TRENDS_DIR):
+    """Write the counts of some months into the store as new segments
+
+    :months: the first days of the months, if None the last month in the
+             store (which may not have been complete) and every archived
+             month after it
+
+    Returns the months which were written.
+
+    """
+    _need_numpy()
+    manifest = _read_manifest(path)
+    if months is None:
+        months = _new_months(manifest)
+    ids = dict((name, i) for i, name in enumerate(manifest['names']))
+
+    replaced = []
+    for month in months:
+        rows = db_session.query(
+            PackageArchive.pkg_name, PackageArchive.pkg_status,
+            func.sum(PackageArchive.count)
+        ).filter(
+            PackageArchive.month == month
+        ).group_by(PackageArchive.pkg_name, PackageArchive.pkg_status).all()
+        for name, status, count in rows:
+            if name not in ids:
+                ids[name] = len(manifest['names'])
+                manifest['names'].append(name)
+
+        counts = numpy.zeros((len(manifest['names']), len(STATUSES)), DTYPE)
+        for name, status, count in rows:
+            if status in STATUSES:
+                counts[ids[name], STATUSES.index(status)] = count
+        key = month.strftime('%Y-%m')
+        if key in manifest['segments']:
+            replaced.append(manifest['segments'][key])
+        manifest['segments'][key] = _write_array(
+            path, manifest, 'segment-%s' % key, counts)
+    _write_manifest(path, manifest)
+    _remove(path, replaced)
+    return months
+
+
+def compact(path=TRENDS_DIR):
+    """Fold the segments of the store into a new base
+
+    The base is written through a memory map, so the store never has to
+    fit in memory. The files it replaces are removed.
+
+    """
+    _need_numpy()
+    if not _read_manifest(path)['segments']:
+        return
+    store = TrendStore(path)
+    manifest = store.manifest
+    months = months_between(store.months[0], store.months[-1])
+    filename = _next_name(manifest, 'base')
+    tmp_path = os.path.join(path, filename + '.tmp')
+    base = numpy.lib.format.open_memmap(
+        tmp_path, mode='w+', dtype=DTYPE,
+        shape=(len(manifest['names']), len(months), len(STATUSES)))
+    for month, counts in store.arrays():
+        start = months.index(month)
+        if len(counts.shape) == 3:
+            base[:counts.shape[0], start:start + counts.shape[1]] = counts
+        else:
+            base[:counts.shape[0], start] = counts
+    base.flush()
+    del base
+    _fsync(tmp_path)
+    os.rename(tmp_path, os.path.join(path, filename))
+
+    old_files = manifest['segments'].values()
+    if manifest['base']:
+        old_files.append(manifest['base']['file'])
+    manifest['base'] = {'file': filename,
+                        'first_month': months[0].strftime('%Y-%m'),
+                        'months': len(months)}
+    manifest['segments'] = {}
+    _write_manifest(path, manifest)
+    _remove(path, old_files)
+
+
+class TrendStore(object):
+    """The arrays of the store, memory-mapped read-only
+
+    :path: the directory of the store
+
+    A TrendStore keeps reading the files listed by the manifest it was
+    opened with; reopen it to see the months written since.
+
+    """
+    def __init__(self, path=TRENDS_DIR):
+        _need_numpy()
+        self.path = path
+        # every new manifest is a new file
+        self.inode = _manifest_inode(path)
+        self.manifest = _read_manifest(path)
+        self.ids = dict((name, i)
+                        for i, name in enumerate(self.manifest['names']))
+        self.base = None
+        months = set()
+        if self.manifest['base']:
+            base = self.manifest['base']
+            self.base = self._open(base['file'])
+            self.first_month = _month(base['first_month'])
+            months.update(months_between(
+                self.first_month,
+                _add_months(self.first_month, base['months'] - 1)))
+        self.segments = [(_month(key), self._open(filename))
+                         for key, filename
+                         in sorted(self.manifest['segments'].iteritems())]
+        months.update(month for month, segment in self.segments)
+        self.months = sorted(months)
+
+    def _open(self, filename):
+        return numpy.load(os.path.join(self.path, filename), mmap_mode='r')
+
+    def arrays(self):
+        """Yield (first month, array) for the base and every segment"""
+        if self.base is not None:
+            yield self.first_month, self.base
+        for month, segment in self.segments:
+            yield month, segment
+
+    def series(self, name):
+        """Return the counts of a package name as an array shaped [month,
+        status], the months being self.months, or None if it's unknown
+
+        """
+        i = self.ids.get(name)
+        if i is None:
+            return None
+        series = numpy.zeros((len(self.months), len(STATUSES)), DTYPE)
+        index = dict((month, j) for j, month in enumerate(self.months))
+        if self.base is not None:
+            start = index[self.first_month]
+            months = self.base.shape[1]
+            if i < self.base.shape[0]:
+                series[start:start + months] = self.base[i]
+        for month, segment in self.segments:
+            if i < segment.shape[0]:
+                series[index[month]] = segment[i]
+        return series
+
+
+_store = None
+
+
+def trend_store(path=TRENDS_DIR):
+    """Return the TrendStore of this worker, reopened if the store changed
+
+    Returns None if there is no store.
+
+    """
+    global _store
+    if numpy is None or not path:
+        return None
+    inode = _manifest_inode(path)
+    if inode is None:
+        return None
+    if _store is None or _store.path != path or _store.inode != inode:
+        try:
+            _store = TrendStore(path)
+        except IOError:
+            # a compaction removed the files of the manifest we read
+            _store = TrendStore(path)
+    return _store
+
+
+def _new_months(manifest):
+    """The months update_trends counts when it isn't told which"""
+    last = db_session.query(func.max(PackageArchive.month)).scalar()
+    if last is None:
+        return []
+    stored = manifest['segments'].keys()
+    if manifest['base']:
+        base = manifest['base']
+        stored.append(_add_months(_month(base['first_month']),
+                                  base['months'] - 1).strftime('%Y-%m'))
+    if stored:
+        first = _month(max(stored))
+    else:
+        first = db_session.query(func.min(PackageArchive.month)).scalar()
+    return months_between(first, last)
+
+
+def _manifest_inode(path):
+    try:
+        return os.stat(os.path.join(path, MANIFEST)).st_ino
+    except OSError:
+        return None
+
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            return json.load(f)
+    except IOError:
+        return {'names': [], 'base': None, 'segments': {}, 'generation': 0}
+
+
+def _write_manifest(path, manifest):
+    """Replace the manifest in one rename"""
+    tmp_path = os.path.join(path, MANIFEST + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_path, os.path.join(path, MANIFEST))
+
+
+def _write_array(path, manifest, prefix, array):
+    """Write an array to a new file of the store, returns its name"""
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    filename = _next_name(manifest, prefix)
+    tmp_path = os.path.join(path, filename + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        numpy.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_path, os.path.join(path, filename))
+    return filename
+
+
+def _next_name(manifest, prefix):
+    """Return a file name which was never used by the store"""
+    manifest['generation'] += 1
+    return '%s-%d.npy' % (prefix, manifest['generation'])
+
+
+def _remove(path, filenames):
+    """Remove files which the manifest doesn't list anymore
+
+    Workers which still have them mapped keep reading them until they
+    reopen the store.
+
+    """
+    for filename in filenames:
+        os.remove(os.path.join(path, filename))
+
+
+def _fsync(path):
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def _month(key):
+    year, month = key.split('-')
+    return date(int(year), int(month), 1)
+
+
+def _add_months(month, count):
+    total = month.year * 12 + month.month - 1 + count
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _need_numpy():
+    if numpy is None:
+        raise RuntimeError("the trends store needs NumPy")
@@ -23,43 +23,62 @@
 # OTHER DEALINGS IN THE SOFTWARE.
 
 import json
-import gzip
+from datetime import date, datetime
+from itertools import chain
 
-from flask import abort, render_template, request, redirect, url_for
-from sqlalchemy import func
+from flask import (Response, abort, jsonify, render_template, request,
+                   redirect, stream_with_context, url_for)
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm.exc import NoResultFound
 
 from popcorn import app
+from popcorn.archive import last_month, months_between
+from popcorn.cache import (dimension_cache, package_cache, response_cache,
+                           submission_limiter)
+from popcorn.configs import SPOOL_DIR, SYSTEMS_MONTHS, TRENDS_DIR
 from popcorn.database import db_session
-from popcorn.parse import FormatError, EarlySubmissionError, parse_text
-from popcorn.models import (Distro, SubmissionPackage, Submission,
-                            System, Vendor)
+from popcorn.export import (FILTERS as EXPORT_FILTERS,
+                            FORMATS as EXPORT_FORMATS, archive_rows,
+                            gzip_chunks)
+from popcorn.parse import (FormatError, EarlySubmissionError,
+                           SubmissionTooLargeError, iter_lines, parse_header,
+                           parse_lines)
+from popcorn.models import (Distro, DistroSummary, Package, PackageStatus,
+                            SubmissionPackage, Submission, System, Vendor)
 from popcorn.pagination import Pagination
+from popcorn.rankings import RANKINGS, top_packages
+from popcorn.rollups import LEVELS, breakdown
+from popcorn.sketches import count_systems
+from popcorn.spool import spool_submission
+from popcorn.summaries import COUNTERS, distro_breakdowns
+from popcorn.trends import STATUSES, trend_store
 from popcorn.helpers import render
 
 PER_PAGE = 50
+# how many submissions of a package are listed at a time
+SUBMISSIONS_PER_PAGE = 1000
+# the order of the packages of a submission page, which its cursors follow
+PACKAGE_ORDER = [Package.pkg_name, Package.pkg_version, Package.pkg_release,
+                 Package.pkg_epoch, Package.pkg_arch, Package.vendor_name]
+# the most months the systems of a package can be counted over
+MAX_SYSTEMS_MONTHS = 120
 
 
 @app.route('/', methods=['GET'])
 @render(template='index.html')
 def index():
-    # packages by distro
-    # XXX think about moving this to the model
+    # packages by distro, read from the counters kept by the ingestion
     distro_packages = db_session.query(
-        Distro.distro_name, func.count(SubmissionPackage.pkg_name)
-    ).select_from(
-        SubmissionPackage
-    ).join(
-        Submission
-    ).join(
-        Distro
-    ).group_by(Distro.distro_name).all()
+        DistroSummary.distro_name, func.sum(DistroSummary.packages)
+    ).group_by(DistroSummary.distro_name).order_by(
+        DistroSummary.distro_name).all()
+    # PostgreSQL sums up to a Decimal, which json can't serialize
+    distro_packages = [(name, int(count)) for name, count in distro_packages
+                       if count]
 
     # number of submissions per distribution
-    submissions_distrover = db_session.query(
-        Submission.distro_name + ' ' + Submission.distro_version,
-        func.count(Submission.sub_id)
-        ).group_by(Submission.distro_name, Submission.distro_version).all()
+    submissions_distrover = _submissions_distrover()
 
     # transform the list of tuples returned by SQLA into a nested JS array
     distro_packages = json.dumps(distro_packages)
@@ -72,18 +91,31 @@ def index():
 @app.route('/', methods=['POST'])
 def receive_submission():
     f = request.files['popcorn']
-    if request.headers.get('Content-Encoding') == 'gzip':
-        with gzip.GzipFile(fileobj=f, mode='rb') as g:
-            try:
-                submission = g.read()
-            except IOError:
-                submission = f.read()
-    else:
-        submission = f.read()
+    # gzipped uploads are recognized by their contents, so the
+    # Content-Encoding header isn't needed
+    lines = iter_lines(f)
+    hw_uuid = None
     try:
-        parse_text(submission)
-    except (EarlySubmissionError, FormatError), e:
+        header = next(lines, '')
+        hw_uuid = parse_header(header)[4]
+        # Systems which submitted recently are turned away before the
+        # rest of their upload is even read
+        last_date = submission_limiter.too_early(hw_uuid)
+        if last_date:
+            raise EarlySubmissionError(last_date)
+
+        if SPOOL_DIR:
+            f.seek(0)
+            spool_submission(f, SPOOL_DIR)
+            return 'Submission received. Thanks!', 202
+        parse_lines(chain([header], lines))
+    except EarlySubmissionError, e:
+        submission_limiter.record(hw_uuid, e.last_date)
         return str(e)
+    except (FormatError, SubmissionTooLargeError), e:
+        return str(e)
+
+    submission_limiter.record(hw_uuid, date.today())
     return 'Submission received. Thanks!'
 
 
@@ -104,23 +136,61 @@ def vendor(vendor_name):
 
 @app.route('/submission/<subid>/')
 def submission(subid):
-    """Return a Submission object"""
+    """Return a Submission object
+
+    Its packages are shown a page at a time, sorted by PACKAGE_ORDER. The
+    next page starts after the cursor given as ?after=, the previous one
+    ends before the one given as ?before=. The cursors carry the number of
+    their page, without one this is the first page.
+
+    """
     try:
         sub = Submission.query.filter_by(sub_id=subid).one()
     except NoResultFound:
         abort(404)
-    page = request.args.get('page', 0, type=int)
-    packages = sub.submission_packages
-    count = len(packages)
+    page = 1
+    after = before = None
+    try:
+        if 'after' in request.args:
+            page, after = Pagination.decode_page_cursor(request.args['after'])
+        elif 'before' in request.args:
+            page, before = Pagination.decode_page_cursor(
+                request.args['before'])
+    except ValueError:
+        abort(404)
+
+    # sub_date lets PostgreSQL read a single partition
+    criteria = [SubmissionPackage.sub_id == sub.sub_id,
+                SubmissionPackage.sub_date == sub.sub_date]
+    count = db_session.query(func.count(SubmissionPackage.pkg_id)).filter(
+        *criteria).scalar()
+    query = SubmissionPackage.query.join(Package).options(
+        contains_eager(SubmissionPackage.package)).filter(*criteria)
+    if before is not None:
+        packages = query.filter(
+            tuple_(*PACKAGE_ORDER) < tuple_(*before)
+        ).order_by(*[c.desc() for c in PACKAGE_ORDER]).limit(PER_PAGE).all()
+        packages.reverse()
+    else:
+        if after is not None:
+            query = query.filter(tuple_(*PACKAGE_ORDER) > tuple_(*after))
+        packages = query.order_by(*PACKAGE_ORDER).limit(PER_PAGE).all()
+
     pagination = Pagination(page, PER_PAGE, count)
-    if page:
-        packages = packages[pagination.start:pagination.end + 1]
-        if page > pagination.pages:
-            abort(404)
+    if page > max(pagination.pages, 1):
+        abort(404)
+    if packages:
+        pagination.first = _package_key(packages[0])
+        pagination.last = _package_key(packages[-1])
     return render_template('submission.html', submission=sub,
                            pagination=pagination, packages=packages)
 
 
+def _package_key(submission_package):
+    """Return the values of PACKAGE_ORDER of a SubmissionPackage"""
+    return [getattr(submission_package.package, c.key) for c in PACKAGE_ORDER]
+
+
 @app.route('/system/<hwuuid>')
 @render(template='system.html')
 def system(hwuuid):
@@ -132,49 +202,237 @@ def system(hwuuid):
     return dict(system=system.serialize)
 
 
-# TODO this could be breadcrumbs, where you can put in as many arguments
-# as you want and get as much information back, i.e. put in name,
-# release and version and get all the arches, epochs, statuses with
-# links
+@app.route('/package/<name>')
+@app.route('/package/<name>/<version>')
+@app.route('/package/<name>/<version>/<release>')
+@render(template='breadcrumbs.html')
+def package_breadcrumbs(name, version=None, release=None):
+    """Return how many times a package name, version or release was
+    archived by status, and the same for every version, release or arch
+    under it
+
+    The counts are read from package_rollups, so they only include the
+    submissions which have been archived.
+
+    """
+    prefix = [value for value in (name, version, release) if value is not None]
+    totals, children = breakdown(*prefix)
+    if not children:
+        abort(404)
+    return dict(generic_package=dict(zip(LEVELS, prefix)),
+                level=LEVELS[len(prefix)], children=children, **totals)
+
+
 @app.route('/package/<name>/<version>/<release>/<arch>')
 @app.route('/package/<name>/<version>/<release>/<epoch>/<arch>')
 @render(template='packages.html')
 def package(name, version, release, arch, epoch=''):
-    """Return a Package object"""
+    """Return a Package and how many submissions listed it by status
 
-    pkgs = SubmissionPackage.query.filter_by(
-        pkg_name=name, pkg_version=version, pkg_release=release,
-        pkg_epoch=epoch, pkg_arch=arch).all()
-    if not pkgs:
-        abort(404)
+    The submissions themselves are listed by package_submissions.
 
+    """
     pkg_statuses = db_session.query(
-        SubmissionPackage.pkg_status,
-        func.count(SubmissionPackage.pkg_status)
-    ).filter_by(
-        pkg_name=name, pkg_version=version, pkg_release=release,
-        pkg_epoch=epoch, pkg_arch=arch
+        PackageStatus.pkg_status,
+        func.count(SubmissionPackage.status_code)
+    ).select_from(
+        SubmissionPackage
+    ).join(
+        Package
+    ).join(
+        PackageStatus
+    ).filter(
+        *_package_criteria(name, version, release, epoch, arch)
     ).group_by(
-        SubmissionPackage.pkg_status).all()
-    statuses = dict()
-    for k, v in pkg_statuses:
-        statuses[k] = v
-    print statuses
+        PackageStatus.pkg_status).all()
+    if not pkg_statuses:
+        abort(404)
+
+    generic_package = dict(pkg_name=name, pkg_version=version,
+                           pkg_release=release, pkg_epoch=epoch,
+                           pkg_arch=arch)
+    return dict(generic_package=generic_package, **dict(pkg_statuses))
+
+
+@app.route('/package/<name>/<version>/<release>/<arch>/submissions')
+@app.route('/package/<name>/<version>/<release>/<epoch>/<arch>/submissions')
+def package_submissions(name, version, release, arch, epoch=''):
+    """Return a page of the submissions which listed a Package, newest first
+
+    The page is written out as JSON while it is read from the database.
+    The next one is fetched with the `next` cursor of the previous one as
+    ?after=.
+
+    """
+    after = None
+    if 'after' in request.args:
+        try:
+            after = Pagination.decode_cursor(request.args['after'])
+            after[0] = datetime.strptime(after[0], '%Y-%m-%d').date()
+        except (ValueError, IndexError, TypeError):
+            abort(404)
+
+    order = [SubmissionPackage.sub_date, SubmissionPackage.sub_id,
+             SubmissionPackage.pkg_id]
+    query = SubmissionPackage.query.join(Package).options(
+        contains_eager(SubmissionPackage.package)).filter(
+        *_package_criteria(name, version, release, epoch, arch))
+    if after is not None:
+        query = query.filter(tuple_(*order) < tuple_(*after))
+    # one more than a page, to know whether there is a next one
+    query = query.order_by(*[c.desc() for c in order]).limit(
+        SUBMISSIONS_PER_PAGE + 1).yield_per(PER_PAGE)
+
+    def generate():
+        yield '{"submissions": ['
+        next_after = last = None
+        for i, pkg in enumerate(query):
+            if i == SUBMISSIONS_PER_PAGE:
+                next_after = Pagination.encode_cursor([
+                    last.sub_date.strftime('%Y-%m-%d'), last.sub_id,
+                    last.pkg_id])
+                break
+            if last is not None:
+                yield ', '
+            yield json.dumps(pkg.serialize)
+            last = pkg
+        yield '], "next": %s}' % json.dumps(next_after)
+    return Response(stream_with_context(generate()),
+                    mimetype='application/json')
+
+
+def _package_criteria(name, version, release, epoch, arch):
+    """Return the filters which select the Packages of a NEVRA"""
+    return [Package.pkg_name == name, Package.pkg_version == version,
+            Package.pkg_release == release, Package.pkg_epoch == epoch,
+            Package.pkg_arch == arch]
+
+
+@app.route('/package/<name>/trend')
+def package_trend(name):
+    """Return the monthly counts of a package name for every status"""
+    store = trend_store(TRENDS_DIR)
+    if store is None:
+        abort(404)
+    series = store.series(name)
+    if series is None:
+        abort(404)
+    trend = dict((status, series[:, i].tolist())
+                 for i, status in enumerate(STATUSES))
+    return jsonify(months=[m.strftime('%Y-%m') for m in store.months],
+                   **trend)
+
+
+@app.route('/package/<name>/systems')
+def package_systems(name):
+    """Estimate how many distinct systems listed a package name
+
+    ?months= is how many months, the current one included, are counted
+    (SYSTEMS_MONTHS by default); ?distro= and ?version= count only the
+    systems of that distro.
+
+    """
+    try:
+        count = int(request.args.get('months', SYSTEMS_MONTHS))
+    except ValueError:
+        abort(404)
+    if not 1 <= count <= MAX_SYSTEMS_MONTHS:
+        abort(404)
+    today = date.today()
+    first = today.replace(day=1)
+    for i in xrange(count - 1):
+        first = last_month(first)
+    months = months_between(first, today)
 
-    return dict(generic_package=pkgs[0].serialize,
-                packages=[i.serialize for i in pkgs], **statuses)
+    distros = None
+    if 'distro' in request.args:
+        distros = [(request.args['distro'], request.args.get('version'))]
+    return jsonify(name=name, months=[m.strftime('%Y-%m') for m in months],
+                   systems=count_systems(name, months, distros))
 
 
 @app.route('/distro/<name>/<version>')
 @render(template='distro.html')
 def distro(name, version):
-    """Return a Distro object"""
+    """Return a Distro object with the counters of its submissions
+
+    They are read from distro_summaries and distro_breakdowns; the
+    submissions themselves are listed by distro_submissions.
+
+    """
     try:
         distro = Distro.query.filter_by(distro_name=name,
                                         distro_version=version).one()
     except NoResultFound:
         abort(404)
-    return dict(distro=distro.serialize)
+    summary = DistroSummary.query.get((name, version))
+    counts = dict((c, getattr(summary, c) if summary else 0)
+                  for c in COUNTERS)
+    return dict(distro=dict(distro.serialize, **counts),
+                **distro_breakdowns(name, version))
+
+
+@app.route('/distro/<name>/<version>/submissions')
+@render(template='distro_submissions.html')
+def distro_submissions(name, version):
+    """Return a page of the submissions of a Distro, newest first
+
+    The next page is fetched with the `next` cursor of the previous one as
+    ?after=.
+
+    """
+    after = request.args.get('after', type=int)
+    query = Submission.query.filter_by(distro_name=name,
+                                       distro_version=version)
+    if after is not None:
+        query = query.filter(Submission.sub_id < after)
+    # one more than a page, to know whether there is a next one
+    submissions = query.order_by(Submission.sub_id.desc()).limit(
+        PER_PAGE + 1).all()
+    if not submissions and after is None:
+        abort(404)
+    next_after = None
+    if len(submissions) > PER_PAGE:
+        submissions = submissions[:PER_PAGE]
+        next_after = submissions[-1].sub_id
+    return dict(distro_name=name, distro_version=version, next=next_after,
+                submissions=[sub._flat_attrs for sub in submissions])
+
+
+@app.route('/distro/<name>/<version>/top/<ranking>')
+@render(template='rankings.html')
+def rankings(name, version, ranking):
+    """Return a page of the packages of a Distro ranked by popularity
+
+    :ranking: inst, vote, old, recent or nofiles
+
+    The month is given as ?month=YYYY-MM (default: the latest one ranked)
+    and the next page is fetched with the `next` cursor of the previous
+    one as ?after=.
+
+    """
+    if ranking not in dict(RANKINGS):
+        abort(404)
+    month = request.args.get('month')
+    if month:
+        try:
+            month = datetime.strptime(month, '%Y-%m').date()
+        except ValueError:
+            abort(404)
+    after = request.args.get('after', 0, type=int)
+
+    # one more than a page, to know whether there is a next one
+    packages = top_packages(name, version, ranking, month, after,
+                            PER_PAGE + 1)
+    if not packages:
+        abort(404)
+    next_after = None
+    if len(packages) > PER_PAGE:
+        packages = packages[:PER_PAGE]
+        next_after = packages[-1].rank
+    return dict(distro_name=name, distro_version=version, ranking=ranking,
+                month=packages[0].month.strftime('%Y-%m'), next=next_after,
+                packages=[p.serialize for p in packages])
 
 
 @app.route('/distro')
@@ -186,10 +444,7 @@ def distro_doc():
 
     """
     # number of submissions per distribution
-    submissions_distrover = db_session.query(
-        Submission.distro_name + ' ' + Submission.distro_version,
-        func.count(Submission.sub_id)
-        ).group_by(Submission.distro_name, Submission.distro_version).all()
+    submissions_distrover = _submissions_distrover()
 
     # transform the list of tuples returned by SQLA into a nested JS array
     submissions_distrover = json.dumps(submissions_distrover)
@@ -197,6 +452,64 @@ def distro_doc():
     return dict(submissions_distrover=submissions_distrover)
 
 
+def _submissions_distrover():
+    """Return a list of ("distro version", number of submissions) pairs"""
+    return db_session.query(
+        DistroSummary.distro_name + ' ' + DistroSummary.distro_version,
+        DistroSummary.submissions
+    ).filter(DistroSummary.submissions > 0).order_by(
+        DistroSummary.distro_name, DistroSummary.distro_version).all()
+
+
+@app.route('/export/archives.<format>')
+def export_archives(format):
+    """Stream the monthly package counts of package_archives as NDJSON or
+    CSV
+
+    :format: ndjson or csv
+
+    The rows can be filtered with ?distro=, ?version=, ?arch=,
+    ?month=YYYY-MM and ?status=. The response is gzipped on the fly for
+    the clients which accept that.
+
+    """
+    if format not in EXPORT_FORMATS:
+        abort(404)
+    filters = {}
+    for arg, column in zip(['distro', 'version', 'arch', 'month', 'status'],
+                           EXPORT_FILTERS):
+        if arg in request.args:
+            filters[column] = request.args[arg]
+    if 'month' in filters:
+        try:
+            filters['month'] = datetime.strptime(filters['month'],
+                                                 '%Y-%m').date()
+        except ValueError:
+            abort(404)
+
+    writer, mimetype = EXPORT_FORMATS[format]
+    chunks = writer(archive_rows(filters))
+    gzipped = 'gzip' in request.accept_encodings
+    if gzipped:
+        chunks = gzip_chunks(chunks)
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.headers['Content-Disposition'] = (
+        'attachment; filename=package_archives.%s' % format)
+    return response
+
+
+@app.route('/stats')
+def stats():
+    """Return the hit/miss counters of the caches of this worker"""
+    return jsonify(dimension_cache=dimension_cache.stats,
+                   package_cache=package_cache.stats,
+                   submission_limiter=submission_limiter.stats,
+                   response_cache=response_cache.stats)
+
+
 @app.route('/api')
 @render(template='api.html')
 def api():
@@ -14,5 +14,7 @@ setup(
     include_package_data=True,
     zip_safe=False,
     install_requires=['Flask', 'sqlalchemy', 'psycopg2', 'textile'],
+    # makes merging and reading the HyperLogLog sketches faster
+    extras_require={'numpy': ['numpy']},
     test_suite="popcorn.test"
     )